@@ -4,7 +4,13 @@ from pathlib import Path
 
 from flask import Flask
 from dotenv import load_dotenv
-from module.middleware import auth_middleware
+from module.middleware import init_app as init_auth
+from module.metrics import init_app as init_metrics
+from module.db import init_app as init_db
+from module.query_stats import init_app as init_query_stats
+from module.upload_slots import init_app as init_upload_slots
+from module.deletion_queue import init_app as init_deletion_queue
+from module.idempotency import init_app as init_idempotency
 
 from routes import register_blueprints
 
@@ -64,16 +70,24 @@ def ensure_master_key():
 def create_app():
     ensure_master_key()
 
-    # Initialiser MinIO
-    from module.minio_client import init_minio
+    # Initialiser le stockage (bucket MinIO ou dossier local)
+    from module.storage import StorageUnsupported, init_storage
     try:
-        init_minio()
+        init_storage()
+    except StorageUnsupported:
+        raise
     except Exception as e:
-        print(f"[WARNING] MinIO initialization failed: {e}")
+        print(f"[WARNING] Storage initialization failed: {e}")
 
     app = Flask(__name__)
-    app.before_request(auth_middleware)
+    init_metrics(app)
+    init_db(app)
+    init_query_stats(app)
+    init_upload_slots(app)
+    init_deletion_queue(app)
+    init_idempotency(app)
     register_blueprints(app)
+    init_auth(app)
     return app
 
 
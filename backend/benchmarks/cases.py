@@ -0,0 +1,237 @@
+"""
+Cas de benchmark des chemins chauds du backend.
+
+Chaque cas est une fonction sans argument exécutée `iterations` fois après
+`warmup` exécutions à blanc; le contexte (app Flask, données, token) est
+préparé une fois par prepare().
+"""
+
+import base64
+import io
+import os
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+BENCH_USER_ID = 1
+TREE_DEPTH = 32
+FANOUT = 200
+FILE_SIZE = 1024 * 1024
+
+
+@dataclass
+class Case:
+    name: str
+    func: Callable[[], None]
+    iterations: int = 200
+    warmup: int = 10
+
+
+@dataclass
+class Context:
+    app: object
+    client: object
+    token: str
+    deep_folder_id: int
+    wide_folder_id: int
+    download_object: str
+    file_bytes: bytes
+    file_b64: str
+
+
+def _seed() -> Dict[str, int]:
+    from module.db import execute_write
+
+    execute_write(
+        "INSERT INTO users (id, nom, prenom, email, mdp) VALUES (%s, %s, %s, %s, %s)",
+        (BENCH_USER_ID, "bench", "bench", "bench@example.com", "x"),
+    )
+
+    parent: Optional[int] = None
+    for depth in range(TREE_DEPTH):
+        _, parent = execute_write(
+            "INSERT INTO folders (id_users, nom, parent_id) VALUES (%s, %s, %s)",
+            (BENCH_USER_ID, f"niveau-{depth}", parent),
+        )
+    deep_folder_id = parent
+
+    _, wide_folder_id = execute_write(
+        "INSERT INTO folders (id_users, nom, parent_id) VALUES (%s, %s, %s)",
+        (BENCH_USER_ID, "large", None),
+    )
+    for i in range(FANOUT):
+        execute_write(
+            "INSERT INTO folders (id_users, nom, parent_id) VALUES (%s, %s, %s)",
+            (BENCH_USER_ID, f"enfant-{i:04d}", wide_folder_id),
+        )
+    return {"deep": int(deep_folder_id), "wide": int(wide_folder_id)}
+
+
+def prepare(app) -> Context:
+    from module.jwt_ag import encode_jwt
+
+    with app.app_context():
+        folders = _seed()
+
+    client = app.test_client()
+    token = encode_jwt({"id": BENCH_USER_ID, "a2f": 0}, expires_in=3600)
+    file_bytes = os.urandom(FILE_SIZE)
+    file_b64 = base64.b64encode(file_bytes).decode()
+
+    response = client.post(
+        "/api/documents/upload",
+        json={
+            "file_name": "telechargement.bin",
+            "file_data": file_b64,
+            "dek_encrypted": "dek",
+            "iv": "iv",
+            "sha256": "0" * 64,
+        },
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"Préparation de l'upload échouée: {response.status_code} {response.get_data(as_text=True)}")
+    download_object = response.get_json()["data"]["object_name"]
+
+    return Context(
+        app=app,
+        client=client,
+        token=token,
+        deep_folder_id=folders["deep"],
+        wide_folder_id=folders["wide"],
+        download_object=download_object,
+        file_bytes=file_bytes,
+        file_b64=file_b64,
+    )
+
+
+def build_cases(ctx: Context) -> List[Case]:
+    from module.api_retour import api_response
+    from module.crypto import aes256_decrypt, aes256_encrypt
+    from module.folder import build_breadcrumb, list_child_folders
+    from module.middleware import auth_middleware
+
+    app = ctx.app
+    auth_headers = {"Authorization": f"Bearer {ctx.token}"}
+
+    def api_response_logged():
+        with app.test_request_context("/api/statue_session"):
+            api_response({"status": "success"}, 200, BENCH_USER_ID, "Session is valid")
+
+    def api_response_unlogged():
+        with app.test_request_context("/api/statue_session"):
+            api_response({"status": "success"}, 200, None, None)
+
+    def middleware_decode():
+        with app.test_request_context("/api/documents/list", headers=auth_headers):
+            if auth_middleware() is not None:
+                raise RuntimeError("auth_middleware a rejeté un token valide")
+
+    def breadcrumb_deep():
+        with app.test_request_context("/api/documents/list"):
+            crumbs = build_breadcrumb(BENCH_USER_ID, ctx.deep_folder_id)
+            if len(crumbs) != TREE_DEPTH:
+                raise RuntimeError(f"breadcrumb incomplet: {len(crumbs)}")
+
+    def child_folders_wide():
+        with app.test_request_context("/api/documents/list"):
+            if len(list_child_folders(BENCH_USER_ID, ctx.wide_folder_id)) != FANOUT:
+                raise RuntimeError("list_child_folders incomplet")
+
+    wide_list_url = f"/api/documents/list?folder_id={ctx.wide_folder_id}"
+    etag = {"value": None}
+
+    def list_wide():
+        response = ctx.client.get(wide_list_url, headers=auth_headers)
+        if response.status_code != 200:
+            raise RuntimeError(f"list: {response.status_code}")
+        etag["value"] = response.headers.get("ETag")
+
+    def list_wide_not_modified():
+        response = ctx.client.get(wide_list_url, headers={**auth_headers, "If-None-Match": etag["value"] or ""})
+        if response.status_code == 200:
+            # Version changée (ou premier appel): les suivants doivent répondre 304
+            etag["value"] = response.headers.get("ETag")
+        elif response.status_code != 304:
+            raise RuntimeError(f"list conditionnel: {response.status_code}")
+
+    counter = {"upload": 0}
+
+    def upload_1mib():
+        counter["upload"] += 1
+        response = ctx.client.post(
+            "/api/documents/upload",
+            json={
+                "file_name": f"bench-{counter['upload']}.bin",
+                "file_data": ctx.file_b64,
+                "dek_encrypted": "dek",
+                "iv": "iv",
+                "sha256": "0" * 64,
+            },
+            headers=auth_headers,
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"upload: {response.status_code}")
+
+    def upload_raw_1mib():
+        counter["upload"] += 1
+        response = ctx.client.post(
+            "/api/documents/upload",
+            data=ctx.file_bytes,
+            content_type="application/octet-stream",
+            headers={
+                **auth_headers,
+                "X-File-Name": f"bench-{counter['upload']}.bin",
+                "X-Dek-Encrypted": "dek",
+                "X-Iv": "iv",
+                "X-Sha256": "0" * 64,
+            },
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"upload brut: {response.status_code}")
+
+    def upload_multipart_1mib():
+        counter["upload"] += 1
+        response = ctx.client.post(
+            "/api/documents/upload",
+            data={
+                "file": (io.BytesIO(ctx.file_bytes), f"bench-{counter['upload']}.bin"),
+                "dek_encrypted": "dek",
+                "iv": "iv",
+                "sha256": "0" * 64,
+            },
+            content_type="multipart/form-data",
+            headers=auth_headers,
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"upload multipart: {response.status_code}")
+
+    def download_1mib():
+        response = ctx.client.get(f"/api/documents/download/{ctx.download_object}", headers=auth_headers)
+        body = response.get_data()
+        if response.status_code != 200 or len(body) != FILE_SIZE:
+            raise RuntimeError(f"download: {response.status_code} ({len(body)} octets)")
+
+    secret = os.urandom(4096)
+    encrypted = aes256_encrypt(secret)
+
+    def encrypt_4kib():
+        aes256_encrypt(secret)
+
+    def decrypt_4kib():
+        aes256_decrypt(encrypted)
+
+    return [
+        Case("api_response.logged", api_response_logged, iterations=2000),
+        Case("api_response.unlogged", api_response_unlogged, iterations=2000),
+        Case("auth_middleware.decode", middleware_decode, iterations=2000),
+        Case(f"folder.build_breadcrumb.depth{TREE_DEPTH}", breadcrumb_deep, iterations=300),
+        Case(f"folder.list_child_folders.fanout{FANOUT}", child_folders_wide, iterations=300),
+        Case(f"documents.list.fanout{FANOUT}", list_wide, iterations=300),
+        Case(f"documents.list.not_modified.fanout{FANOUT}", list_wide_not_modified, iterations=300),
+        Case("documents.upload.1MiB", upload_1mib, iterations=30, warmup=3),
+        Case("documents.upload_raw.1MiB", upload_raw_1mib, iterations=30, warmup=3),
+        Case("documents.upload_multipart.1MiB", upload_multipart_1mib, iterations=30, warmup=3),
+        Case("documents.download.1MiB", download_1mib, iterations=30, warmup=3),
+        Case("crypto.aes256_encrypt.4KiB", encrypt_4kib, iterations=2000),
+        Case("crypto.aes256_decrypt.4KiB", decrypt_4kib, iterations=2000),
+    ]
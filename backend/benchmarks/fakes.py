@@ -0,0 +1,352 @@
+"""
+Doublures locales pour les benchmarks (aucun service externe requis).
+
+- SqliteConnection: connexion compatible avec l'usage que module/db.py fait de
+  pymysql (DictCursor, %s, begin/commit/rollback, ping), adossée à un fichier
+  SQLite temporaire.
+- FakeMinio: client MinIO en mémoire (put/get/stat/remove/list).
+"""
+
+import io
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pymysql
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+
+# Sous-ensemble du schéma MySQL (database/schemas.sql) traduit pour SQLite.
+SCHEMA = """
+CREATE TABLE users (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  nom TEXT NOT NULL, prenom TEXT NOT NULL, email TEXT NOT NULL, mdp TEXT NOT NULL,
+  secret_a2f TEXT, statue_a2f INTEGER NOT NULL DEFAULT 0, public_key TEXT,
+  folder_version INTEGER NOT NULL DEFAULT 0, change_version INTEGER NOT NULL DEFAULT 0,
+  used_bytes INTEGER NOT NULL DEFAULT 0, used_objects INTEGER NOT NULL DEFAULT 0,
+  shared_bytes INTEGER NOT NULL DEFAULT 0, shared_objects INTEGER NOT NULL DEFAULT 0,
+  quota_bytes INTEGER, quota_objects INTEGER
+);
+CREATE TABLE logs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  id_users INTEGER NOT NULL, statut INTEGER NOT NULL, action TEXT NOT NULL,
+  timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP, ip TEXT NOT NULL
+);
+CREATE TABLE folders (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  id_users INTEGER NOT NULL, nom TEXT NOT NULL, parent_id INTEGER,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  used_bytes INTEGER NOT NULL DEFAULT 0, used_objects INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX idx_folders_list_name ON folders (id_users, parent_id, nom, id);
+CREATE INDEX idx_folders_list_date ON folders (id_users, parent_id, created_at, id);
+CREATE INDEX idx_folders_parent ON folders (parent_id);
+CREATE TABLE documents (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  id_users INTEGER NOT NULL, id_folder INTEGER, nom_original TEXT NOT NULL,
+  extension TEXT, taille_octets INTEGER NOT NULL, object_name TEXT NOT NULL UNIQUE,
+  dek_encrypted TEXT NOT NULL, iv TEXT NOT NULL, sha256 TEXT NOT NULL,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_documents_list_date ON documents (id_users, id_folder, created_at, id);
+CREATE INDEX idx_documents_list_name ON documents (id_users, id_folder, nom_original, id);
+CREATE INDEX idx_documents_list_size ON documents (id_users, id_folder, taille_octets, id);
+CREATE INDEX idx_documents_folder ON documents (id_folder);
+CREATE INDEX idx_documents_search_date ON documents (id_users, created_at, id);
+CREATE INDEX idx_documents_search_size ON documents (id_users, taille_octets, id);
+CREATE INDEX idx_documents_search_ext ON documents (id_users, extension, created_at, id);
+CREATE TABLE shared_files (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name_document TEXT NOT NULL, id_owner INTEGER NOT NULL, id_document INTEGER,
+  object_name TEXT NOT NULL, taille_octets INTEGER NOT NULL, token TEXT NOT NULL UNIQUE,
+  SEK TEXT NOT NULL, iv TEXT NOT NULL, sha256 TEXT NOT NULL, destination_email TEXT,
+  expires_at TIMESTAMP NOT NULL, max_views INTEGER, views_count INTEGER NOT NULL DEFAULT 0,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, is_active INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX idx_shared_object ON shared_files (object_name);
+CREATE TABLE upload_slots (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  token TEXT NOT NULL UNIQUE, id_users INTEGER NOT NULL, id_folder INTEGER,
+  object_name TEXT NOT NULL, nom_original TEXT NOT NULL, extension TEXT,
+  taille_octets INTEGER NOT NULL, dek_encrypted TEXT NOT NULL, iv TEXT NOT NULL, sha256 TEXT NOT NULL,
+  multipart_id TEXT, part_size INTEGER,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, expires_at TIMESTAMP NOT NULL
+);
+CREATE INDEX idx_upload_slots_expires ON upload_slots (expires_at);
+CREATE INDEX idx_upload_slots_object ON upload_slots (object_name);
+CREATE TABLE deletion_queue (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  id_users INTEGER, object_name TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,
+  last_error TEXT, lease TEXT, next_attempt_at TIMESTAMP NOT NULL,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_deletion_next ON deletion_queue (next_attempt_at);
+CREATE INDEX idx_deletion_lease ON deletion_queue (lease);
+CREATE INDEX idx_deletion_user ON deletion_queue (id_users);
+CREATE TABLE idempotency_keys (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  id_users INTEGER NOT NULL, scope TEXT NOT NULL, idem_key TEXT NOT NULL, lease TEXT NOT NULL,
+  digest TEXT, status_code INTEGER, response TEXT,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP NOT NULL, expires_at TIMESTAMP NOT NULL,
+  UNIQUE (id_users, scope, idem_key)
+);
+CREATE INDEX idx_idempotency_expires ON idempotency_keys (expires_at);
+CREATE TABLE shared_acces_log (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  id_shared_file INTEGER NOT NULL, accessed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  ip_address TEXT NOT NULL, user_agent TEXT NOT NULL
+);
+"""
+
+_PLACEHOLDER_RE = re.compile(r"%s")
+# Pas de FULLTEXT en SQLite: MATCH ... AGAINST devient un appel à _fulltext_match
+_MATCH_RE = re.compile(r"MATCH\((\w+)\) AGAINST \(%s IN BOOLEAN MODE\)")
+_PHRASE_RE = re.compile(r'\+"([^"]*)"')
+
+
+def _fulltext_match(value, expression):
+    """Équivalent des phrases requises (+"...") d'un MATCH ngram: sous-chaînes, casse ignorée."""
+    value = (value or "").casefold()
+    return all(phrase.casefold() in value for phrase in _PHRASE_RE.findall(expression))
+
+
+def _translate(query):
+    return _PLACEHOLDER_RE.sub("?", _MATCH_RE.sub(r"_fulltext_match(\1, %s)", query))
+
+
+class _Cursor:
+    def __init__(self, connection):
+        self._cursor = connection._db.cursor()
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def execute(self, query, params=()):
+        try:
+            self._cursor.execute(_translate(query), tuple(params))
+        except sqlite3.IntegrityError as e:
+            # Comme pymysql (doublon sur une clé unique, ...)
+            raise pymysql.err.IntegrityError(1062, str(e)) from e
+        self.rowcount = self._cursor.rowcount
+        self.lastrowid = self._cursor.lastrowid
+        return self.rowcount
+
+    def executemany(self, query, seq_of_params):
+        self._cursor.executemany(_translate(query), [tuple(p) for p in seq_of_params])
+        self.rowcount = self._cursor.rowcount
+        return self.rowcount
+
+    def _to_dict(self, row):
+        return {d[0]: v for d, v in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return None if row is None else self._to_dict(row)
+
+    def fetchall(self):
+        rows = [self._to_dict(row) for row in self._cursor.fetchall()]
+        if self.rowcount < 0:
+            self.rowcount = len(rows)
+        return rows
+
+
+# GET_LOCK / RELEASE_LOCK de MySQL (verrous nommés), dans le process seulement
+_named_locks = set()
+
+
+def _get_lock(name, timeout):
+    if name in _named_locks:
+        return 0
+    _named_locks.add(name)
+    return 1
+
+
+def _release_lock(name):
+    if name not in _named_locks:
+        return None
+    _named_locks.discard(name)
+    return 1
+
+
+class SqliteConnection:
+    """Connexion "MySQL-like" minimale adossée à SQLite (autocommit par défaut)."""
+
+    def __init__(self, path: str):
+        # PARSE_DECLTYPES: les colonnes TIMESTAMP reviennent en datetime, comme avec pymysql
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30,
+                                   detect_types=sqlite3.PARSE_DECLTYPES)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.create_function("_fulltext_match", 2, _fulltext_match, deterministic=True)
+        self._db.create_function("GET_LOCK", 2, _get_lock)
+        self._db.create_function("RELEASE_LOCK", 1, _release_lock)
+        self.open = True
+
+    def cursor(self):
+        return _Cursor(self)
+
+    def begin(self):
+        self._db.execute("BEGIN")
+
+    def commit(self):
+        if self._db.in_transaction:
+            self._db.execute("COMMIT")
+
+    def rollback(self):
+        if self._db.in_transaction:
+            self._db.execute("ROLLBACK")
+
+    def ping(self, reconnect=False):
+        self._db.execute("SELECT 1")
+
+    def close(self):
+        self._db.close()
+        self.open = False
+
+    _force_close = close
+
+
+def create_database(path: str) -> None:
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    db.close()
+
+
+class _FakeObjectResponse:
+    def __init__(self, data: bytes):
+        self._stream = io.BytesIO(data)
+
+    def read(self, amt=None):
+        return self._stream.read(amt)
+
+    def stream(self, amt=64 * 1024, decode_content=None):
+        while True:
+            chunk = self._stream.read(amt)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+
+class FakeMinio:
+    """Client MinIO en mémoire (un seul process, thread-safe)."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    def bucket_exists(self, bucket):
+        return bucket in self._buckets
+
+    def make_bucket(self, bucket):
+        self._buckets.setdefault(bucket, {})
+
+    def put_object(self, bucket, object_name, data, length, metadata=None, content_type=None, part_size=0,
+                   num_parallel_uploads=3):
+        payload = data.read() if length < 0 else data.read(length)
+        with self._lock:
+            self._buckets.setdefault(bucket, {})[object_name] = (
+                payload,
+                dict(metadata or {}),
+                datetime.now(timezone.utc),
+            )
+        return SimpleNamespace(object_name=object_name, etag=str(hash(payload)))
+
+    def _get(self, bucket, object_name):
+        try:
+            return self._buckets[bucket][object_name]
+        except KeyError:
+            from minio.error import S3Error
+
+            raise S3Error("NoSuchKey", "Object does not exist", object_name, None, None, None)
+
+    def get_object(self, bucket, object_name, offset=0, length=0, **kwargs):
+        payload, _, _ = self._get(bucket, object_name)
+        end = offset + length if length else len(payload)
+        return _FakeObjectResponse(payload[offset:end])
+
+    def stat_object(self, bucket, object_name, **kwargs):
+        payload, metadata, modified = self._get(bucket, object_name)
+        return SimpleNamespace(
+            object_name=object_name,
+            size=len(payload),
+            metadata=metadata,
+            last_modified=modified,
+            etag=str(hash(payload)),
+        )
+
+    def remove_object(self, bucket, object_name, **kwargs):
+        with self._lock:
+            self._buckets.get(bucket, {}).pop(object_name, None)
+
+    def remove_objects(self, bucket, delete_object_list, **kwargs):
+        with self._lock:
+            objects = self._buckets.get(bucket, {})
+            for obj in delete_object_list:
+                objects.pop(obj._name, None)
+        return iter(())
+
+    def list_objects(self, bucket, prefix=None, recursive=False, **kwargs):
+        items = sorted(self._buckets.get(bucket, {}).items())
+        seen_dirs = set()
+        for name, (payload, _, modified) in items:
+            if prefix and not name.startswith(prefix):
+                continue
+            if not recursive and "/" in name[len(prefix or ""):]:
+                directory = name[:name.index("/", len(prefix or "")) + 1]
+                if directory not in seen_dirs:
+                    seen_dirs.add(directory)
+                    yield SimpleNamespace(object_name=directory, size=None, last_modified=None, is_dir=True)
+                continue
+            yield SimpleNamespace(object_name=name, size=len(payload), last_modified=modified, is_dir=False)
+
+    # Multipart (méthodes internes du client minio utilisées par MinioStorage)
+
+    def _create_multipart_upload(self, bucket, object_name, headers):
+        with self._lock:
+            upload_id = f"fake-{len(self._uploads) + 1}-{object_name}"
+            self._uploads[upload_id] = {}
+        return upload_id
+
+    def _upload_part(self, bucket, object_name, data, headers, upload_id, part_number):
+        from minio.error import S3Error
+
+        with self._lock:
+            parts = self._uploads.get(upload_id)
+            if parts is None:
+                raise S3Error("NoSuchUpload", "Upload does not exist", object_name, None, None, None)
+            parts[part_number] = bytes(data)
+        return str(hash(bytes(data)))
+
+    def _list_parts(self, bucket, object_name, upload_id, max_parts=None, part_number_marker=None, **kwargs):
+        from minio.datatypes import Part
+
+        parts = self._uploads[upload_id]
+        return SimpleNamespace(
+            parts=[Part(n, str(hash(data)), size=len(data)) for n, data in sorted(parts.items())],
+            is_truncated=False,
+            next_part_number_marker=None,
+        )
+
+    def _complete_multipart_upload(self, bucket, object_name, upload_id, parts):
+        with self._lock:
+            stored = self._uploads.pop(upload_id)
+            payload = b"".join(stored[p.part_number] for p in parts)
+            self._buckets.setdefault(bucket, {})[object_name] = (payload, {}, datetime.now(timezone.utc))
+
+    def _abort_multipart_upload(self, bucket, object_name, upload_id):
+        with self._lock:
+            self._uploads.pop(upload_id, None)
@@ -0,0 +1,159 @@
+"""
+Microbenchmarks des chemins chauds du backend, hors ligne.
+
+MySQL est remplacé par SQLite (benchmarks/fakes.py) et MinIO par un client en
+mémoire: les chiffres mesurent le coût Python du backend (sérialisation,
+décodage, crypto, nombre de requêtes), pas la latence réseau.
+
+Usage (depuis backend/):
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --baseline bench.json --threshold 0.15
+    python -m benchmarks.run --filter folder
+"""
+
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _configure_environment() -> None:
+    # Avant tout import de module.*: la configuration est lue à l'import.
+    os.environ.setdefault("APP_MASTER_KEY", base64.b64encode(os.urandom(32)).decode())
+    os.environ.setdefault("SQL_REQUEST_SUMMARY", "0")
+    os.environ.setdefault("SQL_SLOW_QUERY_MS", "0")
+    os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+
+
+def _install_fakes(db_path: str) -> None:
+    from benchmarks.fakes import FakeMinio, SqliteConnection, create_database
+    from module import db, minio_client
+
+    create_database(db_path)
+    db.pool.close_all()
+    db.pool._factory = lambda: SqliteConnection(db_path)
+
+    fake = FakeMinio()
+    fake.make_bucket(minio_client.MINIO_BUCKET)
+    minio_client.minio_client = fake
+
+
+def _load_app():
+    # app.py crée l'application à l'import (et affiche la clé): on le fait taire.
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as app_module
+    return app_module.app
+
+
+def _measure(case) -> dict:
+    for _ in range(case.warmup):
+        case.func()
+    samples = []
+    for _ in range(case.iterations):
+        started = time.perf_counter()
+        case.func()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    p95_index = min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))
+    median = statistics.median(samples)
+    return {
+        "iterations": case.iterations,
+        "median_us": median * 1e6,
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "p95_us": samples[p95_index] * 1e6,
+        "min_us": samples[0] * 1e6,
+        "ops_per_s": 1.0 / median if median else None,
+    }
+
+
+def run(name_filter: str = "") -> dict:
+    _configure_environment()
+    with tempfile.TemporaryDirectory(prefix="yoda-bench-") as tmp:
+        _install_fakes(os.path.join(tmp, "bench.sqlite3"))
+        app = _load_app()
+
+        from benchmarks.cases import build_cases, prepare
+        from module.db import log_sink
+
+        ctx = prepare(app)
+        results = {}
+        for case in build_cases(ctx):
+            if name_filter and name_filter not in case.name:
+                continue
+            results[case.name] = _measure(case)
+            print(f"{case.name:<40} median {results[case.name]['median_us']:>12.1f} us"
+                  f"   p95 {results[case.name]['p95_us']:>12.1f} us")
+        log_sink.flush()
+
+        from module.db import pool
+        pool.close_all()
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Affiche l'écart des médianes; retourne les cas en régression."""
+    regressions = []
+    print()
+    print(f"{'cas':<40} {'baseline':>12} {'actuel':>12} {'écart':>8}")
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print(f"{name:<40} {'-':>12} {result['median_us']:>12.1f}      new")
+            continue
+        delta = (result["median_us"] - base["median_us"]) / base["median_us"]
+        flag = ""
+        if delta > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<40} {base['median_us']:>12.1f} {result['median_us']:>12.1f} {delta:>+7.1%}{flag}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks hors ligne du backend YODA")
+    parser.add_argument("--output", help="fichier JSON où écrire les résultats")
+    parser.add_argument("--baseline", help="fichier JSON de référence à comparer")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="écart de médiane toléré avant de signaler une régression (défaut: 0.15)")
+    parser.add_argument("--filter", default="", help="ne lancer que les cas dont le nom contient ce texte")
+    args = parser.parse_args(argv)
+
+    current = run(args.filter)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(current, fh, indent=2)
+        print(f"\nRésultats écrits dans {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} régression(s) au-delà de {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,20 @@
+# Chargé automatiquement par gunicorn (./gunicorn.conf.py) — voir Dockerfile.prod.
+# Les options de ligne de commande (bind, workers, timeout) restent prioritaires.
+import os
+import shutil
+
+from prometheus_client import multiprocess
+
+
+def on_starting(server):
+    # Repartir d'un dossier de métriques vide à chaque démarrage du master.
+    metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Retire les gauges "live" du worker mort (requêtes en cours, etc.).
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
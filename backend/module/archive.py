@@ -0,0 +1,167 @@
+"""
+Archive ZIP d'un dossier et de ses sous-dossiers, produite à la volée.
+
+Les fichiers sont copiés tels quels (chiffrés, ZIP_STORED: rien à gagner à
+compresser) depuis le stockage, bloc par bloc (DOWNLOAD_CHUNK_SIZE): aucun
+fichier temporaire, et la mémoire ne dépend pas de la taille de l'archive.
+zipfile écrit dans un flux non seekable (data descriptors après chaque
+fichier, ZIP64 au besoin); chaque bloc écrit est rendu aussitôt au serveur
+WSGI.
+
+Contenu:
+- <dossier>/<sous-dossier>/: une entrée par dossier (même vide)
+- <dossier>/<sous-dossier>/.../<nom du fichier>: le fichier chiffré
+- manifest.json (en dernier): pour chaque fichier son chemin, object_name,
+  taille, dek_encrypted, iv et sha256, plus les fichiers absents du stockage
+
+Les métadonnées sont lues en base avant la réponse; le flux ne fait plus
+aucune requête SQL (la session de la requête est déjà rendue au pool).
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import zipfile
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from module.db import fetch_all
+from module.folder_tree import get_tree
+from module.storage import stream_file
+
+MANIFEST_NAME = "manifest.json"
+
+
+class ArchiveEntry(NamedTuple):
+    path: str
+    object_name: str
+    size: int
+    created_at: Optional[datetime]
+    dek_encrypted: str
+    iv: str
+    sha256: str
+
+
+def _safe_name(name: str) -> str:
+    # Un nom ne doit ni créer de sous-dossier ni remonter dans l'arborescence
+    name = (name or "").replace("/", "_").replace("\\", "_").strip()
+    return "_" if name in ("", ".", "..") else name
+
+
+def _unique(path: str, used: set) -> str:
+    if path.casefold() not in used:
+        used.add(path.casefold())
+        return path
+    stem, dot, ext = path.rpartition(".")
+    if not dot or "/" in ext:
+        stem, dot, ext = path, "", ""
+    n = 2
+    while f"{stem} ({n}){dot}{ext}".casefold() in used:
+        n += 1
+    path = f"{stem} ({n}){dot}{ext}"
+    used.add(path.casefold())
+    return path
+
+
+def archive_entries(user_id: int, folder_ids: List[int]) -> Tuple[List[str], List[ArchiveEntry]]:
+    """
+    Chemins des dossiers folder_ids (un dossier et ses descendants, le premier
+    étant la racine de l'archive) et leurs fichiers, avec leur chemin dans
+    l'archive.
+    """
+    tree = get_tree(user_id)
+    root = tree.position(folder_ids[0])
+    depth = len(tree.ancestors(root)) - 1
+
+    folder_paths: Dict[int, str] = {}
+    for folder_id in folder_ids:
+        p = tree.position(folder_id)
+        names = [_safe_name(tree.names[a]) for a in tree.ancestors(p)[depth:]]
+        folder_paths[folder_id] = "/".join(names)
+
+    placeholders = ", ".join(["%s"] * len(folder_ids))
+    rows = fetch_all(
+        f"SELECT id, id_folder, nom_original, taille_octets, object_name, dek_encrypted, iv, sha256, created_at"
+        f" FROM documents WHERE id_users = %s AND id_folder IN ({placeholders}) ORDER BY id_folder, nom_original, id",
+        (user_id, *folder_ids),
+    )
+
+    used: set = set()
+    entries: List[ArchiveEntry] = []
+    for row in rows:
+        path = _unique(f"{folder_paths[row['id_folder']]}/{_safe_name(row['nom_original'])}", used)
+        entries.append(ArchiveEntry(
+            path, row["object_name"], int(row["taille_octets"]), row.get("created_at"),
+            row["dek_encrypted"], row["iv"], row["sha256"],
+        ))
+    return sorted(set(folder_paths.values())), entries
+
+
+class _Sink(io.RawIOBase):
+    """Flux d'écriture non seekable dont on retire le contenu au fil de l'eau."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        chunks, self._chunks = self._chunks, []
+        return b"".join(chunks)
+
+
+def _zip_info(entry: ArchiveEntry) -> zipfile.ZipInfo:
+    created = entry.created_at if isinstance(entry.created_at, datetime) else None
+    date_time = created.timetuple()[:6] if created is not None and created.year >= 1980 else (1980, 1, 1, 0, 0, 0)
+    info = zipfile.ZipInfo(entry.path, date_time=date_time)
+    info.compress_type = zipfile.ZIP_STORED
+    info.external_attr = 0o644 << 16
+    # Taille annoncée: zipfile passe en ZIP64 pour les gros fichiers
+    info.file_size = entry.size
+    return info
+
+
+def stream_archive(user_id: int, folders: List[str], entries: List[ArchiveEntry]) -> Iterator[bytes]:
+    """
+    Corps de la réponse: l'archive ZIP, bloc par bloc.
+
+    Un fichier absent du stockage est omis et signalé dans le manifeste; une
+    erreur en cours de copie interrompt l'archive (le client la voit tronquée).
+    """
+    sink = _Sink()
+    manifest: Dict[str, Any] = {"files": [], "missing": []}
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as archive:
+        for folder in folders:
+            archive.writestr(zipfile.ZipInfo(folder + "/"), b"")
+        for entry in entries:
+            try:
+                chunks = stream_file(user_id, entry.object_name)
+            except Exception as e:
+                print(f"[WARNING] Archive: {entry.object_name} illisible, omis ({e})")
+                manifest["missing"].append({"path": entry.path, "object_name": entry.object_name})
+                continue
+            try:
+                with archive.open(_zip_info(entry), "w") as dest:
+                    for chunk in chunks:
+                        dest.write(chunk)
+                        data = sink.drain()
+                        if data:
+                            yield data
+            finally:
+                chunks.close()
+            manifest["files"].append({
+                "path": entry.path,
+                "object_name": entry.object_name,
+                "size": entry.size,
+                "dek_encrypted": entry.dek_encrypted,
+                "iv": entry.iv,
+                "sha256": entry.sha256,
+            })
+        archive.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=1))
+    yield sink.drain()
@@ -0,0 +1,165 @@
+"""
+Import d'une arborescence de fichiers en une requête (POST /documents/import).
+
+Requête multipart/form-data:
+- champ "manifest" (JSON):
+  {
+      "folder_id": 12,            (optionnel: dossier de destination, racine sinon)
+      "files": [
+          {"path": "Photos/2024/a.jpg", "part": "f0",
+           "dek_encrypted": "...", "iv": "...", "sha256": "..."},
+          ...
+      ],
+      "folders": ["Archives/vide"]   (optionnel: dossiers sans fichier)
+  }
+- un champ fichier par entrée de "files", nommé par son "part"
+
+Déroulement:
+1. les fichiers sont envoyés au stockage en parallèle (IMPORT_WORKERS threads)
+2. puis, dans une transaction: création des dossiers manquants (mkdir -p,
+   create_folder_paths) et insertion des documents par INSERT multi-lignes
+3. en cas d'échec, les fichiers déjà envoyés sont supprimés: tout ou rien
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, List, NamedTuple, Optional, Tuple
+
+from module.config import IMPORT_INSERT_BATCH, IMPORT_MAX_FILES, IMPORT_WORKERS
+from module.db import execute_write
+from module.storage import delete_files, upload_file
+from module.upload import UploadError
+
+DOCUMENT_COLUMNS = ("id_users", "id_folder", "nom_original", "extension", "taille_octets", "object_name", "dek_encrypted", "iv", "sha256")
+
+
+class ImportFile(NamedTuple):
+    folder: Tuple[str, ...]
+    name: str
+    stream: BinaryIO
+    length: int
+    dek_encrypted: str
+    iv: str
+    sha256: str
+
+
+class ImportManifest(NamedTuple):
+    folder_id: Optional[int]
+    files: List[ImportFile]
+    folders: List[Tuple[str, ...]]
+
+
+def split_path(path) -> Tuple[str, ...]:
+    """"a/b/c" -> ("a", "b", "c"); UploadError si vide ou s'il remonte (..)."""
+    if not isinstance(path, str):
+        raise UploadError("Chemin invalide")
+    parts = tuple(part.strip() for part in path.replace("\\", "/").split("/") if part.strip())
+    if not parts or any(part in (".", "..") for part in parts):
+        raise UploadError(f"Chemin invalide: {path}")
+    return parts
+
+
+def _length(stream: BinaryIO) -> int:
+    stream.seek(0, os.SEEK_END)
+    length = stream.tell()
+    stream.seek(0)
+    return length
+
+
+def read_manifest(form, files) -> ImportManifest:
+    """Manifeste et fichiers de la requête (request.form, request.files)."""
+    try:
+        manifest = json.loads(form.get("manifest") or "")
+    except ValueError:
+        raise UploadError("manifest JSON manquant ou invalide")
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("files"), list):
+        raise UploadError("manifest.files doit être une liste")
+    if len(manifest["files"]) > IMPORT_MAX_FILES:
+        raise UploadError(f"Au plus {IMPORT_MAX_FILES} fichiers par import", 413)
+
+    folder_id = manifest.get("folder_id")
+    if folder_id in (None, "", 0, "0", "null", "root"):
+        folder_id = None
+    else:
+        try:
+            folder_id = int(folder_id)
+        except (TypeError, ValueError):
+            raise UploadError("folder_id invalide")
+
+    entries: List[ImportFile] = []
+    parts = set()
+    for item in manifest["files"]:
+        if not isinstance(item, dict):
+            raise UploadError("Entrée de manifest.files invalide")
+        path = split_path(item.get("path"))
+        if not all(item.get(field) for field in ("part", "dek_encrypted", "iv", "sha256")):
+            raise UploadError(f"Paramètres manquants pour {item.get('path')}")
+        file = files.get(item["part"])
+        if file is None:
+            raise UploadError(f"Fichier manquant: part {item['part']}")
+        # Un flux ne peut être lu que par un envoi à la fois
+        if item["part"] in parts:
+            raise UploadError(f"Part utilisée deux fois: {item['part']}")
+        parts.add(item["part"])
+        entries.append(ImportFile(
+            path[:-1], path[-1], file.stream, _length(file.stream),
+            item["dek_encrypted"], item["iv"], item["sha256"],
+        ))
+    if not entries:
+        raise UploadError("Aucun fichier à importer")
+
+    folders = manifest.get("folders") or []
+    if not isinstance(folders, list):
+        raise UploadError("manifest.folders doit être une liste")
+    return ImportManifest(folder_id, entries, [split_path(path) for path in folders])
+
+
+def store_files(user_id: int, entries: List[ImportFile]) -> List[str]:
+    """
+    Envoie les fichiers au stockage en parallèle; object_name de chacun, dans
+    l'ordre. Si un envoi échoue, ceux déjà faits sont supprimés et l'erreur
+    remonte.
+    """
+    def _store(entry: ImportFile) -> str:
+        return upload_file(user_id, entry.stream, entry.name, {}, length=entry.length)
+
+    with ThreadPoolExecutor(max_workers=max(1, IMPORT_WORKERS), thread_name_prefix="import") as pool:
+        futures = [pool.submit(_store, entry) for entry in entries]
+        object_names: List[Optional[str]] = []
+        error = None
+        for future in futures:
+            try:
+                object_names.append(future.result())
+            except Exception as e:
+                object_names.append(None)
+                error = error or e
+    if error is not None:
+        discard_files([name for name in object_names if name])
+        raise error
+    return object_names
+
+
+def discard_files(object_names: List[str]) -> None:
+    """Supprime les fichiers d'un import abandonné (jamais référencés en base)."""
+    if not object_names:
+        return
+    try:
+        failed = delete_files(object_names)
+        for object_name, reason in failed.items():
+            print(f"[ERROR] Import cleanup {object_name}: {reason}")
+    except Exception as e:
+        print(f"[ERROR] Import cleanup failed: {e}")
+
+
+def insert_documents(rows: List[Tuple]) -> None:
+    """INSERT multi-lignes des documents (par paquets de IMPORT_INSERT_BATCH)."""
+    row_placeholder = "(" + ", ".join(["%s"] * len(DOCUMENT_COLUMNS)) + ")"
+    for start in range(0, len(rows), IMPORT_INSERT_BATCH):
+        batch = rows[start:start + IMPORT_INSERT_BATCH]
+        execute_write(
+            f"INSERT INTO documents ({', '.join(DOCUMENT_COLUMNS)}) VALUES {', '.join([row_placeholder] * len(batch))}",
+            tuple(value for row in batch for value in row),
+        )
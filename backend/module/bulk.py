@@ -0,0 +1,261 @@
+"""
+Opérations groupées sur les documents et dossiers (POST /documents/bulk).
+
+Payload:
+{
+    "operations": [
+        {"action": "move",   "document": "<object_name>", "folder_id": 12},
+        {"action": "move",   "folder": 7, "folder_id": null},      (null = racine)
+        {"action": "rename", "document": "<object_name>", "name": "contrat.pdf"},
+        {"action": "rename", "folder": 7, "name": "Archives"},
+        {"action": "delete", "document": "<object_name>"},
+        {"action": "delete", "folder": 9}
+    ]
+}
+
+Déplacer ou renommer ne touche que les métadonnées: les fichiers restent où
+ils sont dans le stockage. Tout est appliqué dans une transaction, tout ou
+rien:
+- la première écriture incrémente la version des dossiers (ou des listings)
+  du user: sa ligne users reste verrouillée jusqu'au commit, les opérations
+  concurrentes du même user passent l'une après l'autre
+- les documents sont lus en une requête (IN), les dossiers dans l'arborescence
+  (module/folder_tree.py), relue après ce verrou
+- chaque modification est une requête par lot (UPDATE ... WHERE id IN,
+  CASE pour les renommages)
+
+Refusé (400): un élément visé deux fois, un dossier déplacé dans son propre
+sous-arbre, un élément ou une destination situés dans un dossier supprimé par
+le même lot.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from module.change_version import bump_change_version
+from module.config import BULK_MAX_OPERATIONS
+from module.db import execute_write, fetch_all
+from module.deletion_queue import tombstone_documents
+from module.folder_tree import bump_folder_version, get_tree
+from module.usage import FolderDeltas, add_document_usage, release_documents
+
+ACTIONS = ("move", "rename", "delete")
+NAME_MAX_LENGTH = 255
+
+
+class BulkError(Exception):
+    """Lot refusé (message renvoyé au client, code HTTP); rien n'est appliqué."""
+
+    def __init__(self, message: str, status: int = 400, index: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+        self.index = index
+
+
+class Operation(NamedTuple):
+    index: int
+    action: str
+    kind: str            # "document" | "folder"
+    ref: Any             # object_name | id du dossier
+    target: Optional[int]
+    name: Optional[str]
+
+
+def _placeholders(values) -> str:
+    return ", ".join(["%s"] * len(values))
+
+
+def parse_operations(payload: Any) -> List[Operation]:
+    """Valide la forme du lot (sans accès à la base); BulkError sinon."""
+    items = payload.get("operations") if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        raise BulkError("operations doit être une liste non vide")
+    if len(items) > BULK_MAX_OPERATIONS:
+        raise BulkError(f"Au plus {BULK_MAX_OPERATIONS} opérations par lot", 413)
+
+    operations: List[Operation] = []
+    seen: Set[Tuple[str, Any]] = set()
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or item.get("action") not in ACTIONS:
+            raise BulkError(f"action doit valoir {', '.join(ACTIONS)}", index=index)
+        action = item["action"]
+
+        if ("document" in item) == ("folder" in item):
+            raise BulkError("document ou folder requis (un seul)", index=index)
+        if "document" in item:
+            kind, ref = "document", item["document"]
+            if not isinstance(ref, str) or not ref:
+                raise BulkError("document invalide", index=index)
+        else:
+            kind = "folder"
+            try:
+                ref = int(item["folder"])
+            except (TypeError, ValueError):
+                raise BulkError("folder invalide", index=index)
+        if (kind, ref) in seen:
+            raise BulkError("Élément visé par plusieurs opérations", index=index)
+        seen.add((kind, ref))
+
+        target = name = None
+        if action == "move":
+            if "folder_id" not in item:
+                raise BulkError("folder_id requis (null = racine)", index=index)
+            if item["folder_id"] not in (None, "", 0, "0", "null", "root"):
+                try:
+                    target = int(item["folder_id"])
+                except (TypeError, ValueError):
+                    raise BulkError("folder_id invalide", index=index)
+        elif action == "rename":
+            name = (item.get("name") or "").strip() if isinstance(item.get("name"), str) else ""
+            if not name or len(name) > NAME_MAX_LENGTH:
+                raise BulkError(f"name requis ({NAME_MAX_LENGTH} caractères max)", index=index)
+        operations.append(Operation(index, action, kind, ref, target, name))
+    return operations
+
+
+def _update_case(table: str, user_column: str, user_id: int, columns: Dict[str, Dict[int, Any]]) -> None:
+    """UPDATE table SET col = CASE id WHEN ... END, ... WHERE id IN (...), en une requête."""
+    ids = sorted({row_id for values in columns.values() for row_id in values})
+    assignments, params = [], []
+    for column, values in columns.items():
+        assignments.append(f"{column} = CASE id {' '.join(['WHEN %s THEN %s'] * len(values))} END")
+        for row_id, value in values.items():
+            params += [row_id, value]
+    execute_write(
+        f"UPDATE {table} SET {', '.join(assignments)} WHERE {user_column} = %s AND id IN ({_placeholders(ids)})",
+        tuple(params + [user_id] + ids),
+    )
+
+
+def _update_parents(table: str, column: str, user_id: int, moves: Dict[int, Optional[int]]) -> None:
+    """Un UPDATE ... SET column = destination par destination."""
+    by_target: Dict[Optional[int], List[int]] = {}
+    for row_id, target in moves.items():
+        by_target.setdefault(target, []).append(row_id)
+    for target, ids in by_target.items():
+        execute_write(
+            f"UPDATE {table} SET {column} = %s WHERE id_users = %s AND id IN ({_placeholders(ids)})",
+            tuple([target, user_id] + ids),
+        )
+
+
+def _extension(name: str) -> Optional[str]:
+    _, ext = os.path.splitext(name)
+    return ext[1:].lower() if ext else None
+
+
+def apply_operations(user_id: int, operations: List[Operation]) -> Dict[str, Any]:
+    """
+    Applique le lot; à appeler dans un bloc transaction(). BulkError (et
+    annulation du bloc) si un élément est introuvable ou si le lot est
+    incohérent.
+    """
+    user_id = int(user_id)
+    if any(op.kind == "folder" for op in operations):
+        bump_folder_version(user_id)
+    else:
+        bump_change_version(user_id)
+
+    # Documents: une requête pour tout le lot
+    names = [op.ref for op in operations if op.kind == "document"]
+    documents: Dict[str, Dict[str, Any]] = {}
+    if names:
+        rows = fetch_all(
+            f"SELECT id, object_name, id_folder, taille_octets FROM documents WHERE id_users = %s AND object_name IN ({_placeholders(names)})",
+            tuple([user_id] + names),
+        )
+        documents = {row["object_name"]: row for row in rows}
+    for op in operations:
+        if op.kind == "document" and op.ref not in documents:
+            raise BulkError(f"Document introuvable: {op.ref}", 404, op.index)
+
+    # Dossiers et destinations: dans l'arborescence
+    tree = get_tree(user_id)
+    for op in operations:
+        if op.kind == "folder" and tree.position(op.ref) is None:
+            raise BulkError(f"Dossier introuvable: {op.ref}", 404, op.index)
+        if op.action == "move" and op.target is not None and tree.position(op.target) is None:
+            raise BulkError(f"Dossier de destination introuvable: {op.target}", 404, op.index)
+
+    # Sous-arbres supprimés (état avant le lot)
+    deleted: Set[int] = set()
+    for op in operations:
+        if op.kind == "folder" and op.action == "delete":
+            p = tree.position(op.ref)
+            deleted.add(op.ref)
+            deleted.update(tree.ids[d] for d in tree.descendants(p))
+    for op in operations:
+        if op.action == "delete":
+            continue
+        inside = op.ref in deleted if op.kind == "folder" else documents[op.ref]["id_folder"] in deleted
+        if inside or (op.action == "move" and op.target in deleted):
+            raise BulkError("Élément ou destination dans un dossier supprimé par ce lot", index=op.index)
+
+    # Déplacements de dossiers: pas de cycle une fois tous appliqués
+    new_parent = {op.ref: op.target for op in operations if op.kind == "folder" and op.action == "move"}
+
+    def parent_of(folder_id: int) -> Optional[int]:
+        if folder_id in new_parent:
+            return new_parent[folder_id]
+        parent = tree.parents[tree.position(folder_id)]
+        return tree.ids[parent] if 0 <= parent < len(tree.ids) else None
+
+    for op in operations:
+        if op.kind == "folder" and op.action == "move":
+            current, steps = op.target, 0
+            while current is not None and steps <= len(tree.ids):
+                if current == op.ref:
+                    raise BulkError("Un dossier ne peut pas être déplacé dans son propre sous-arbre", index=op.index)
+                current, steps = parent_of(current), steps + 1
+
+    # Application, une requête par type de modification
+    doc_moves = {documents[op.ref]["id"]: op.target for op in operations if op.kind == "document" and op.action == "move"}
+    doc_names = {documents[op.ref]["id"]: op.name for op in operations if op.kind == "document" and op.action == "rename"}
+    folder_names = {op.ref: op.name for op in operations if op.kind == "folder" and op.action == "rename"}
+    doc_deletes = [
+        documents[op.ref]["id"] for op in operations
+        if op.kind == "document" and op.action == "delete" and documents[op.ref]["id_folder"] not in deleted
+    ]
+
+    if doc_moves:
+        _update_parents("documents", "id_folder", user_id, doc_moves)
+        # Compteurs des dossiers: le total du user ne change pas
+        usage: FolderDeltas = {}
+        for op in operations:
+            if op.kind == "document" and op.action == "move":
+                document = documents[op.ref]
+                for folder_id, sign in ((document["id_folder"], -1), (op.target, 1)):
+                    size, count = usage.get(folder_id, (0, 0))
+                    usage[folder_id] = (size + sign * int(document["taille_octets"]), count + sign)
+        add_document_usage(user_id, usage)
+    if doc_names:
+        _update_case("documents", "id_users", user_id, {
+            "nom_original": doc_names,
+            "extension": {doc_id: _extension(name) for doc_id, name in doc_names.items()},
+        })
+    if new_parent:
+        _update_parents("folders", "parent_id", user_id, new_parent)
+    if folder_names:
+        _update_case("folders", "id_users", user_id, {"nom": folder_names})
+
+    # Suppressions: fichiers mis en file (supprimés en arrière-plan), puis lignes
+    queued = 0
+    if doc_deletes:
+        queued += tombstone_documents(f"d.id_users = %s AND d.id IN ({_placeholders(doc_deletes)})", tuple([user_id] + doc_deletes))
+        release_documents(f"d.id_users = %s AND d.id IN ({_placeholders(doc_deletes)})", tuple([user_id] + doc_deletes))
+        execute_write(f"DELETE FROM documents WHERE id_users = %s AND id IN ({_placeholders(doc_deletes)})", tuple([user_id] + doc_deletes))
+    if deleted:
+        folder_ids = sorted(deleted)
+        queued += tombstone_documents(f"d.id_users = %s AND d.id_folder IN ({_placeholders(folder_ids)})", tuple([user_id] + folder_ids))
+        release_documents(f"d.id_users = %s AND d.id_folder IN ({_placeholders(folder_ids)})", tuple([user_id] + folder_ids))
+        execute_write(f"DELETE FROM documents WHERE id_users = %s AND id_folder IN ({_placeholders(folder_ids)})", tuple([user_id] + folder_ids))
+        execute_write(f"DELETE FROM folders WHERE id_users = %s AND id IN ({_placeholders(folder_ids)})", tuple([user_id] + folder_ids))
+
+    return {
+        "moved": len(doc_moves) + len(new_parent),
+        "renamed": len(doc_names) + len(folder_names),
+        "deleted": len(doc_deletes) + sum(1 for op in operations if op.kind == "folder" and op.action == "delete"),
+        "pending_deletions": queued,
+    }
@@ -0,0 +1,85 @@
+"""
+Versions des données d'un utilisateur et GET conditionnels des listings.
+
+users.change_version est incrémentée (bump_change_version) par toute écriture
+visible dans un listing: upload ou suppression de document, création ou
+suppression de dossier, création, modification, suppression ou consultation
+d'un partage. Dans une requête, l'incrément est validé avec l'écriture (même
+transaction); hors requête, il doit suivre l'écriture.
+
+/documents/list et /share/list renvoient un ETag dérivé de (user, version,
+URL). Si le client renvoie le même (If-None-Match), la réponse est un 304
+après une seule requête SQL, la lecture de la version, sans aucune requête
+de listing.
+
+La version est lue avant les données: une écriture concurrente donne au
+pire un ETag ancien sur des données récentes, jamais l'inverse.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from typing import Dict, Optional, Tuple
+
+from flask import Response, g, has_request_context, request
+
+from module.db import execute_write, fetch_one
+
+# Le navigateur garde la réponse mais la revalide à chaque fois (If-None-Match)
+LISTING_CACHE_CONTROL = "private, no-cache"
+
+
+def user_versions(user_id: int) -> Dict[str, int]:
+    """{"change": ..., "folder": ...} du user, lu une fois par requête HTTP."""
+    user_id = int(user_id)
+    memo = g.setdefault("_user_versions", {}) if has_request_context() else {}
+    if user_id not in memo:
+        row = fetch_one("SELECT change_version, folder_version FROM users WHERE id = %s", (user_id,))
+        memo[user_id] = {
+            "change": int(row["change_version"]) if row else 0,
+            "folder": int(row["folder_version"]) if row else 0,
+        }
+    return memo[user_id]
+
+
+def forget_user_versions(user_id: int) -> None:
+    if has_request_context():
+        g.get("_user_versions", {}).pop(int(user_id), None)
+
+
+def bump_change_version(user_id: int) -> None:
+    """À appeler avec toute écriture visible dans les listings du user."""
+    execute_write("UPDATE users SET change_version = change_version + 1 WHERE id = %s", (int(user_id),))
+    forget_user_versions(user_id)
+
+
+def listing_etag(user_id: int) -> str:
+    """ETag (sans guillemets) du listing demandé par la requête courante."""
+    version = user_versions(user_id)["change"]
+    # Même version, autres paramètres (dossier, tri, page, fields): autre contenu
+    args = "&".join(f"{key}={value}" for key, value in sorted(request.args.items(multi=True)))
+    digest = hashlib.blake2b(f"{request.path}?{args}".encode("utf-8"), digest_size=8).hexdigest()
+    return f"{int(user_id)}-{version}-{digest}"
+
+
+def not_modified(user_id: int) -> Tuple[str, Optional[Response]]:
+    """
+    (etag, réponse 304) si le client a déjà la version courante du listing,
+    (etag, None) sinon; passer ensuite la réponse à tag_listing().
+    """
+    etag = listing_etag(user_id)
+    if not request.if_none_match.contains_weak(etag):
+        return etag, None
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = LISTING_CACHE_CONTROL
+    return etag, response
+
+
+def tag_listing(result, etag: str):
+    """Ajoute l'ETag à un retour api_response() réussi."""
+    response, status = result
+    if status == 200:
+        response.set_etag(etag, weak=True)
+        response.headers["Cache-Control"] = LISTING_CACHE_CONTROL
+    return response, status
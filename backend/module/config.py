@@ -19,6 +19,117 @@ DATABASE_CONFIG = {
     "cursorclass": DictCursor,
 }
 
+# Pool de connexions MySQL (voir module/db_pool.py)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE") or 5)
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT") or 10)
+DB_POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT") or 300)
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME") or 1800)
+DB_POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER") or 30)
+
+# Écriture asynchrone des logs (voir module/log_sink.py)
+LOG_SINK_ENABLED = (os.getenv("LOG_SINK_ENABLED") or "1") not in ("0", "false", "False")
+LOG_SINK_BATCH_SIZE = int(os.getenv("LOG_SINK_BATCH_SIZE") or 200)
+LOG_SINK_FLUSH_INTERVAL = float(os.getenv("LOG_SINK_FLUSH_INTERVAL") or 1.0)
+LOG_SINK_MAX_QUEUE = int(os.getenv("LOG_SINK_MAX_QUEUE") or 10000)
+LOG_SINK_OVERFLOW = os.getenv("LOG_SINK_OVERFLOW") or "sync"
+
+# Instrumentation SQL par requête (voir module/query_stats.py)
+SQL_STATS_ENABLED = (os.getenv("SQL_STATS_ENABLED") or "1") not in ("0", "false", "False")
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS") or 200)
+# Désactivés par défaut: le header est visible de tout client, le résumé écrit
+# une ligne par requête et par worker. SQL_SERVER_TIMING_SITES (débogage)
+# ajoute au header le nombre de requêtes et les sites d'appel (fichier:ligne).
+SQL_SERVER_TIMING = (os.getenv("SQL_SERVER_TIMING") or "0") not in ("0", "false", "False")
+SQL_SERVER_TIMING_SITES = (os.getenv("SQL_SERVER_TIMING_SITES") or "0") not in ("0", "false", "False")
+SQL_REQUEST_SUMMARY = (os.getenv("SQL_REQUEST_SUMMARY") or "0") not in ("0", "false", "False")
+
+# Stockage des fichiers (voir module/storage.py)
+STORAGE_BACKEND = (os.getenv("STORAGE_BACKEND") or "minio").lower()
+STORAGE_LOCAL_ROOT = os.getenv("STORAGE_LOCAL_ROOT") or "/data/yoda-documents"
+STORAGE_LOCAL_FSYNC = (os.getenv("STORAGE_LOCAL_FSYNC") or "batch").lower()
+STORAGE_LOCAL_FSYNC_INTERVAL_MS = float(os.getenv("STORAGE_LOCAL_FSYNC_INTERVAL_MS") or 5)
+
+# Upload en flux (corps brut ou multipart): taille des parts envoyées au
+# stockage, donc mémoire max par upload. S3/MinIO impose au moins 5 MiB.
+UPLOAD_PART_SIZE = max(5 * 1024 * 1024, int(os.getenv("UPLOAD_PART_SIZE") or 5 * 1024 * 1024))
+# Téléchargement en flux: taille des blocs relus du stockage et envoyés au client
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE") or 256 * 1024)
+# Téléchargement par URL signée (?mode=url): durée de validité de l'URL. Il
+# suffit qu'elle soit valide au début du transfert.
+DOWNLOAD_URL_EXPIRES = int(os.getenv("DOWNLOAD_URL_EXPIRES") or 60)
+
+# Archive ZIP d'un dossier (/documents/folders/archive/<id>): nombre maximal de fichiers
+ARCHIVE_MAX_FILES = int(os.getenv("ARCHIVE_MAX_FILES") or 10000)
+
+# Upload direct vers MinIO en deux temps (/documents/upload/slot puis /commit)
+UPLOAD_URL_EXPIRES = int(os.getenv("UPLOAD_URL_EXPIRES") or 900)      # validité de l'URL PUT (début du transfert)
+UPLOAD_SLOT_TTL = int(os.getenv("UPLOAD_SLOT_TTL") or 6 * 3600)       # délai pour appeler /commit
+UPLOAD_SLOT_REAP_INTERVAL = float(os.getenv("UPLOAD_SLOT_REAP_INTERVAL") or 300)  # 0 = pas de nettoyage
+UPLOAD_SLOT_REAP_BATCH = int(os.getenv("UPLOAD_SLOT_REAP_BATCH") or 100)
+
+# Sessions d'upload par parts (/documents/upload/sessions), reprenables
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL") or 24 * 3600)
+UPLOAD_SESSION_PART_SIZE = int(os.getenv("UPLOAD_SESSION_PART_SIZE") or 8 * 1024 * 1024)
+# Moteur minio: plafonnée à 16 MiB (MINIO_MAX_PART_SIZE), une part y est
+# gardée en mémoire le temps de l'envoyer
+UPLOAD_SESSION_MAX_PART_SIZE = int(os.getenv("UPLOAD_SESSION_MAX_PART_SIZE") or 32 * 1024 * 1024)
+
+# Uploads idempotents (header Idempotency-Key, module/idempotency.py)
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL") or 24 * 3600)             # durée de vie d'une clé
+IDEMPOTENCY_WAIT = float(os.getenv("IDEMPOTENCY_WAIT") or 10)                 # attente d'un doublon concurrent (puis 409)
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT") or 900)  # clé en cours abandonnée (process tué)
+IDEMPOTENCY_REAP_INTERVAL = float(os.getenv("IDEMPOTENCY_REAP_INTERVAL") or 600)  # 0 = pas de nettoyage
+IDEMPOTENCY_REAP_BATCH = int(os.getenv("IDEMPOTENCY_REAP_BATCH") or 500)
+
+# Quotas de stockage par user (module/usage.py): 0 = illimité; users.quota_bytes /
+# users.quota_objects remplacent ces valeurs pour un user
+STORAGE_QUOTA_BYTES = int(os.getenv("STORAGE_QUOTA_BYTES") or 0)
+STORAGE_QUOTA_OBJECTS = int(os.getenv("STORAGE_QUOTA_OBJECTS") or 0)
+
+# Import d'une arborescence (POST /documents/import, module/batch_import.py).
+# Chaque fichier est une part du formulaire: au-delà de 1000 parts, relever
+# aussi MAX_FORM_PARTS (Flask).
+IMPORT_MAX_FILES = int(os.getenv("IMPORT_MAX_FILES") or 500)
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS") or 8)              # envois au stockage en parallèle
+IMPORT_INSERT_BATCH = int(os.getenv("IMPORT_INSERT_BATCH") or 500)  # lignes par INSERT multi-lignes
+
+# Opérations groupées (POST /documents/bulk, module/bulk.py)
+BULK_MAX_OPERATIONS = int(os.getenv("BULK_MAX_OPERATIONS") or 1000)
+
+# Taille de page maximale des listings paginés (?limit=, module/pagination.py)
+LIST_MAX_LIMIT = int(os.getenv("LIST_MAX_LIMIT") or 1000)
+
+# Recherche (GET /documents/search, module/search.py)
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE") or 50)
+SEARCH_MAX_TERMS = int(os.getenv("SEARCH_MAX_TERMS") or 8)
+# Doit valoir ngram_token_size du serveur MySQL (2 par défaut)
+SEARCH_NGRAM_TOKEN_SIZE = int(os.getenv("SEARCH_NGRAM_TOKEN_SIZE") or 2)
+
+# Arborescences de dossiers gardées en mémoire par worker (module/folder_tree.py), 0 = pas de cache
+FOLDER_TREE_CACHE_SIZE = int(os.getenv("FOLDER_TREE_CACHE_SIZE") or 1024)
+
+# File de suppression des objets (module/deletion_queue.py)
+DELETION_INTERVAL = float(os.getenv("DELETION_INTERVAL") or 5)  # 0 = file jamais vidée
+DELETION_BATCH = int(os.getenv("DELETION_BATCH") or 1000)
+DELETION_LEASE = int(os.getenv("DELETION_LEASE") or 300)        # lot repris par un autre worker après ce délai
+DELETION_RETRY_DELAY = int(os.getenv("DELETION_RETRY_DELAY") or 30)
+DELETION_MAX_RETRY_DELAY = int(os.getenv("DELETION_MAX_RETRY_DELAY") or 3600)
+
+# Rapprochement stockage / base (python -m module.reconcile)
+RECONCILE_WORKERS = int(os.getenv("RECONCILE_WORKERS") or 4)          # listings de préfixes en parallèle
+RECONCILE_BATCH = int(os.getenv("RECONCILE_BATCH") or 500)            # lignes par page SQL / objets par lot de réparation
+RECONCILE_MIN_AGE = int(os.getenv("RECONCILE_MIN_AGE") or 24 * 3600)  # objets plus récents jamais considérés orphelins
+RECONCILE_THROTTLE = float(os.getenv("RECONCILE_THROTTLE") or 0)     # pause (s) après chaque lot
+
+# /api/metrics: jeton Bearer exigé du scraper Prometheus. Sans jeton, la route
+# est réservée aux users connectés, sauf ouverture explicite (METRICS_PUBLIC=1)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or ""
+METRICS_PUBLIC = (os.getenv("METRICS_PUBLIC") or "0") not in ("0", "false", "False")
+
+# Tokens JWT déjà vérifiés gardés en mémoire par worker jusqu'à leur exp
+# (module/middleware.py), 0 = signature vérifiée à chaque requête
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE") or 1024)
+
 #SECRET_KEY = secrets.token_hex(4096)
 SECRET_KEY = "coucou"
 
@@ -1,9 +1,28 @@
-from contextlib import closing
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
 from typing import Optional
 
 import pymysql
+from flask import g, has_request_context, jsonify
 
-from .config import DATABASE_CONFIG
+from .config import (
+    DATABASE_CONFIG,
+    DB_POOL_IDLE_TIMEOUT,
+    DB_POOL_MAX_LIFETIME,
+    DB_POOL_PING_AFTER,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    LOG_SINK_BATCH_SIZE,
+    LOG_SINK_ENABLED,
+    LOG_SINK_FLUSH_INTERVAL,
+    LOG_SINK_MAX_QUEUE,
+    LOG_SINK_OVERFLOW,
+)
+from .db_pool import ConnectionPool
+from .log_sink import LogSink
+from .query_stats import record as record_query
 
 
 def get_db_connection():
@@ -11,38 +30,256 @@ def get_db_connection():
     return pymysql.connect(**DATABASE_CONFIG)
 
 
+def _pooled_connection():
+    # autocommit: une connexion rendue au pool ne garde jamais de transaction
+    # (ni de snapshot REPEATABLE READ) ouverte d'un emprunt à l'autre.
+    return pymysql.connect(**DATABASE_CONFIG, autocommit=True)
+
+
+pool = ConnectionPool(
+    _pooled_connection,
+    max_size=DB_POOL_SIZE,
+    timeout=DB_POOL_TIMEOUT,
+    idle_timeout=DB_POOL_IDLE_TIMEOUT,
+    max_lifetime=DB_POOL_MAX_LIFETIME,
+    ping_after=DB_POOL_PING_AFTER,
+)
+
+# Journaux (audit, accès aux partages): écrits en fond, hors unité de travail
+# de la requête, pour survivre à son rollback et ne pas coûter un aller-retour.
+log_sink = LogSink(
+    pool,
+    batch_size=LOG_SINK_BATCH_SIZE,
+    flush_interval=LOG_SINK_FLUSH_INTERVAL,
+    max_queue=LOG_SINK_MAX_QUEUE,
+    overflow=LOG_SINK_OVERFLOW,
+    enabled=LOG_SINK_ENABLED,
+)
+
+
+class DbSession:
+    """
+    Unité de travail: une connexion empruntée au pool pour toute la durée
+    d'une requête HTTP (ou d'un bloc transaction() hors requête).
+
+    - Les lectures tournent en autocommit tant qu'aucune écriture n'a eu lieu.
+    - La première écriture ouvre une transaction; elle est validée une seule
+      fois à la fin (commit()) ou annulée (rollback()).
+    - atomic() délimite un bloc tout-ou-rien (SAVEPOINT si une transaction
+      est déjà ouverte).
+    """
+
+    def __init__(self):
+        self._pooled = None
+        self._broken = False
+        self._depth = 0
+        self.in_transaction = False
+
+    @property
+    def connection(self):
+        if self._pooled is None:
+            self._pooled = pool.acquire()
+        return self._pooled.raw
+
+    def begin(self) -> None:
+        if not self.in_transaction:
+            self.connection.begin()
+            self.in_transaction = True
+
+    def commit(self) -> None:
+        if self.in_transaction:
+            self.in_transaction = False
+            self.connection.commit()
+
+    def rollback(self) -> None:
+        if self.in_transaction:
+            self.in_transaction = False
+            try:
+                self.connection.rollback()
+            except pymysql.err.MySQLError:
+                self._broken = True
+
+    def mark_broken(self) -> None:
+        self._broken = True
+
+    def close(self) -> None:
+        """Annule ce qui n'a pas été validé et rend la connexion au pool."""
+        if self._pooled is None:
+            return
+        self.rollback()
+        pooled, self._pooled = self._pooled, None
+        pool.release(pooled, discard=self._broken)
+
+    @contextmanager
+    def atomic(self):
+        if not self.in_transaction:
+            self.begin()
+            savepoint = None
+        else:
+            self._depth += 1
+            savepoint = f"yoda_sp_{self._depth}"
+            with self.connection.cursor() as cursor:
+                cursor.execute(f"SAVEPOINT {savepoint}")
+        try:
+            yield self.connection
+        except BaseException:
+            if savepoint is None:
+                self.rollback()
+            elif not self._broken:
+                with self.connection.cursor() as cursor:
+                    cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+            raise
+        finally:
+            if savepoint is not None:
+                self._depth -= 1
+
+
+_local = threading.local()
+
+
+def current_session() -> Optional[DbSession]:
+    """
+    Session de la requête en cours (créée à la demande sur flask.g), ou celle
+    d'un bloc transaction() ouvert hors requête sur ce thread, sinon None.
+    """
+    if has_request_context():
+        session = g.get("_db_session")
+        if session is None:
+            session = g._db_session = DbSession()
+        return session
+    return getattr(_local, "session", None)
+
+
+@contextmanager
+def transaction():
+    """
+    Bloc atomique: tout ce qui est exécuté dedans via les helpers est validé
+    ensemble ou pas du tout.
+
+    Dans une requête, le bloc s'inscrit dans la session de la requête (commit
+    unique en fin de requête). Hors requête (thread de fond, script), le bloc
+    ouvre sa propre session et valide à la sortie.
+    """
+    session = current_session()
+    owns_session = session is None
+    if owns_session:
+        session = _local.session = DbSession()
+    try:
+        with session.atomic() as connection:
+            yield connection
+        if owns_session:
+            session.commit()
+    finally:
+        if owns_session:
+            _local.session = None
+            session.close()
+
+
+@contextmanager
+def _cursor(write: bool = False):
+    session = current_session()
+    if session is None:
+        with pool.connection() as connection:
+            with connection.cursor() as cursor:
+                yield cursor
+        return
+
+    if write:
+        session.begin()
+    try:
+        with session.connection.cursor() as cursor:
+            yield cursor
+    except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+        session.mark_broken()
+        raise
+
+
 def fetch_one(query, params=None):
     """Run a query and return a single row."""
-    with closing(get_db_connection()) as connection:
-        with connection.cursor() as cursor:
-            cursor.execute(query, params or ())
-            return cursor.fetchone()
+    with _cursor() as cursor:
+        started = time.perf_counter()
+        cursor.execute(query, params or ())
+        row = cursor.fetchone()
+        record_query(query, started, cursor.rowcount)
+        return row
 
 
 def execute_write(query, params=None):
-    """Run an INSERT/UPDATE/DELETE and commit."""
-    with closing(get_db_connection()) as connection:
+    """Run an INSERT/UPDATE/DELETE (committed with the request's unit of work)."""
+    with _cursor(write=True) as cursor:
+        started = time.perf_counter()
+        cursor.execute(query, params or ())
+        record_query(query, started, cursor.rowcount)
+        return cursor.rowcount, cursor.lastrowid
+
+
+def execute_now(query, params=None):
+    """
+    Run an INSERT/UPDATE/DELETE on its own pooled connection, committed at
+    once: visible to other requests immediately, kept even if the request's
+    unit of work is rolled back.
+    """
+    with pool.connection() as connection:
         with connection.cursor() as cursor:
+            started = time.perf_counter()
             cursor.execute(query, params or ())
-            connection.commit()
+            record_query(query, started, cursor.rowcount)
             return cursor.rowcount, cursor.lastrowid
 
 
 def fetch_all(query, params=None):
     """Run a query and return all rows."""
-    with closing(get_db_connection()) as connection:
-        with connection.cursor() as cursor:
-            cursor.execute(query, params or ())
-            return cursor.fetchall()
+    with _cursor() as cursor:
+        started = time.perf_counter()
+        cursor.execute(query, params or ())
+        rows = cursor.fetchall()
+        record_query(query, started, cursor.rowcount)
+        return rows
+
+
+def _commit_request_session(response):
+    session = g.pop("_db_session", None)
+    if session is None:
+        return response
+    try:
+        if response.status_code >= 500:
+            session.rollback()
+        else:
+            session.commit()
+    except pymysql.err.MySQLError as exc:
+        print(f"[ERROR] Commit de la requête échoué: {exc}")
+        session.mark_broken()
+        response = jsonify({"status": "error", "message": "Erreur lors de l'enregistrement"})
+        response.status_code = 500
+    finally:
+        session.close()
+    return response
+
+
+def _close_request_session(exc=None):
+    # Chemin d'exception (after_request non appelé): rollback + retour au pool.
+    session = g.pop("_db_session", None)
+    if session is not None:
+        session.close()
+
+
+def init_app(app) -> None:
+    """Branche la session DB par requête sur l'application Flask."""
+    app.after_request(_commit_request_session)
+    app.teardown_request(_close_request_session)
+
 
 def update_logs(
     user_id, statut, action, ip_address: Optional[str] = None
 ) -> None:
     ip_value = ip_address or "0.0.0.0"
-    query = "INSERT INTO logs (id_users, statut, action, ip) VALUES (%s, %s, %s, %s)"
-    params = (user_id, statut, action, ip_value)
-
-    return execute_write(query, params)
+    # Horodatage pris maintenant: la ligne peut être écrite jusqu'à
+    # LOG_SINK_FLUSH_INTERVAL secondes plus tard.
+    log_sink.submit("logs", (user_id, statut, action, ip_value, datetime.utcnow()))
 
 
-    
+def log_shared_access(id_shared_file, ip_address, user_agent) -> None:
+    log_sink.submit(
+        "shared_acces_log",
+        (id_shared_file, datetime.utcnow(), str(ip_address), str(user_agent)),
+    )
@@ -0,0 +1,188 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Optional
+
+import pymysql
+
+
+class PoolTimeout(Exception):
+    """Aucune connexion disponible dans le délai imparti."""
+
+
+class _PooledConnection:
+    __slots__ = ("raw", "created_at", "last_used")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """
+    Pool de connexions MySQL borné, thread-safe et compatible fork (gunicorn).
+
+    - max_size: nombre maximum de connexions ouvertes (en service + au repos)
+    - timeout: attente maximale (s) d'une connexion libre avant PoolTimeout
+    - idle_timeout: une connexion au repos depuis plus longtemps est fermée
+    - max_lifetime: une connexion plus vieille est recyclée au checkout
+    - ping_after: au-delà de cette inactivité, la connexion est pingée avant usage
+
+    Les connexions au repos sont réutilisées en LIFO: les plus récentes restent
+    chaudes, les plus anciennes finissent par expirer via idle_timeout.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], pymysql.connections.Connection],
+        max_size: int = 5,
+        timeout: float = 10.0,
+        idle_timeout: float = 300.0,
+        max_lifetime: float = 1800.0,
+        ping_after: float = 30.0,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be >= 1")
+        self._factory = factory
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+        self._init_state()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._init_state)
+
+    def _init_state(self) -> None:
+        # Après un fork, les sockets hérités appartiennent au parent: on les
+        # abandonne sans COM_QUIT (fermer le fd côté enfant ne coupe pas le parent).
+        self._cond = threading.Condition(threading.Lock())
+        self._idle: Deque[_PooledConnection] = deque()
+        self._size = 0
+        self._pid = os.getpid()
+
+    def _check_pid(self) -> None:
+        if self._pid != os.getpid():
+            self._init_state()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def idle_count(self) -> int:
+        return len(self._idle)
+
+    def _expired(self, pooled: _PooledConnection, now: float) -> bool:
+        return (
+            now - pooled.created_at > self.max_lifetime
+            or now - pooled.last_used > self.idle_timeout
+        )
+
+    def _evict_idle(self, now: float) -> list:
+        """Retire (sous verrou) les connexions au repos expirées; à fermer hors verrou."""
+        evicted = []
+        # Les plus anciennes sont à gauche (release() ajoute à droite).
+        while self._idle and self._expired(self._idle[0], now):
+            evicted.append(self._idle.popleft())
+            self._size -= 1
+        return evicted
+
+    @staticmethod
+    def _close(pooled: _PooledConnection) -> None:
+        try:
+            pooled.raw.close()
+        except Exception:
+            pooled.raw._force_close()
+
+    def _healthy(self, pooled: _PooledConnection, now: float) -> bool:
+        if now - pooled.created_at > self.max_lifetime:
+            return False
+        if now - pooled.last_used <= self.ping_after:
+            return True
+        try:
+            pooled.raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def acquire(self) -> _PooledConnection:
+        self._check_pid()
+        deadline = time.monotonic() + self.timeout
+        while True:
+            pooled = None
+            with self._cond:
+                evicted = self._evict_idle(time.monotonic())
+                while pooled is None:
+                    if self._idle:
+                        pooled = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f"Aucune connexion MySQL libre après {self.timeout}s (pool={self.max_size})"
+                        )
+                    self._cond.wait(remaining)
+            for stale in evicted:
+                self._close(stale)
+
+            if pooled is None:
+                try:
+                    return _PooledConnection(self._factory())
+                except Exception:
+                    self._discard_slot()
+                    raise
+
+            if self._healthy(pooled, time.monotonic()):
+                return pooled
+            self._close(pooled)
+            self._discard_slot()
+
+    def release(self, pooled: _PooledConnection, discard: bool = False) -> None:
+        if self._pid != os.getpid():
+            return
+        if discard or not pooled.raw.open:
+            self._close(pooled)
+            self._discard_slot()
+            return
+        pooled.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(pooled)
+            evicted = self._evict_idle(pooled.last_used)
+            self._cond.notify()
+        for stale in evicted:
+            self._close(stale)
+
+    def _discard_slot(self) -> None:
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Emprunte une connexion; elle est rendue au pool (ou jetée si cassée)."""
+        pooled = self.acquire()
+        try:
+            yield pooled.raw
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            self.release(pooled, discard=True)
+            raise
+        except BaseException:
+            self.release(pooled)
+            raise
+        else:
+            self.release(pooled)
+
+    def close_all(self) -> None:
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            self._close(pooled)
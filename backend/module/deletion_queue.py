@@ -0,0 +1,153 @@
+"""
+Suppression différée des objets du stockage (table deletion_queue).
+
+Les routes de suppression n'appellent plus le stockage. Elles enregistrent
+une "tombstone" par objet dans la même transaction que le DELETE des lignes:
+- si la transaction échoue, rien n'est supprimé
+- le coût de la requête HTTP ne dépend plus du nombre de fichiers
+
+Un thread de fond par worker vide la file par lots (DELETION_BATCH, une
+requête DeleteObjects S3 par tranche de 1000 clés). Les objets en échec
+sont retentés plus tard, avec un délai qui double à chaque tentative. Deux
+workers peuvent traiter la file en même temps: un lot est réservé (lease)
+avant d'être traité, et supprimer deux fois un objet est sans effet.
+"""
+
+from __future__ import annotations
+
+import secrets
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from module.config import (
+    DELETION_BATCH,
+    DELETION_INTERVAL,
+    DELETION_LEASE,
+    DELETION_MAX_RETRY_DELAY,
+    DELETION_RETRY_DELAY,
+)
+from module.db import execute_write, fetch_all, fetch_one
+from module.metrics import count_deleted_objects
+from module.periodic import PeriodicTask
+from module.storage import delete_files
+
+
+def tombstone_documents(where: str, params: tuple) -> int:
+    """
+    Met en file les objets des documents sélectionnés et de leurs partages.
+
+    À appeler juste avant le DELETE de ces documents, dans la même
+    transaction: supprimer un document supprime aussi ses partages (ON DELETE
+    CASCADE) et leurs copies "<user_id>_shared/...".
+
+    Args:
+        where: condition SQL sur la table documents, aliasée `d`
+        params: paramètres de la condition
+
+    Returns:
+        Nombre d'objets mis en file
+    """
+    now = datetime.utcnow()
+    queued, _ = execute_write(
+        f"INSERT INTO deletion_queue (id_users, object_name, next_attempt_at) SELECT d.id_users, d.object_name, %s FROM documents d WHERE {where}",
+        (now,) + tuple(params),
+    )
+    shared, _ = execute_write(
+        f"INSERT INTO deletion_queue (id_users, object_name, next_attempt_at) SELECT d.id_users, s.object_name, %s FROM shared_files s JOIN documents d ON s.id_document = d.id WHERE {where}",
+        (now,) + tuple(params),
+    )
+    return queued + shared
+
+
+def tombstone_objects(user_id: Optional[int], object_names: Iterable[str]) -> int:
+    """Met en file des objets nommés explicitement; retourne leur nombre."""
+    now = datetime.utcnow()
+    rows = [(user_id, name, now) for name in object_names if name]
+    if not rows:
+        return 0
+    placeholders = ", ".join(["(%s, %s, %s)"] * len(rows))
+    queued, _ = execute_write(
+        f"INSERT INTO deletion_queue (id_users, object_name, next_attempt_at) VALUES {placeholders}",
+        tuple(value for row in rows for value in row),
+    )
+    return queued
+
+
+def pending_deletions(user_id: int) -> dict:
+    """Avancement pour l'utilisateur: objets encore en file, dont ceux déjà en échec."""
+    row = fetch_one(
+        "SELECT COUNT(*) AS pending, COALESCE(SUM(attempts > 0), 0) AS retrying FROM deletion_queue WHERE id_users = %s",
+        (user_id,),
+    )
+    return {"pending": int(row["pending"] or 0), "retrying": int(row["retrying"] or 0)}
+
+
+def _retry_delay(attempts: int) -> int:
+    return min(DELETION_RETRY_DELAY * 2 ** max(attempts - 1, 0), DELETION_MAX_RETRY_DELAY)
+
+
+def process_deletions(limit: int = DELETION_BATCH) -> int:
+    """
+    Traite un lot de la file. Retourne le nombre d'entrées traitées
+    (supprimées ou reportées), 0 si la file est vide.
+    """
+    now = datetime.utcnow()
+    lease = secrets.token_hex(16)
+    # Réserve le lot: un autre worker ne le reprendra qu'après DELETION_LEASE
+    # (si ce process meurt en cours de route)
+    execute_write(
+        "UPDATE deletion_queue SET lease = %s, next_attempt_at = %s WHERE next_attempt_at <= %s AND id IN "
+        "(SELECT id FROM (SELECT id FROM deletion_queue WHERE next_attempt_at <= %s ORDER BY next_attempt_at, id LIMIT %s) AS batch)",
+        (lease, now + timedelta(seconds=DELETION_LEASE), now, now, limit),
+    )
+    rows = fetch_all("SELECT id, object_name, attempts FROM deletion_queue WHERE lease = %s", (lease,))
+    if not rows:
+        return 0
+
+    try:
+        errors = delete_files(sorted({row["object_name"] for row in rows}))
+    except Exception as e:
+        # Requête entière en échec (stockage injoignable): tout le lot est reporté
+        errors = {row["object_name"]: str(e) for row in rows}
+
+    done = [row["id"] for row in rows if row["object_name"] not in errors]
+    if done:
+        placeholders = ", ".join(["%s"] * len(done))
+        execute_write(f"DELETE FROM deletion_queue WHERE id IN ({placeholders})", tuple(done))
+        count_deleted_objects("removed", len(done))
+
+    failed = [row for row in rows if row["object_name"] in errors]
+    for row in failed:
+        attempts = row["attempts"] + 1
+        execute_write(
+            "UPDATE deletion_queue SET attempts = %s, last_error = %s, lease = NULL, next_attempt_at = %s WHERE id = %s",
+            (attempts, errors[row["object_name"]][:255], now + timedelta(seconds=_retry_delay(attempts)), row["id"]),
+        )
+    if failed:
+        count_deleted_objects("failed", len(failed))
+        print(f"[WARNING] Suppression: {len(failed)} objet(s) en échec, nouvel essai plus tard "
+              f"(ex: {failed[0]['object_name']}: {errors[failed[0]['object_name']]})")
+    return len(rows)
+
+
+def drain_deletions(limit: int = DELETION_BATCH) -> int:
+    """Vide la file (lots successifs) tant qu'il y a des entrées prêtes; retourne le total traité."""
+    total = 0
+    started = time.perf_counter()
+    while True:
+        processed = process_deletions(limit)
+        total += processed
+        if processed < limit:
+            break
+    if total:
+        print(f"[INFO] Suppression: {total} objet(s) traité(s) en {time.perf_counter() - started:.1f}s")
+    return total
+
+
+deletion_worker = PeriodicTask("deletion-queue", DELETION_INTERVAL, drain_deletions)
+
+
+def init_app(app) -> None:
+    """Démarre le traitement de la file de suppression dans chaque worker."""
+    app.before_request(deletion_worker.start)
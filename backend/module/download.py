@@ -0,0 +1,147 @@
+"""
+Réponse HTTP de téléchargement d'un fichier stocké.
+
+Le fichier n'est jamais chargé entier en mémoire:
+- stockage local: fichier ouvert et passé au wsgi.file_wrapper (sendfile sous
+  gunicorn) quand la plage va jusqu'à la fin du fichier
+- sinon: le corps est relayé par blocs (DOWNLOAD_CHUNK_SIZE) et la connexion
+  MinIO est libérée dès que le client se déconnecte
+
+Range / If-Range sont honorés, y compris pour le POST de /share/download: une
+seule plage par requête (réponse 206), un téléchargement interrompu peut
+reprendre où il s'est arrêté.
+
+Mode URL signée (?mode=url, ou "mode": "url" dans le JSON): la route renvoie
+en JSON une URL MinIO de courte durée et le client télécharge directement,
+sans occuper un worker gunicorn. Les fichiers sont chiffrés de bout en bout:
+seul le transfert quitte le backend, les contrôles d'accès restent dans la route.
+"""
+
+import unicodedata
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+from flask import Response, make_response, request
+from werkzeug.datastructures import ContentRange
+from werkzeug.wsgi import wrap_file
+
+from .api_retour import api_response
+from .config import DOWNLOAD_URL_EXPIRES
+from .metrics import count_storage_bytes
+from .storage import StoredObject, local_file_path, presigned_download_url, stat_file, stream_file
+
+
+def wants_download_url() -> bool:
+    """Le client demande une URL signée plutôt que le fichier (?mode=url ou "mode": "url")."""
+    mode = request.args.get("mode")
+    if mode is None and request.is_json:
+        mode = (request.get_json(silent=True) or {}).get("mode")
+    return mode == "url"
+
+
+def download_url_response(user_id, object_name: str, download_name: str, crypto: dict) -> Optional[Response]:
+    """
+    Réponse JSON {url, expires_in, file_name, dek_encrypted, iv, sha256}.
+
+    Returns:
+        None si le moteur de stockage ne produit pas d'URL: la route envoie
+        alors le fichier (send_stored_file)
+    """
+    url = presigned_download_url(user_id, object_name, download_name, DOWNLOAD_URL_EXPIRES)
+    if url is None:
+        return None
+    response = make_response(api_response({
+        "status": "success",
+        "data": {
+            "url": url,
+            "expires_in": DOWNLOAD_URL_EXPIRES,
+            "file_name": download_name,
+            **crypto,
+        }
+    }, 200, None, None))
+    # L'URL donne accès au fichier jusqu'à expiration: pas de cache
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+def _if_range_matches(info: StoredObject) -> bool:
+    if_range = request.if_range
+    if if_range.etag is not None:
+        return info.etag is not None and if_range.etag == info.etag.strip('"')
+    if if_range.date is not None:
+        return info.last_modified is not None and if_range.date == info.last_modified.replace(microsecond=0)
+    return True
+
+
+def requested_range(size: int, info: Optional[StoredObject] = None) -> Tuple[Optional[Tuple[int, int]], bool]:
+    """
+    Plage demandée par le header Range.
+
+    Returns:
+        ((start, stop), True) pour une plage valide, (None, True) si elle est
+        hors du fichier (416), (None, False) pour envoyer le fichier entier
+    """
+    ranges = request.range
+    if ranges is None or ranges.units != "bytes" or len(ranges.ranges) != 1:
+        return None, False
+    if info is not None and not _if_range_matches(info):
+        return None, False
+    bounds = ranges.range_for_length(size)
+    return bounds, True
+
+
+def set_attachment(response: Response, download_name: str) -> None:
+    # Même encodage que send_file(download_name=...)
+    try:
+        download_name.encode("ascii")
+        response.headers.set("Content-Disposition", "attachment", filename=download_name)
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize("NFKD", download_name).encode("ascii", "ignore").decode("ascii")
+        quoted = quote(download_name, safe="!#$&+^`|~")
+        response.headers.set("Content-Disposition", "attachment", filename=simple, **{"filename*": f"UTF-8''{quoted}"})
+
+
+def send_stored_file(user_id, object_name: str, download_name: str, log_user_id=None) -> Response:
+    """
+    Réponse de téléchargement (200 ou 206) d'un fichier de l'utilisateur.
+
+    Args:
+        user_id: propriétaire dans le stockage (préfixe de object_name)
+        object_name: nom de l'objet
+        download_name: nom proposé au navigateur
+        log_user_id: utilisateur à journaliser si la plage est invalide (416)
+    """
+    info = stat_file(user_id, object_name)
+    bounds, is_range = requested_range(info.size, info)
+    if is_range and bounds is None:
+        response = make_response(api_response(
+            {"status": "error", "message": "Plage demandée invalide"},
+            416,
+            log_user_id,
+            "Download failed: range not satisfiable" if log_user_id is not None else None,
+        ))
+        response.headers["Content-Range"] = f"bytes */{info.size}"
+        return response
+
+    start, stop = bounds if bounds is not None else (0, info.size)
+    file_path = local_file_path(user_id, object_name)
+    if file_path is not None and stop == info.size:
+        # Jusqu'à la fin du fichier: le serveur WSGI envoie depuis la position courante
+        file = open(file_path, "rb")
+        file.seek(start)
+        body = wrap_file(request.environ, file)
+        count_storage_bytes("download", stop - start)
+    else:
+        body = stream_file(user_id, object_name, start, stop - start)
+    response = Response(body, status=206 if bounds is not None else 200,
+                        mimetype="application/octet-stream", direct_passthrough=True)
+    response.content_length = stop - start
+    response.accept_ranges = "bytes"
+    if bounds is not None:
+        response.content_range = ContentRange("bytes", start, stop, info.size)
+    if info.etag:
+        response.set_etag(info.etag.strip('"'))
+    if info.last_modified is not None:
+        response.last_modified = info.last_modified
+    set_attachment(response, download_name)
+    return response
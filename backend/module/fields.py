@@ -0,0 +1,89 @@
+"""
+Sélection des champs renvoyés par les listings (?fields=).
+
+Chaque listing déclare ses champs: nom dans la réponse -> colonne SQL (et
+éventuellement un formatage). Le client demande un sous-ensemble, par ex.
+?fields=object_name,file_name,size; seules les colonnes correspondantes sont
+lues en base et sérialisées. Sans fields, tous les champs sont renvoyés,
+comme avant.
+
+Les métadonnées de chiffrement (DEK wrappée ~700 caractères, IV, hash) sont
+ensuite lues à la demande, par lot (POST /documents/crypto, /share/crypto).
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+from module.config import LIST_MAX_LIMIT
+
+
+class FieldsError(ValueError):
+    """Paramètre fields invalide (message renvoyé au client, 400)."""
+
+
+def isoformat(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+class Field(NamedTuple):
+    column: str  # expression SQL; le résultat est lu sous le nom du champ
+    format: Optional[Callable[[Any], Any]] = None
+
+
+class FieldSet:
+    """Champs d'un listing, dans l'ordre de la réponse."""
+
+    def __init__(self, fields: Dict[str, Field]):
+        self.fields = fields
+
+    def parse(self, raw: Optional[str]) -> List[str]:
+        """Champs demandés (tous si raw est vide), FieldsError si l'un est inconnu."""
+        if not raw:
+            return list(self.fields)
+        wanted = {name.strip() for name in raw.split(",") if name.strip()}
+        unknown = wanted - self.fields.keys()
+        if unknown:
+            raise FieldsError(f"Champs inconnus: {', '.join(sorted(unknown))} (disponibles: {', '.join(self.fields)})")
+        if not wanted:
+            raise FieldsError("fields vide")
+        return [name for name in self.fields if name in wanted]
+
+    def select(self, names: Sequence[str], extra: Iterable[str] = ()) -> str:
+        """
+        Liste SELECT des champs demandés, plus les colonnes `extra` nécessaires
+        à la requête elle-même (tri, curseur), lues sous leur propre nom.
+        """
+        columns = [f"{self.fields[name].column} AS {name}" for name in names]
+        columns += [column for column in dict.fromkeys(extra) if column not in names]
+        return ", ".join(columns)
+
+    def project(self, row: Dict[str, Any], names: Sequence[str]) -> Dict[str, Any]:
+        result = {}
+        for name in names:
+            fmt = self.fields[name].format
+            result[name] = fmt(row[name]) if fmt else row[name]
+        return result
+
+
+def parse_id_list(payload: Any, key: str, item_type: type) -> List[Any]:
+    """
+    Liste d'identifiants d'un corps JSON ({key: [...]}) pour les lookups par
+    lot: dédoublonnée, au plus LIST_MAX_LIMIT éléments. FieldsError sinon.
+    """
+    values = payload.get(key) if isinstance(payload, dict) else None
+    if not isinstance(values, list) or not values:
+        raise FieldsError(f"{key} doit être une liste non vide")
+    if len(values) > LIST_MAX_LIMIT:
+        raise FieldsError(f"Au plus {LIST_MAX_LIMIT} éléments par requête")
+    try:
+        items = [item_type(value) for value in values]
+    except (TypeError, ValueError):
+        raise FieldsError(f"{key} invalide")
+    if item_type is str and not all(items):
+        raise FieldsError(f"{key} invalide")
+    return list(dict.fromkeys(items))
@@ -1,8 +1,13 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-from module.db import execute_write, fetch_all, fetch_one
+from module.db import execute_write, fetch_all
+from module.folder_tree import bump_folder_version, get_tree
+from module.pagination import keyset_condition
+
+# Clé de tri des dossiers -> colonne (index (id_users, parent_id, <colonne>, id))
+FOLDER_SORT_COLUMNS = {"name": "nom", "date": "created_at"}
 
 
 def get_folder(user_id: int, folder_id: int) -> Optional[Dict[str, Any]]:
@@ -18,13 +23,23 @@ def get_folder(user_id: int, folder_id: int) -> Optional[Dict[str, Any]]:
     Sortie:
     - dict (ligne SQL: id, id_users, nom, parent_id, created_at) ou None si introuvable / non autorisé.
     """
-    return fetch_one(
-        "SELECT id, id_users, nom, parent_id, created_at FROM folders WHERE id = %s AND id_users = %s",
-        (folder_id, user_id),
-    )
-
-
-def list_child_folders(user_id: int, parent_id: Optional[int]) -> List[Dict[str, Any]]:
+    if folder_id is None:
+        return None
+    tree = get_tree(user_id)
+    p = tree.position(folder_id)
+    if p is None:
+        return None
+    return tree.row(p)
+
+
+def list_child_folders(
+    user_id: int,
+    parent_id: Optional[int],
+    sort: str = "name",
+    descending: bool = False,
+    after: Optional[Tuple[Any, int]] = None,
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
     """
     Liste les sous-dossiers directs d'un dossier (ou la racine si parent_id=None).
 
@@ -33,38 +48,59 @@ def list_child_folders(user_id: int, parent_id: Optional[int]) -> List[Dict[str,
 
     Entrée:
     - parent_id: None => racine du user (parent_id IS NULL), sinon ID du dossier parent
+    - sort: "name" (défaut) ou "date"; les dossiers n'ont pas de taille, "size" trie par nom
+    - after: (valeur de tri, id) du dernier dossier de la page précédente
+    - limit: nombre maximal de dossiers (None = tous)
 
     Sortie:
     - Liste de dicts au format attendu par le frontend: {id, name, created_at(ISO|None)}
     """
+    if limit is None:
+        # Listing complet: depuis l'arborescence en cache
+        tree = get_tree(user_id)
+        p = tree.position(parent_id)
+        if p is None:
+            return []
+        # L'arbre range les enfants dans l'ordre des noms (collation MySQL)
+        children = list(tree.children(p))
+        if sort == "date":
+            children.sort(key=lambda c: (tree.created[c], tree.ids[c]))
+        if descending:
+            children.reverse()
+        return [_folder_item(tree.row(child)) for child in children]
+
+    # Page: parcours borné de l'index, tri et curseur comparés par MySQL
+    # (collation de la colonne), comme pour les documents
+    column = FOLDER_SORT_COLUMNS.get(sort, "nom")
+    direction = "DESC" if descending else "ASC"
+    query = "SELECT id, nom, created_at FROM folders WHERE id_users = %s"
+    params: List[Any] = [user_id]
     if parent_id is None:
-        rows = fetch_all(
-            "SELECT id, nom, created_at FROM folders WHERE id_users = %s AND parent_id IS NULL ORDER BY nom ASC",
-            (user_id,),
-        )
+        query += " AND parent_id IS NULL"
+    else:
+        query += " AND parent_id = %s"
+        params.append(parent_id)
+    if after is not None:
+        query += " AND " + keyset_condition(column, descending)
+        params += [after[0], after[1]]
+    query += f" ORDER BY {column} {direction}, id {direction} LIMIT %s"
+    params.append(limit)
+    return [_folder_item(row) for row in fetch_all(query, tuple(params))]
+
+
+def _folder_item(r: Dict[str, Any]) -> Dict[str, Any]:
+    created_at = r.get("created_at")
+    if created_at is None:
+        created_at_value = None
+    elif hasattr(created_at, "isoformat"):
+        created_at_value = created_at.isoformat()
     else:
-        rows = fetch_all(
-            "SELECT id, nom, created_at FROM folders WHERE id_users = %s AND parent_id = %s ORDER BY nom ASC",
-            (user_id, parent_id),
-        )
-
-    folders: List[Dict[str, Any]] = []
-    for r in rows:
-        created_at = r.get("created_at")
-        if created_at is None:
-            created_at_value = None
-        elif hasattr(created_at, "isoformat"):
-            created_at_value = created_at.isoformat()
-        else:
-            created_at_value = str(created_at)
-        folders.append(
-            {
-                "id": int(r["id"]),
-                "name": r.get("nom") or "",
-                "created_at": created_at_value,
-            }
-        )
-    return folders
+        created_at_value = str(created_at)
+    return {
+        "id": int(r["id"]),
+        "name": r.get("nom") or "",
+        "created_at": created_at_value,
+    }
 
 
 def create_folder(user_id: int, name: str, parent_id: Optional[int]) -> int:
@@ -88,6 +124,12 @@ def create_folder(user_id: int, name: str, parent_id: Optional[int]) -> int:
         # Important: interdit de créer un dossier sous un parent d'un autre user.
         raise PermissionError("Parent introuvable ou non autorisé")
 
+    folder_id = _insert_folder(user_id, name, parent_id)
+    bump_folder_version(user_id)
+    return folder_id
+
+
+def _insert_folder(user_id: int, name: str, parent_id: Optional[int]) -> int:
     _, folder_id = execute_write(
         "INSERT INTO folders (id_users, nom, parent_id) VALUES (%s, %s, %s)",
         (user_id, name, parent_id),
@@ -95,6 +137,57 @@ def create_folder(user_id: int, name: str, parent_id: Optional[int]) -> int:
     return int(folder_id)
 
 
+def create_folder_paths(
+    user_id: int, parent_id: Optional[int], paths: Iterable[Tuple[str, ...]]
+) -> Dict[Tuple[str, ...], Optional[int]]:
+    """
+    Crée les dossiers manquants de chaque chemin sous parent_id (mkdir -p).
+
+    Utilisé par:
+    - POST /api/documents/import
+
+    Entrée:
+    - paths: chemins relatifs à parent_id, en tuples de noms (("a", "b") = a/b)
+
+    Sortie:
+    - {chemin: ID du dossier} pour chaque chemin et chacun de ses préfixes,
+      () => parent_id
+
+    Les dossiers existants (même nom sous le même parent) sont réutilisés.
+    L'arborescence est lue une fois et la version incrémentée une fois, au
+    lieu d'un create_folder (relecture de l'arbre) par niveau.
+    """
+    tree = get_tree(user_id)
+    start = tree.position(parent_id)
+    if start is None:
+        raise PermissionError("Parent introuvable ou non autorisé")
+
+    prefixes = {path[:depth] for path in paths for depth in range(1, len(path) + 1)}
+    ids: Dict[Tuple[str, ...], Optional[int]] = {(): parent_id}
+    existing: Dict[Tuple[str, ...], Dict[str, int]] = {}
+    created = False
+    # Tri des tuples: un préfixe passe toujours avant ses prolongements
+    for path in sorted(prefixes):
+        parent = path[:-1]
+        if parent not in existing:
+            # Dossier créé par cet appel: absent de l'arbre, donc sans enfants
+            p = tree.position(ids[parent])
+            children: Dict[str, int] = {}
+            if p is not None:
+                for child in tree.children(p):
+                    children.setdefault(tree.names[child], tree.ids[child])
+            existing[parent] = children
+        folder_id = existing[parent].get(path[-1])
+        if folder_id is None:
+            folder_id = _insert_folder(user_id, path[-1], ids[parent])
+            created = True
+        ids[path] = folder_id
+
+    if created:
+        bump_folder_version(user_id)
+    return ids
+
+
 def build_breadcrumb(user_id: int, folder_id: Optional[int]) -> List[Dict[str, Any]]:
     """
     Construit le fil d'Ariane (breadcrumb) d'un dossier: racine -> dossier courant.
@@ -109,23 +202,12 @@ def build_breadcrumb(user_id: int, folder_id: Optional[int]) -> List[Dict[str, A
     if folder_id is None:
         return []
 
-    crumbs: List[Dict[str, Any]] = []
-    current: Optional[int] = int(folder_id)
-    seen: Set[int] = set()
-
-    while current is not None and current not in seen:
-        seen.add(current)
-        row = fetch_one(
-            "SELECT id, nom, parent_id FROM folders WHERE id_users = %s AND id = %s",
-            (user_id, current),
-        )
-        if row is None:
-            break
-        crumbs.append({"id": int(row["id"]), "name": row.get("nom") or ""})
-        current = row.get("parent_id")
+    tree = get_tree(user_id)
+    p = tree.position(folder_id)
+    if p is None:
+        return []
+    return [{"id": tree.ids[a], "name": tree.names[a]} for a in tree.ancestors(p)]
 
-    crumbs.reverse()
-    return crumbs
 
 def get_descendant_folder_ids(user_id: int, folder_id: int, include_self: bool = True) -> List[int]:
     """
@@ -137,26 +219,11 @@ def get_descendant_folder_ids(user_id: int, folder_id: int, include_self: bool =
     Sortie:
     - Liste d'IDs (int). include_self=True inclut folder_id dans la liste.
     """
-    if get_folder(user_id, folder_id) is None:
+    tree = get_tree(user_id)
+    p = tree.position(folder_id)
+    if p is None or folder_id is None:
         raise PermissionError("Dossier introuvable ou non autorisé")
 
-    rows = fetch_all("SELECT id, parent_id FROM folders WHERE id_users = %s", (user_id,))
-    children: Dict[Optional[int], List[int]] = {}
-    for r in rows:
-        pid = r.get("parent_id")
-        children.setdefault(pid, []).append(int(r["id"]))
-
     result: List[int] = [int(folder_id)] if include_self else []
-    stack: List[int] = [int(folder_id)]
-    seen: Set[int] = {int(folder_id)}
-
-    while stack:
-        current = stack.pop()
-        for cid in children.get(current, []):
-            if cid in seen:
-                continue
-            seen.add(cid)
-            result.append(cid)
-            stack.append(cid)
-
+    result.extend(tree.ids[d] for d in tree.descendants(p))
     return result
@@ -0,0 +1,159 @@
+"""
+Cache par utilisateur de l'arborescence des dossiers.
+
+L'arborescence est chargée en une requête (tous les dossiers du user). Elle
+répond ensuite en mémoire à get_folder, list_child_folders, build_breadcrumb
+et get_descendant_folder_ids (module/folder.py).
+
+Cohérence entre workers gunicorn:
+- chaque modification de dossiers incrémente users.folder_version (et
+  change_version, voir module/change_version.py) dans la même transaction
+  (bump_folder_version)
+- avant usage, la version en base est relue (une requête sur la clé
+  primaire, une fois par requête HTTP, partagée avec l'ETag des listings);
+  si elle diffère de celle du cache, l'arbre est rechargé
+- un arbre lu dans une transaction non validée n'est jamais mis en cache
+"""
+
+from __future__ import annotations
+
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from module.change_version import forget_user_versions, user_versions
+from module.config import FOLDER_TREE_CACHE_SIZE
+from module.db import current_session, execute_write, fetch_all
+
+_NO_PARENT = -1  # parent inconnu (incohérence en base): dossier hors de l'arbre
+
+
+class FolderTree:
+    """
+    Arborescence figée d'un utilisateur, en tableaux parallèles.
+
+    - un dossier par position, dans l'ordre des noms (ORDER BY nom de MySQL)
+    - parents[p]: position du parent, n pour la racine
+    - enfants en CSR: les positions des enfants de p sont
+      child_index[child_start[p]:child_start[p + 1]], p = n pour la racine
+    """
+
+    __slots__ = ("user_id", "version", "ids", "names", "created", "parents", "child_start", "child_index", "_pos")
+
+    def __init__(self, user_id: int, version: int, rows: List[Dict[str, Any]]):
+        n = len(rows)
+        self.user_id = user_id
+        self.version = version
+        self.ids = array("q", (int(r["id"]) for r in rows))
+        self.names = [r.get("nom") or "" for r in rows]
+        self.created = [r.get("created_at") for r in rows]
+        self._pos = {folder_id: p for p, folder_id in enumerate(self.ids)}
+
+        self.parents = array("q", [n]) * n
+        counts = array("q", [0]) * (n + 3)
+        for p, r in enumerate(rows):
+            parent_id = r.get("parent_id")
+            parent = n if parent_id is None else self._pos.get(int(parent_id), _NO_PARENT)
+            self.parents[p] = parent
+            if parent != _NO_PARENT:
+                counts[parent + 2] += 1
+        for p in range(2, n + 3):
+            counts[p] += counts[p - 1]
+        # counts[p + 1] sert de curseur d'écriture pour les enfants de p; une
+        # fois rempli, counts[p] est le début des enfants de p
+        self.child_index = array("q", [0]) * counts[n + 2]
+        for p, parent in enumerate(self.parents):
+            if parent != _NO_PARENT:
+                self.child_index[counts[parent + 1]] = p
+                counts[parent + 1] += 1
+        self.child_start = counts[: n + 2]
+
+    def position(self, folder_id: Optional[int]) -> Optional[int]:
+        """Position du dossier (n pour la racine), None s'il n'appartient pas au user."""
+        if folder_id is None:
+            return len(self.ids)
+        return self._pos.get(int(folder_id))
+
+    def row(self, p: int) -> Dict[str, Any]:
+        parent = self.parents[p]
+        return {
+            "id": self.ids[p],
+            "id_users": self.user_id,
+            "nom": self.names[p],
+            "parent_id": self.ids[parent] if 0 <= parent < len(self.ids) else None,
+            "created_at": self.created[p],
+        }
+
+    def children(self, p: int) -> array:
+        return self.child_index[self.child_start[p]: self.child_start[p + 1]]
+
+    def ancestors(self, p: int) -> List[int]:
+        """Positions de la racine jusqu'à p inclus."""
+        path: List[int] = []
+        n = len(self.ids)
+        while 0 <= p < n and len(path) <= n:
+            path.append(p)
+            p = self.parents[p]
+        path.reverse()
+        return path
+
+    def descendants(self, p: int) -> List[int]:
+        """Positions de tous les sous-dossiers de p (récursif), p exclu."""
+        result: List[int] = []
+        stack = [p]
+        while stack:
+            for child in self.children(stack.pop()):
+                result.append(child)
+                stack.append(child)
+        return result
+
+
+_cache: "OrderedDict[int, FolderTree]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _load(user_id: int, version: int) -> FolderTree:
+    rows = fetch_all(
+        "SELECT id, nom, parent_id, created_at FROM folders WHERE id_users = %s ORDER BY nom ASC, id ASC",
+        (user_id,),
+    )
+    return FolderTree(user_id, version, rows)
+
+
+def get_tree(user_id: int) -> FolderTree:
+    """Arborescence à jour de l'utilisateur (depuis le cache si la version n'a pas bougé)."""
+    user_id = int(user_id)
+    if FOLDER_TREE_CACHE_SIZE <= 0:
+        return _load(user_id, 0)
+
+    version = user_versions(user_id)["folder"]
+    with _lock:
+        tree = _cache.get(user_id)
+        if tree is not None and tree.version == version:
+            _cache.move_to_end(user_id)
+            return tree
+
+    tree = _load(user_id, version)
+    session = current_session()
+    # Lu dans une transaction ouverte: peut contenir des dossiers non validés
+    if session is None or not session.in_transaction:
+        with _lock:
+            _cache[user_id] = tree
+            _cache.move_to_end(user_id)
+            while len(_cache) > FOLDER_TREE_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return tree
+
+
+def bump_folder_version(user_id: int) -> None:
+    """
+    À appeler dans la transaction de toute modification des dossiers du user
+    (création, suppression, déplacement, renommage).
+    """
+    user_id = int(user_id)
+    execute_write(
+        "UPDATE users SET folder_version = folder_version + 1, change_version = change_version + 1 WHERE id = %s",
+        (user_id,),
+    )
+    forget_user_versions(user_id)
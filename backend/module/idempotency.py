@@ -0,0 +1,240 @@
+"""
+Uploads idempotents (/documents/upload, /share/upload).
+
+Le client envoie un header Idempotency-Key (1 à 255 caractères ASCII
+visibles), le même à chaque nouvel essai d'un upload. La clé est propre au
+user et à la route (scope).
+
+- Premier essai: la clé est réservée (ligne idempotency_keys validée tout
+  de suite, execute_now), le fichier est envoyé au stockage en calculant le
+  sha256 du chiffré au passage, puis la réponse est enregistrée avec la
+  clé, dans la même transaction que le document ou le partage créé.
+- Nouvel essai d'un upload déjà validé: la réponse enregistrée est renvoyée
+  (header Idempotent-Replayed), sans rien stocker. Le corps est lu pour
+  en vérifier le sha256: un autre fichier sous la même clé donne un 422.
+- Doublon concurrent: il attend la fin du premier (IDEMPOTENCY_WAIT) et
+  renvoie sa réponse; au-delà, 409 et Retry-After.
+- Échec (erreur, 4xx/5xx): la clé est libérée, un nouvel essai repart de
+  zéro. Une clé restée réservée (process tué) est reprise après
+  IDEMPOTENCY_LOCK_TIMEOUT.
+
+Les clés sont supprimées IDEMPOTENCY_TTL secondes après leur création.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import secrets
+import time
+from datetime import datetime, timedelta
+from typing import Any, BinaryIO, Callable, NamedTuple, Optional, Tuple, Union
+
+import pymysql
+from flask import request
+
+from module.api_retour import api_response
+from module.config import (
+    DOWNLOAD_CHUNK_SIZE,
+    IDEMPOTENCY_LOCK_TIMEOUT,
+    IDEMPOTENCY_REAP_BATCH,
+    IDEMPOTENCY_REAP_INTERVAL,
+    IDEMPOTENCY_TTL,
+    IDEMPOTENCY_WAIT,
+)
+from module.db import execute_now, execute_write, fetch_all, fetch_one
+from module.periodic import PeriodicTask
+
+HEADER = "Idempotency-Key"
+KEY_MAX_LENGTH = 255
+_POLL_INTERVAL = 0.2
+
+
+class IdempotencyError(Exception):
+    """Clé invalide, en cours d'utilisation ou réutilisée (message renvoyé au client, code HTTP)."""
+
+    def __init__(self, message: str, status: int = 409):
+        super().__init__(message)
+        self.status = status
+
+
+class Claim(NamedTuple):
+    """Clé réservée par cette requête."""
+    id: int
+    lease: str
+
+
+class Replay(NamedTuple):
+    """Upload déjà validé sous cette clé."""
+    status: int
+    body: Any
+    digest: Optional[str]
+
+
+def request_key() -> Optional[str]:
+    """Idempotency-Key de la requête, None sans header; IdempotencyError (400) si invalide."""
+    key = request.headers.get(HEADER)
+    if key is None:
+        return None
+    if not 0 < len(key) <= KEY_MAX_LENGTH or not all("!" <= ch <= "~" for ch in key):
+        raise IdempotencyError(f"{HEADER} invalide (1 à {KEY_MAX_LENGTH} caractères ASCII visibles)", 400)
+    return key
+
+
+def claim_key(user_id: int, scope: str) -> Union[Claim, Replay, None]:
+    """
+    Réserve l'Idempotency-Key de la requête pour (user, scope).
+
+    Retourne None sans header, Replay si l'upload a déjà été validé sous
+    cette clé, Claim sinon (à passer ensuite à complete_key ou release_key).
+    IdempotencyError (409) si un doublon est encore en cours après
+    IDEMPOTENCY_WAIT secondes.
+    """
+    key = request_key()
+    if key is None:
+        return None
+
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT
+    while True:
+        now = datetime.utcnow()
+        lease = secrets.token_hex(16)
+        try:
+            _, row_id = execute_now(
+                "INSERT INTO idempotency_keys (id_users, scope, idem_key, lease, updated_at, expires_at) VALUES (%s, %s, %s, %s, %s, %s)",
+                (user_id, scope, key, lease, now, now + timedelta(seconds=IDEMPOTENCY_TTL)),
+            )
+            return Claim(row_id, lease)
+        except pymysql.err.IntegrityError:
+            pass
+
+        row = fetch_one(
+            "SELECT id, lease, digest, status_code, response, updated_at, expires_at FROM idempotency_keys WHERE id_users = %s AND scope = %s AND idem_key = %s",
+            (user_id, scope, key),
+        )
+        if row is None:
+            continue  # supprimée entre-temps
+        if row["expires_at"] < now:
+            execute_now("DELETE FROM idempotency_keys WHERE id = %s AND expires_at < %s", (row["id"], now))
+            continue
+        if row["status_code"] is not None:
+            return Replay(int(row["status_code"]), json.loads(row["response"]), row["digest"])
+
+        # Réservée par une requête qui ne l'a ni validée ni libérée à temps: reprise
+        if row["updated_at"] < now - timedelta(seconds=IDEMPOTENCY_LOCK_TIMEOUT):
+            rowcount, _ = execute_now(
+                "UPDATE idempotency_keys SET lease = %s, updated_at = %s WHERE id = %s AND lease = %s AND status_code IS NULL",
+                (lease, now, row["id"], row["lease"]),
+            )
+            if rowcount == 1:
+                return Claim(row["id"], lease)
+            continue
+
+        if time.monotonic() >= deadline:
+            raise IdempotencyError("Upload identique en cours, réessayer plus tard")
+        time.sleep(_POLL_INTERVAL)
+
+
+def complete_key(claim: Claim, digest: str, status: int, body: Any) -> None:
+    """
+    Enregistre la réponse sous la clé; à appeler en dernier dans la
+    transaction qui crée le document ou le partage. IdempotencyError si la
+    clé a été reprise entre-temps (la transaction doit alors être annulée).
+    """
+    rowcount, _ = execute_write(
+        "UPDATE idempotency_keys SET digest = %s, status_code = %s, response = %s, updated_at = %s WHERE id = %s AND lease = %s AND status_code IS NULL",
+        (digest, status, json.dumps(body, ensure_ascii=False), datetime.utcnow(), claim.id, claim.lease),
+    )
+    if rowcount != 1:
+        raise IdempotencyError("Upload identique validé par une autre requête")
+
+
+def release_key(claim: Optional[Claim]) -> None:
+    """Libère une clé réservée dont l'upload a échoué (un nouvel essai repart de zéro)."""
+    if not isinstance(claim, Claim):
+        return
+    try:
+        execute_now(
+            "DELETE FROM idempotency_keys WHERE id = %s AND lease = %s AND status_code IS NULL",
+            (claim.id, claim.lease),
+        )
+    except Exception as e:
+        # Reprise après IDEMPOTENCY_LOCK_TIMEOUT
+        print(f"[ERROR] Idempotency key release: {e}")
+
+
+class HashingReader:
+    """Flux lu par le stockage, dont le sha256 est calculé au fil de la lecture."""
+
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+        self._hash = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._stream.read(size)
+        self._hash.update(chunk)
+        return chunk
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+def hashing(data: Union[bytes, BinaryIO]) -> Tuple[Union[bytes, BinaryIO], Callable[[], str]]:
+    """(données à passer au stockage, fonction donnant leur sha256 une fois lues)."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        digest = hashlib.sha256(data).hexdigest()
+        return data, lambda: digest
+    reader = HashingReader(data)
+    return reader, reader.hexdigest
+
+
+def _digest_of(data: Union[bytes, BinaryIO]) -> str:
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(data).hexdigest()
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: data.read(DOWNLOAD_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def replay_response(replay: Replay, data: Union[bytes, BinaryIO], user_id: int):
+    """
+    Réponse enregistrée d'un upload déjà validé, après vérification que le
+    fichier renvoyé est le même (IdempotencyError 422 sinon).
+    """
+    if replay.digest is not None and _digest_of(data) != replay.digest:
+        raise IdempotencyError(f"{HEADER} déjà utilisée pour un autre fichier", 422)
+    response, status = api_response(replay.body, replay.status, user_id, "Upload replayed (Idempotency-Key)")
+    response.headers["Idempotent-Replayed"] = "true"
+    return response, status
+
+
+def conflict_response(error: IdempotencyError, user_id: Optional[int]):
+    response, status = api_response(
+        {"status": "error", "message": str(error)}, error.status, user_id, f"Upload refused: {error}",
+    )
+    if error.status == 409:
+        response.headers["Retry-After"] = "1"
+    return response, status
+
+
+def reap_expired_keys(limit: int = IDEMPOTENCY_REAP_BATCH) -> int:
+    """Supprime les clés expirées; retourne leur nombre."""
+    rows = fetch_all(
+        "SELECT id FROM idempotency_keys WHERE expires_at < %s ORDER BY expires_at LIMIT %s",
+        (datetime.utcnow(), limit),
+    )
+    if not rows:
+        return 0
+    ids = [row["id"] for row in rows]
+    reaped, _ = execute_now(
+        f"DELETE FROM idempotency_keys WHERE id IN ({', '.join(['%s'] * len(ids))})", tuple(ids),
+    )
+    return reaped
+
+
+reaper = PeriodicTask("idempotency-reaper", IDEMPOTENCY_REAP_INTERVAL, reap_expired_keys)
+
+
+def init_app(app) -> None:
+    """Démarre le nettoyage des clés expirées dans chaque worker."""
+    app.before_request(reaper.start)
@@ -0,0 +1,363 @@
+"""
+Moteur de stockage sur disque local (STORAGE_BACKEND=local).
+
+- Écriture: fichier temporaire dans le dossier cible puis rename atomique.
+  Une source fichier (fileno) est copiée par le noyau (copy_file_range, à
+  défaut sendfile) sans remonter les octets dans Python.
+- Lecture: local_path() permet aux routes d'envoyer le fichier par sendfile
+  (wsgi.file_wrapper de gunicorn); get() lit d'un bloc dans un buffer unique.
+- Durabilité: les fsync sont regroupés (group commit) par un thread dédié;
+  chaque écrivain attend que le lot contenant son fichier soit sur disque.
+"""
+
+import os
+import re
+import shutil
+import stat
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Tuple
+
+from .config import (
+    DOWNLOAD_CHUNK_SIZE,
+    STORAGE_LOCAL_FSYNC,
+    STORAGE_LOCAL_FSYNC_INTERVAL_MS,
+    STORAGE_LOCAL_ROOT,
+    UPLOAD_PART_SIZE,
+)
+from .storage import ChunkStream, ObjectNotFound, StorageBackend, StoredObject, StoredPart
+
+_COPY_CHUNK = 8 * 1024 * 1024
+_UPLOAD_ID_RE = re.compile(r"[0-9a-f]{32}")
+
+
+class _FsyncBatcher:
+    """Regroupe les fsync de plusieurs écritures concurrentes en un seul passage."""
+
+    def __init__(self, interval_s: float):
+        self.interval_s = interval_s
+        self._init_state()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._init_state)
+
+    def _init_state(self) -> None:
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[str, threading.Event, list]] = []
+        self._thread = None
+        self._pid = os.getpid()
+
+    def sync(self, path: str) -> None:
+        """Bloque jusqu'à ce que `path` et son dossier soient sur disque."""
+        done = threading.Event()
+        errors: list = []
+        with self._cond:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="yoda-fsync", daemon=True)
+                self._thread.start()
+            self._pending.append((path, done, errors))
+            self._cond.notify()
+        done.wait()
+        if errors:
+            raise errors[0]
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            # Laisser d'autres écritures rejoindre le lot.
+            if self.interval_s > 0:
+                time.sleep(self.interval_s)
+            with self._cond:
+                batch, self._pending = self._pending, []
+
+            directories = set()
+            for path, done, errors in batch:
+                try:
+                    _fsync_path(path)
+                    directories.add(os.path.dirname(path))
+                except OSError as exc:
+                    errors.append(exc)
+            dir_errors = {}
+            for directory in directories:
+                try:
+                    _fsync_path(directory, directory=True)
+                except OSError as exc:
+                    dir_errors[directory] = exc
+            for path, done, errors in batch:
+                if not errors and os.path.dirname(path) in dir_errors:
+                    errors.append(dir_errors[os.path.dirname(path)])
+                done.set()
+
+
+def _fsync_path(path: str, directory: bool = False) -> None:
+    flags = os.O_RDONLY | (getattr(os, "O_DIRECTORY", 0) if directory else 0)
+    fd = os.open(path, flags)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _copy_fd(src_fd: int, dst_fd: int, length: int) -> int:
+    """Copie noyau -> noyau; retourne le nombre d'octets copiés."""
+    copied = 0
+    copy_file_range = getattr(os, "copy_file_range", None)
+    while copied < length:
+        count = min(_COPY_CHUNK, length - copied)
+        sent = 0
+        if copy_file_range is not None:
+            try:
+                sent = copy_file_range(src_fd, dst_fd, count)
+            except OSError:
+                copy_file_range = None
+        if copy_file_range is None:
+            sent = os.sendfile(dst_fd, src_fd, None, count)
+        if sent == 0:
+            break
+        copied += sent
+    return copied
+
+
+def _write_all(fd: int, data) -> None:
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+def _stored(object_name: str, st: os.stat_result) -> StoredObject:
+    modified = datetime.fromtimestamp(st.st_mtime, tz=timezone.utc)
+    return StoredObject(object_name, st.st_size, modified, {}, f"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}")
+
+
+class LocalStorage(StorageBackend):
+    name = "local"
+
+    def __init__(self, root: str = STORAGE_LOCAL_ROOT, fsync: str = STORAGE_LOCAL_FSYNC):
+        if fsync not in ("batch", "always", "off"):
+            raise ValueError(f"STORAGE_LOCAL_FSYNC invalide: {fsync!r} (batch | always | off)")
+        self.root = os.path.realpath(root)
+        self.fsync = fsync
+        self._batcher = _FsyncBatcher(STORAGE_LOCAL_FSYNC_INTERVAL_MS / 1000.0)
+
+    def init(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        print(f"[Storage] Dossier local: {self.root} (fsync={self.fsync})")
+
+    def _path(self, object_name: str) -> str:
+        parts = object_name.split("/")
+        if not object_name or any(p in ("", ".", "..") for p in parts) or "\x00" in object_name:
+            raise ValueError(f"Nom d'objet invalide: {object_name!r}")
+        path = os.path.join(self.root, *parts)
+        if os.path.commonpath([self.root, os.path.realpath(os.path.dirname(path))]) != self.root:
+            raise ValueError(f"Nom d'objet invalide: {object_name!r}")
+        return path
+
+    def put(self, object_name, data, length, metadata=None) -> None:
+        self._write_file(self._path(object_name), data, length)
+
+    def _write_file(self, path: str, data, length: int) -> None:
+        """Écrit `path` via un fichier temporaire renommé, puis fsync selon la politique."""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, f".tmp-{uuid.uuid4().hex}")
+
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            if callable(data):
+                data(fd)
+            elif isinstance(data, (bytes, bytearray, memoryview)):
+                _write_all(fd, data)
+            else:
+                self._write_stream(fd, data, length)
+            if self.fsync == "always":
+                os.fsync(fd)
+        except BaseException:
+            os.close(fd)
+            os.unlink(tmp_path)
+            raise
+        os.close(fd)
+
+        os.replace(tmp_path, path)
+        if self.fsync == "batch":
+            self._batcher.sync(path)
+        elif self.fsync == "always":
+            _fsync_path(directory, directory=True)
+
+    @staticmethod
+    def _write_stream(fd: int, stream, length: int) -> None:
+        # Copie noyau uniquement depuis un fichier régulier: un socket peut
+        # avoir des octets déjà bufferisés côté Python.
+        try:
+            src_fd = stream.fileno()
+            if not stat.S_ISREG(os.fstat(src_fd).st_mode):
+                src_fd = None
+        except (AttributeError, OSError, ValueError):
+            src_fd = None
+
+        if src_fd is not None and length >= 0:
+            # Repartir de la position courante du fichier source.
+            try:
+                os.lseek(src_fd, stream.tell(), os.SEEK_SET)
+            except (AttributeError, OSError, ValueError):
+                pass
+            if _copy_fd(src_fd, fd, length) != length:
+                raise IOError("Fichier source plus court que la taille annoncée")
+            return
+
+        remaining = length
+        while remaining != 0:
+            chunk = stream.read(UPLOAD_PART_SIZE if remaining < 0 else min(UPLOAD_PART_SIZE, remaining))
+            if not chunk:
+                break
+            _write_all(fd, chunk)
+            if remaining > 0:
+                remaining -= len(chunk)
+        if remaining > 0:
+            raise IOError("Flux source plus court que la taille annoncée")
+
+    def get(self, object_name) -> bytes:
+        path = self._path(object_name)
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            size = os.fstat(fd).st_size
+            data = os.read(fd, size)
+            if len(data) == size:
+                return data
+            chunks = [data]
+            while True:
+                chunk = os.read(fd, _COPY_CHUNK)
+                if not chunk:
+                    return b"".join(chunks)
+                chunks.append(chunk)
+        finally:
+            os.close(fd)
+
+    def stream(self, object_name, offset=0, length=None, chunk_size=DOWNLOAD_CHUNK_SIZE) -> ChunkStream:
+        fd = os.open(self._path(object_name), os.O_RDONLY)
+        end = os.fstat(fd).st_size if length is None else offset + length
+
+        def _read():
+            position = offset
+            while position < end:
+                chunk = os.pread(fd, min(chunk_size, end - position), position)
+                if not chunk:
+                    return
+                position += len(chunk)
+                yield chunk
+
+        return ChunkStream(_read(), lambda: os.close(fd))
+
+    def stat(self, object_name) -> StoredObject:
+        try:
+            st = os.stat(self._path(object_name))
+        except FileNotFoundError as e:
+            raise ObjectNotFound(object_name) from e
+        return _stored(object_name, st)
+
+    def remove(self, object_name) -> None:
+        try:
+            os.unlink(self._path(object_name))
+        except FileNotFoundError:
+            pass
+
+    def list(self, prefix: str = "", recursive: bool = True) -> Iterator[StoredObject]:
+        # Par clé croissante, comme un listing S3. Seuls les noms du dossier en
+        # cours de lecture (et de ses parents) sont gardés en mémoire.
+        directory = prefix.rsplit("/", 1)[0] + "/" if "/" in prefix else ""
+        yield from self._list_dir(directory, prefix, recursive)
+
+    def _list_dir(self, directory: str, prefix: str, recursive: bool) -> Iterator[StoredObject]:
+        path = os.path.join(self.root, *directory.split("/")) if directory else self.root
+        entries = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        # Dossiers cachés (.multipart: parts en cours) hors du listing
+                        if recursive and not entry.name.startswith("."):
+                            # "d/" et non "d": classé comme les clés qu'il contient
+                            entries.append((f"{directory}{entry.name}/", True))
+                    elif entry.is_file() and not entry.name.startswith(".tmp-"):
+                        entries.append((f"{directory}{entry.name}", False))
+        except (FileNotFoundError, NotADirectoryError):
+            return
+        entries.sort()
+
+        for key, is_dir in entries:
+            if is_dir:
+                if key.startswith(prefix) or prefix.startswith(key):
+                    yield from self._list_dir(key, prefix, recursive)
+            elif key.startswith(prefix):
+                try:
+                    st = os.stat(os.path.join(self.root, *key.split("/")))
+                except FileNotFoundError:
+                    continue  # supprimé depuis la lecture du dossier
+                yield _stored(key, st)
+
+    def prefixes(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        with os.scandir(self.root) as entries:
+            return sorted(f"{e.name}/" for e in entries if e.is_dir() and not e.name.startswith("."))
+
+    # Upload par parts: chaque part est un fichier de .multipart/<upload_id>/,
+    # assemblées par copie noyau à la fin.
+
+    def _multipart_dir(self, upload_id: str) -> str:
+        if not _UPLOAD_ID_RE.fullmatch(upload_id or ""):
+            raise ValueError(f"Identifiant d'upload invalide: {upload_id!r}")
+        return os.path.join(self.root, ".multipart", upload_id)
+
+    def create_multipart(self, object_name) -> str:
+        self._path(object_name)
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self._multipart_dir(upload_id))
+        return upload_id
+
+    def upload_part(self, object_name, upload_id, part_number, data, length) -> str:
+        directory = self._multipart_dir(upload_id)
+        if not os.path.isdir(directory):
+            raise ObjectNotFound(f"Upload inconnu: {upload_id}")
+        path = os.path.join(directory, f"{int(part_number):05d}")
+        self._write_file(path, data, length)
+        st = os.stat(path)
+        return f"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"
+
+    def list_parts(self, object_name, upload_id) -> List[StoredPart]:
+        directory = self._multipart_dir(upload_id)
+        if not os.path.isdir(directory):
+            raise ObjectNotFound(f"Upload inconnu: {upload_id}")
+        parts = []
+        for filename in sorted(os.listdir(directory)):
+            if not filename.isdigit():
+                continue
+            st = os.stat(os.path.join(directory, filename))
+            parts.append(StoredPart(int(filename), st.st_size, f"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"))
+        return parts
+
+    def complete_multipart(self, object_name, upload_id, parts) -> None:
+        directory = self._multipart_dir(upload_id)
+        total = sum(part.size for part in parts)
+
+        def _concat(fd):
+            for part in parts:
+                src = os.open(os.path.join(directory, f"{part.part_number:05d}"), os.O_RDONLY)
+                try:
+                    if _copy_fd(src, fd, part.size) != part.size:
+                        raise IOError(f"Part {part.part_number} incomplète")
+                finally:
+                    os.close(src)
+
+        self._write_file(self._path(object_name), _concat, total)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def abort_multipart(self, object_name, upload_id) -> None:
+        shutil.rmtree(self._multipart_dir(upload_id), ignore_errors=True)
+
+    def local_path(self, object_name) -> Optional[str]:
+        return self._path(object_name)
@@ -0,0 +1,210 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import pymysql
+
+# Tables alimentées par le sink: nom logique -> INSERT (une ligne de VALUES,
+# étendue en INSERT multi-lignes par executemany).
+LOG_TABLES: Dict[str, str] = {
+    "logs": "INSERT INTO logs (id_users, statut, action, ip, timestamp) VALUES (%s, %s, %s, %s, %s)",
+    "shared_acces_log": "INSERT INTO shared_acces_log (id_shared_file, accessed_at, ip_address, user_agent) VALUES (%s, %s, %s, %s)",
+}
+
+OVERFLOW_POLICIES = ("sync", "block", "drop")
+
+_STOP = object()
+
+
+class LogSink:
+    """
+    Écriture asynchrone et groupée des journaux (audit + accès aux partages).
+
+    Les lignes sont mises en file par submit() et écrites par un thread de fond
+    en INSERT multi-lignes, dès que batch_size lignes sont en attente ou que
+    flush_interval secondes se sont écoulées depuis la première. La file est
+    vidée à l'arrêt du process (atexit).
+
+    Politique si la file est pleine (overflow):
+    - "sync":  la ligne est écrite immédiatement par l'appelant (rien n'est perdu)
+    - "block": l'appelant attend block_timeout secondes une place, puis abandonne
+    - "drop":  la ligne est abandonnée (compteur `dropped`)
+    """
+
+    def __init__(
+        self,
+        pool,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000,
+        overflow: str = "sync",
+        block_timeout: float = 1.0,
+        enabled: bool = True,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}, got {overflow!r}")
+        self._pool = pool
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.enabled = enabled
+        self._init_state()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._init_state)
+        atexit.register(self.close)
+
+    def _init_state(self) -> None:
+        self._queue: queue.Queue = queue.Queue(maxsize=self.max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = os.getpid()
+        self.dropped = 0
+        self.written = 0
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._init_state()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="yoda-log-sink", daemon=True)
+                self._thread.start()
+
+    def submit(self, table: str, row: Tuple) -> None:
+        if table not in LOG_TABLES:
+            raise ValueError(f"Unknown log table: {table}")
+        if not self.enabled:
+            self._write({table: [row]})
+            return
+
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((table, row))
+            return
+        except queue.Full:
+            pass
+
+        if self.overflow == "sync":
+            self._write({table: [row]})
+        elif self.overflow == "block":
+            try:
+                self._queue.put((table, row), timeout=self.block_timeout)
+            except queue.Full:
+                self.dropped += 1
+        else:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        batch: List[Tuple[str, Tuple]] = []
+        deadline = 0.0
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush(batch)
+                return
+            if isinstance(item, threading.Event):
+                self._flush(batch)
+                batch = []
+                item.set()
+                continue
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+
+    def _flush(self, batch: List[Tuple[str, Tuple]]) -> None:
+        if not batch:
+            return
+        by_table: Dict[str, List[Tuple]] = {}
+        for table, row in batch:
+            by_table.setdefault(table, []).append(row)
+        try:
+            self._write(by_table)
+            return
+        except pymysql.err.IntegrityError:
+            pass  # ligne invalide (partage ou user supprimé entre-temps): la rejouer ne sert à rien
+        except Exception:
+            # Une seconde tentative (connexion neuve)
+            try:
+                self._write(by_table)
+                return
+            except Exception:
+                pass
+        # Lot en échec: ligne par ligne, seules les lignes en erreur sont perdues
+        self._write_rows(batch)
+
+    def _write_rows(self, batch: List[Tuple[str, Tuple]]) -> None:
+        # Connexion en autocommit: chaque INSERT est validé seul
+        done = lost = 0
+        error = None
+        try:
+            with self._pool.connection() as connection:
+                with connection.cursor() as cursor:
+                    for table, row in batch:
+                        try:
+                            cursor.execute(LOG_TABLES[table], row)
+                            done += 1
+                        except (pymysql.err.IntegrityError, pymysql.err.DataError, pymysql.err.ProgrammingError) as exc:
+                            lost += 1
+                            error = exc
+        except Exception as exc:
+            # Connexion perdue en cours de route: le reste du lot est perdu
+            error = exc
+            lost = len(batch) - done
+        self.written += done
+        if lost:
+            self.dropped += lost
+            print(f"[ERROR] Log sink: {lost} ligne(s) perdues: {error}")
+
+    def _write(self, by_table: Dict[str, List[Tuple]]) -> None:
+        # Un lot = une transaction: une nouvelle tentative ne duplique rien.
+        with self._pool.connection() as connection:
+            connection.begin()
+            try:
+                with connection.cursor() as cursor:
+                    for table, rows in by_table.items():
+                        cursor.executemany(LOG_TABLES[table], rows)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+        self.written += sum(len(rows) for rows in by_table.values())
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Force l'écriture de tout ce qui est en file (scripts, benchmarks)."""
+        if self._thread is None or self._pid != os.getpid():
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Vide la file et arrête le thread (appelé à l'arrêt du process)."""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid() or not thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            print("[WARNING] Log sink: file pleine à l'arrêt, lignes non écrites")
+            return
+        thread.join(timeout)
+        self._thread = None
@@ -0,0 +1,153 @@
+"""
+Métriques Prometheus du backend (exposées par GET /api/metrics).
+
+Sous gunicorn, chaque worker est un process: la variable d'environnement
+PROMETHEUS_MULTIPROC_DIR doit pointer vers un dossier partagé (voir
+gunicorn.conf.py) pour que /api/metrics agrège tous les workers, quel que
+soit celui qui répond au scrape. Sans cette variable (python app.py), le
+registre par défaut du process est utilisé.
+"""
+
+import os
+import time
+from functools import lru_cache, wraps
+
+from flask import g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+_MULTIPROC = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+_DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+HTTP_REQUESTS = Counter(
+    "yoda_http_requests_total",
+    "Requêtes HTTP traitées",
+    ["blueprint", "endpoint", "method", "status"],
+)
+HTTP_LATENCY = Histogram(
+    "yoda_http_request_duration_seconds",
+    "Durée de traitement des requêtes HTTP",
+    ["blueprint", "endpoint", "method"],
+    buckets=_LATENCY_BUCKETS,
+)
+HTTP_IN_FLIGHT = Gauge(
+    "yoda_http_requests_in_flight",
+    "Requêtes HTTP en cours (une série par worker gunicorn)",
+    multiprocess_mode="liveall",
+)
+DB_LATENCY = Histogram(
+    "yoda_db_query_duration_seconds",
+    "Durée des requêtes SQL (module/db.py)",
+    ["operation"],
+    buckets=_DB_BUCKETS,
+)
+STORAGE_LATENCY = Histogram(
+    "yoda_storage_operation_duration_seconds",
+    "Durée des opérations de stockage objet",
+    ["operation", "outcome"],
+    buckets=_LATENCY_BUCKETS,
+)
+STORAGE_BYTES = Counter(
+    "yoda_storage_bytes_total",
+    "Octets transférés vers/depuis le stockage objet",
+    ["operation"],
+)
+DELETED_OBJECTS = Counter(
+    "yoda_deletion_queue_objects_total",
+    "Objets traités par la file de suppression",
+    ["outcome"],
+)
+
+
+@lru_cache(maxsize=512)
+def _sql_operation(query: str) -> str:
+    head = query.lstrip().split(None, 1)
+    return head[0].lower() if head else "unknown"
+
+
+def observe_db_query(query: str, duration_s: float) -> None:
+    DB_LATENCY.labels(_sql_operation(query)).observe(duration_s)
+
+
+def timed_storage(operation: str):
+    """Décorateur: chronomètre une opération de stockage (succès ou erreur)."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                result = func(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                STORAGE_LATENCY.labels(operation, outcome).observe(time.perf_counter() - started)
+
+        return wrapper
+
+    return decorator
+
+
+def count_storage_bytes(operation: str, size: int) -> None:
+    if size:
+        STORAGE_BYTES.labels(operation).inc(size)
+
+
+def count_deleted_objects(outcome: str, count: int) -> None:
+    if count:
+        DELETED_OBJECTS.labels(outcome).inc(count)
+
+
+def _start_request() -> None:
+    g._metrics_started = time.perf_counter()
+    HTTP_IN_FLIGHT.inc()
+
+
+def _capture_status(response):
+    g._metrics_status = response.status_code
+    return response
+
+
+def _finish_request(exc=None) -> None:
+    started = g.pop("_metrics_started", None)
+    if started is None:
+        return
+    HTTP_IN_FLIGHT.dec()
+
+    rule = request.url_rule
+    endpoint = rule.endpoint if rule is not None else "unmatched"
+    blueprint = request.blueprint or "app"
+    status = 500 if exc is not None else g.pop("_metrics_status", 500)
+    HTTP_REQUESTS.labels(blueprint, endpoint, request.method, str(status)).inc()
+    HTTP_LATENCY.labels(blueprint, endpoint, request.method).observe(time.perf_counter() - started)
+
+
+def init_app(app) -> None:
+    """
+    À appeler avant les autres before_request (auth_middleware) pour compter
+    aussi les requêtes qu'ils rejettent.
+    """
+    app.before_request(_start_request)
+    app.after_request(_capture_status)
+    app.teardown_request(_finish_request)
+
+
+def render_latest():
+    """Corps et content-type de la réponse /api/metrics."""
+    if _MULTIPROC:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
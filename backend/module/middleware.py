@@ -1,32 +1,122 @@
-from flask import request, jsonify, g
+"""
+Authentification des requêtes (JWT HS256 dans le header Authorization).
+
+La politique de chaque route est déclarée à côté de la route, sur le
+blueprint ou la vue:
+
+    public(login_bp)                      # toutes les routes du blueprint
+
+    @share.route("/share/name_file", methods=["POST"])
+    @public
+    def name_file(): ...
+
+- PUBLIC: aucun token exigé, g.user reste None
+- A2F: token exigé, le token temporaire de la connexion 2FA (a2f=1) accepté
+- PROTECTED (défaut): token complet exigé, le token temporaire donne un 402
+
+init_app() compile ces déclarations en une table {endpoint: politique}
+après l'enregistrement des blueprints: une route est publique par son
+endpoint, jamais par un préfixe de chemin. Une URL inconnue (404) est
+protégée.
+
+Les tokens déjà vérifiés sont gardés dans un petit cache LRU par worker
+(AUTH_TOKEN_CACHE_SIZE entrées, clé sha256 du token) jusqu'à leur
+expiration (exp): une requête suivante avec le même token ne refait pas la
+vérification de signature.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
 import jwt
-from jwt import ExpiredSignatureError, DecodeError
-from .config import SECRET_KEY
-PUBLIC_PATHS = [
-    "/api/login",
-    "/api/register",
-    "/api/validate_a2f",
-    "/api/docs",
-    "/api/health",
-    "/api/db-test",
-    "/static",
-    "/api/share/name_file",
-    "/api/share/download",
-]
-
-TEMP_PATHS = [
-    "/api/check_a2f",
-    "/api/a2f_login",
-]
-def is_public(path: str) -> bool:
-    return any(path.startswith(p) for p in PUBLIC_PATHS)
+from flask import Blueprint, g, jsonify, request
+from jwt import DecodeError, ExpiredSignatureError
+
+from .config import AUTH_TOKEN_CACHE_SIZE, SECRET_KEY
+
+PUBLIC = "public"
+A2F = "a2f"
+PROTECTED = "protected"
+
+_blueprint_policies: Dict[str, str] = {}
+_endpoint_policies: Dict[str, str] = {}
+
+# {sha256 du token: (payload, exp)}
+_verified: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def auth_policy(policy: str):
+    """Décorateur: politique d'un blueprint entier ou d'une vue (prioritaire sur son blueprint)."""
+    if policy not in (PUBLIC, A2F, PROTECTED):
+        raise ValueError(f"Politique d'authentification inconnue: {policy}")
+
+    def declare(target):
+        if isinstance(target, Blueprint):
+            _blueprint_policies[target.name] = policy
+        else:
+            target.auth_policy = policy
+        return target
+
+    return declare
+
+
+public = auth_policy(PUBLIC)
+temp_token = auth_policy(A2F)
+
+
+def compile_policies(app) -> Dict[str, str]:
+    """Table {endpoint: politique} de toutes les routes enregistrées sur l'app."""
+    policies = {}
+    for endpoint, view in app.view_functions.items():
+        policy = getattr(view, "auth_policy", None)
+        blueprint = endpoint.rpartition(".")[0]
+        # Blueprints imbriqués ("parent.enfant.vue"): le plus proche l'emporte
+        while policy is None and blueprint:
+            policy = _blueprint_policies.get(blueprint)
+            blueprint = blueprint.rpartition(".")[0]
+        policies[endpoint] = policy or PROTECTED
+    if app.static_folder:
+        policies["static"] = PUBLIC
+    return policies
+
+
+def _verify(token: str) -> Dict[str, Any]:
+    """Payload du token (depuis le cache s'il a déjà été vérifié); exceptions de jwt.decode sinon."""
+    if AUTH_TOKEN_CACHE_SIZE <= 0:
+        return jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    with _lock:
+        cached = _verified.get(key)
+        if cached is not None:
+            payload, exp = cached
+            if exp > time.time():
+                _verified.move_to_end(key)
+                return dict(payload)
+            del _verified[key]
+            raise ExpiredSignatureError("Signature has expired")
+
+    payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+    exp = payload.get("exp")
+    # Sans exp, le token n'a pas de fin de validité: jamais gardé
+    if isinstance(exp, (int, float)):
+        with _lock:
+            _verified[key] = (dict(payload), float(exp))
+            _verified.move_to_end(key)
+            while len(_verified) > AUTH_TOKEN_CACHE_SIZE:
+                _verified.popitem(last=False)
+    return payload
+
 
 def auth_middleware():
-    
-    path = request.path
     g.user = None  # Initialiser g.user par défaut
-    
-    if is_public(path):
+
+    policy = _endpoint_policies.get(request.endpoint, PROTECTED)
+    if policy == PUBLIC:
         return  # route non protégée
 
     # Récupération du header Authorization
@@ -37,13 +127,23 @@ def auth_middleware():
     token = auth_header.split(" ", 1)[1].strip()
 
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        payload = _verify(token)
     except ExpiredSignatureError:
         return jsonify({"error": "Token expired"}), 401
     except DecodeError:
         return jsonify({"error": "Invalid token"}), 401
 
-    if payload.get("a2f") == 1 and path not in TEMP_PATHS:
+    if payload.get("a2f") == 1 and policy != A2F:
         return jsonify({"error": "Invalid token payload"}), 402
 
     g.user = payload  # pour utilisation dans les routes
+
+
+def init_app(app) -> None:
+    """
+    Branche l'authentification sur l'application; à appeler après
+    register_blueprints (les politiques sont compilées à ce moment).
+    """
+    _endpoint_policies.clear()
+    _endpoint_policies.update(compile_policies(app))
+    app.before_request(auth_middleware)
@@ -1,8 +1,20 @@
+import inspect
 import os
+from datetime import timedelta
+from io import BytesIO
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import quote, urlparse
+
+import minio
 from minio import Minio
+from minio.datatypes import Part
+from minio.deleteobjects import DeleteObject
 from minio.error import S3Error
 from dotenv import load_dotenv
 
+from .config import DOWNLOAD_CHUNK_SIZE, UPLOAD_PART_SIZE
+from .storage import ChunkStream, ObjectNotFound, StorageBackend, StorageUnsupported, StoredObject, StoredPart
+
 load_dotenv()
 
 # Configuration MinIO
@@ -10,6 +22,26 @@ MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
 MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
 MINIO_BUCKET = "yoda-documents"
+# Adresse de MinIO vue par les navigateurs (ex: https://s3.example.com), pour
+# les URL signées; vide = téléchargements toujours relayés par le backend
+MINIO_PUBLIC_ENDPOINT = os.getenv("MINIO_PUBLIC_ENDPOINT", "")
+# Région fixe: sans elle, signer une URL interroge MinIO pour la découvrir
+MINIO_REGION = os.getenv("MINIO_REGION", "us-east-1")
+
+# Une part d'upload par parts est lue en mémoire avant l'envoi (le client
+# minio en calcule les empreintes): 16 MiB au plus par requête
+MINIO_MAX_PART_SIZE = 16 * 1024 * 1024
+
+# Méthodes internes du client minio utilisées pour le multipart, et leurs
+# premiers paramètres. minio ne garantit pas leur stabilité: vérifiées au
+# démarrage (testées avec minio 7.2.12, requirements.txt).
+_MULTIPART_API = {
+    "_create_multipart_upload": ("bucket_name", "object_name", "headers"),
+    "_upload_part": ("bucket_name", "object_name", "data", "headers", "upload_id", "part_number"),
+    "_list_parts": ("bucket_name", "object_name", "upload_id", "max_parts", "part_number_marker"),
+    "_complete_multipart_upload": ("bucket_name", "object_name", "upload_id", "parts"),
+    "_abort_multipart_upload": ("bucket_name", "object_name", "upload_id"),
+}
 
 # Client MinIO
 minio_client = Minio(
@@ -19,6 +51,25 @@ minio_client = Minio(
     secure=False  # True si HTTPS
 )
 
+_public_client: Optional[Minio] = None
+
+
+def get_public_client() -> Optional[Minio]:
+    """Client MinIO dont l'hôte est MINIO_PUBLIC_ENDPOINT (signature des URL), ou None."""
+    global _public_client
+    if not MINIO_PUBLIC_ENDPOINT:
+        return None
+    if _public_client is None:
+        parsed = urlparse(MINIO_PUBLIC_ENDPOINT if "://" in MINIO_PUBLIC_ENDPOINT else f"http://{MINIO_PUBLIC_ENDPOINT}")
+        _public_client = Minio(
+            parsed.netloc,
+            access_key=MINIO_ACCESS_KEY,
+            secret_key=MINIO_SECRET_KEY,
+            secure=parsed.scheme == "https",
+            region=MINIO_REGION,
+        )
+    return _public_client
+
 
 def init_minio():
     """Initialise le bucket MinIO s'il n'existe pas"""
@@ -33,128 +84,153 @@ def init_minio():
         raise
 
 
-def upload_file(user_id: int, file_data: bytes, file_name: str, metadata: dict) -> str:
-    """
-    Upload un fichier chiffré dans MinIO
-
-    Args:
-        user_id: ID de l'utilisateur
-        file_data: Données du fichier chiffré
-        file_name: Nom du fichier
-        metadata: Métadonnées (dek_encrypted, iv, sha256, etc.)
-
-    Returns:
-        object_name: Nom de l'objet dans MinIO
-    """
-    from io import BytesIO
-
-    # Nom unique pour l'objet: user_id/timestamp_filename
-    import time
-    timestamp = int(time.time() * 1000)
-    object_name = f"{user_id}/{timestamp}_{file_name}"
-
-    try:
+def check_multipart_api() -> None:
+    """StorageUnsupported si la version installée de minio n'a plus les méthodes multipart attendues."""
+    for name, expected in _MULTIPART_API.items():
+        method = getattr(Minio, name, None)
+        params = tuple(inspect.signature(method).parameters)[1:] if callable(method) else ()
+        if params[:len(expected)] != expected:
+            raise StorageUnsupported(
+                f"minio {minio.__version__}: Minio.{name}({', '.join(expected)}) introuvable, "
+                "version testée 7.2.12 (requirements.txt)"
+            )
+
+
+def _read_exact(stream, length: int) -> bytearray:
+    # Un flux réseau (corps de requête) peut rendre moins que demandé par
+    # read(): lu par blocs dans un tampon alloué une fois (pas de copie finale)
+    buffer = bytearray(length)
+    received = 0
+    while received < length:
+        chunk = stream.read(min(length - received, DOWNLOAD_CHUNK_SIZE))
+        if not chunk:
+            return buffer[:received]
+        buffer[received:received + len(chunk)] = chunk
+        received += len(chunk)
+    return buffer
+
+
+class MinioStorage(StorageBackend):
+    """Moteur de stockage MinIO: un objet par fichier dans MINIO_BUCKET."""
+
+    name = "minio"
+    max_part_size = MINIO_MAX_PART_SIZE
+
+    def init(self) -> None:
+        check_multipart_api()
+        init_minio()
+
+    def put(self, object_name, data, length, metadata=None) -> None:
+        stream = BytesIO(data) if isinstance(data, (bytes, bytearray, memoryview)) else data
         minio_client.put_object(
             MINIO_BUCKET,
             object_name,
-            BytesIO(file_data),
-            length=len(file_data),
-            metadata=metadata,
-            content_type="application/octet-stream"
+            stream,
+            length=length,
+            metadata=metadata or {},
+            content_type="application/octet-stream",
+            # Un flux est envoyé par parts, une à la fois: en parallèle, minio
+            # lit le flux plus vite qu'il n'envoie et garde les parts en mémoire
+            part_size=UPLOAD_PART_SIZE,
+            num_parallel_uploads=1,
         )
-        return object_name
-    except S3Error as e:
-        print(f"[MinIO] Erreur lors de l'upload: {e}")
-        raise
 
+    def get(self, object_name) -> bytes:
+        response = minio_client.get_object(MINIO_BUCKET, object_name)
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    def stream(self, object_name, offset=0, length=None, chunk_size=DOWNLOAD_CHUNK_SIZE) -> ChunkStream:
+        response = minio_client.get_object(MINIO_BUCKET, object_name, offset=offset, length=length or 0)
 
-def list_user_files(user_id: int) -> list:
-    """
-    Liste tous les fichiers d'un utilisateur
+        def _release():
+            # Client parti en cours de route: la connexion est fermée, pas réutilisée
+            response.close()
+            response.release_conn()
 
-    Args:
-        user_id: ID de l'utilisateur
+        return ChunkStream(response.stream(chunk_size), _release)
 
-    Returns:
-        Liste des objets MinIO
-    """
-    try:
-        objects = minio_client.list_objects(
+    def presigned_url(self, object_name, expires, download_name) -> Optional[str]:
+        client = get_public_client()
+        if client is None:
+            return None
+        disposition = f"attachment; filename*=UTF-8''{quote(download_name, safe='')}"
+        return client.presigned_get_object(
             MINIO_BUCKET,
-            prefix=f"{user_id}/",
-            recursive=True
+            object_name,
+            expires=timedelta(seconds=expires),
+            response_headers={
+                "response-content-disposition": disposition,
+                "response-content-type": "application/octet-stream",
+            },
         )
 
-        files = []
-        for obj in objects:
-            # Récupérer les métadonnées
-            stat = minio_client.stat_object(MINIO_BUCKET, obj.object_name)
-
-            files.append({
-                "object_name": obj.object_name,
-                "file_name": obj.object_name.split("/", 1)[1] if "/" in obj.object_name else obj.object_name,
-                "size": obj.size,
-                "last_modified": obj.last_modified.isoformat(),
-                "metadata": stat.metadata
-            })
-
-        return files
-    except S3Error as e:
-        print(f"[MinIO] Erreur lors de la liste: {e}")
-        raise
-
-
-def download_file(user_id: int, object_name: str) -> tuple:
-    """
-    Télécharge un fichier depuis MinIO
-
-    Args:
-        user_id: ID de l'utilisateur
-        object_name: Nom de l'objet dans MinIO
-
-    Returns:
-        (file_data, metadata)
-    """
-    try:
-        # Vérifier que l'utilisateur a accès au fichier
-        if not object_name.startswith(f"{user_id}/"):
-            raise PermissionError("Accès non autorisé à ce fichier")
+    def presigned_upload_url(self, object_name, expires) -> Optional[str]:
+        client = get_public_client()
+        if client is None:
+            return None
+        return client.presigned_put_object(MINIO_BUCKET, object_name, expires=timedelta(seconds=expires))
+
+    def stat(self, object_name) -> StoredObject:
+        try:
+            stat = minio_client.stat_object(MINIO_BUCKET, object_name)
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject"):
+                raise ObjectNotFound(object_name) from e
+            raise
+        return StoredObject(object_name, stat.size, stat.last_modified, dict(stat.metadata or {}), stat.etag)
+
+    def remove(self, object_name) -> None:
+        minio_client.remove_object(MINIO_BUCKET, object_name)
 
-        # Récupérer le fichier
-        response = minio_client.get_object(MINIO_BUCKET, object_name)
-        file_data = response.read()
+    def remove_many(self, object_names) -> Dict[str, str]:
+        # DeleteObjects: le client envoie une requête par tranche de 1000 clés et
+        # ne renvoie que les échecs (une clé absente compte comme supprimée)
+        errors = minio_client.remove_objects(MINIO_BUCKET, [DeleteObject(name) for name in object_names])
+        return {error.name: f"{error.code}: {error.message}" for error in errors}
 
-        # Récupérer les métadonnées
-        stat = minio_client.stat_object(MINIO_BUCKET, object_name)
+    def list(self, prefix: str = "", recursive: bool = True) -> Iterator[StoredObject]:
+        for obj in minio_client.list_objects(MINIO_BUCKET, prefix=prefix or None, recursive=recursive):
+            yield StoredObject(obj.object_name, obj.size, obj.last_modified, {}, getattr(obj, "etag", None))
 
-        return file_data, stat.metadata
-    except S3Error as e:
-        print(f"[MinIO] Erreur lors du téléchargement: {e}")
-        raise
-    finally:
-        if 'response' in locals():
-            response.close()
-            response.release_conn()
+    def prefixes(self) -> List[str]:
+        return sorted(obj.object_name for obj in minio_client.list_objects(MINIO_BUCKET, recursive=False) if obj.is_dir)
 
+    # Multipart S3: le client minio n'expose ces appels qu'en méthodes internes
+    # (put_object les enchaîne seul); on les appelle une part à la fois.
 
-def delete_file(user_id: int, object_name: str) -> bool:
-    """
-    Supprime un fichier de MinIO
+    def create_multipart(self, object_name) -> str:
+        return minio_client._create_multipart_upload(
+            MINIO_BUCKET, object_name, {"Content-Type": "application/octet-stream"}
+        )
 
-    Args:
-        user_id: ID de l'utilisateur
-        object_name: Nom de l'objet dans MinIO
+    def upload_part(self, object_name, upload_id, part_number, data, length) -> str:
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            data = _read_exact(data, length)
+        if len(data) != length:
+            raise IOError(f"Part incomplète: {len(data)} octets reçus sur {length}")
+        return minio_client._upload_part(MINIO_BUCKET, object_name, data, None, upload_id, part_number)
+
+    def list_parts(self, object_name, upload_id) -> List[StoredPart]:
+        parts: List[StoredPart] = []
+        marker = None
+        while True:
+            result = minio_client._list_parts(MINIO_BUCKET, object_name, upload_id, part_number_marker=marker)
+            parts.extend(StoredPart(p.part_number, p.size, p.etag) for p in result.parts)
+            if not result.is_truncated:
+                return parts
+            marker = result.next_part_number_marker
+
+    def complete_multipart(self, object_name, upload_id, parts) -> None:
+        minio_client._complete_multipart_upload(
+            MINIO_BUCKET, object_name, upload_id, [Part(p.part_number, p.etag) for p in parts]
+        )
 
-    Returns:
-        True si suppression réussie
-    """
-    try:
-        # Vérifier que l'utilisateur a accès au fichier
-        if not object_name.startswith(f"{user_id}/"):
-            raise PermissionError("Accès non autorisé à ce fichier")
+    def abort_multipart(self, object_name, upload_id) -> None:
+        minio_client._abort_multipart_upload(MINIO_BUCKET, object_name, upload_id)
 
-        minio_client.remove_object(MINIO_BUCKET, object_name)
-        return True
-    except S3Error as e:
-        print(f"[MinIO] Erreur lors de la suppression: {e}")
-        raise
+    def local_path(self, object_name) -> Optional[str]:
+        return None
@@ -0,0 +1,123 @@
+"""
+Pagination par curseur (keyset) des listings.
+
+Le curseur désigne le dernier élément renvoyé (valeur de la clé de tri + id).
+La page suivante reprend strictement après lui, sans OFFSET. Côté SQL, une
+page est donc un parcours borné de l'index (id_users, id_folder, <clé>, id)
+des documents ou (id_users, parent_id, <clé>, id) des dossiers, quelle que
+soit sa position dans la liste; MySQL compare le curseur avec la collation
+de la colonne, comme il trie.
+
+Paramètres de requête:
+- limit: taille de page (absent = tout, comme avant)
+- cursor: valeur next_cursor de la page précédente
+- sort: name | size | date (défaut: date), order: asc | desc (défaut: desc
+  pour date, asc sinon). Sans sort, les dossiers restent triés par nom.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, NamedTuple, Optional
+
+from module.config import LIST_MAX_LIMIT
+
+SORT_KEYS = ("name", "size", "date")
+
+
+class PageError(ValueError):
+    """Paramètres de pagination invalides (message renvoyé au client, 400)."""
+
+
+class Cursor(NamedTuple):
+    phase: str  # "f": dossiers, "d": documents
+    value: Any
+    id: int
+
+
+class PageRequest(NamedTuple):
+    sort: str
+    descending: bool
+    folder_sort: str
+    folder_descending: bool
+    limit: Optional[int]
+    after: Optional[Cursor]
+
+    @property
+    def signature(self) -> str:
+        """Tri complet, recopié dans le curseur (un curseur ne vaut que pour son tri)."""
+        return "/".join([
+            self.sort, "desc" if self.descending else "asc",
+            self.folder_sort, "desc" if self.folder_descending else "asc",
+        ])
+
+    def cursor(self, phase: str, value: Any, item_id: int) -> str:
+        """Curseur opaque désignant l'élément (phase, value, id) pour cette pagination."""
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        payload = {"s": self.signature, "k": phase, "v": value, "i": int(item_id)}
+        raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(token: str, page: PageRequest) -> Cursor:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw.decode("utf-8"))
+        phase, value, item_id = payload["k"], payload["v"], int(payload["i"])
+        same_order = payload["s"] == page.signature
+    except (binascii.Error, ValueError, KeyError, TypeError, UnicodeDecodeError):
+        raise PageError("cursor invalide")
+    if phase not in ("f", "d") or not same_order:
+        raise PageError("cursor invalide pour ce tri")
+    sort = page.sort if phase == "d" else page.folder_sort
+    if sort == "date" and value is not None:
+        try:
+            value = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise PageError("cursor invalide")
+    return Cursor(phase, value, item_id)
+
+
+def parse_page_args(args) -> PageRequest:
+    """Lit limit / cursor / sort / order (request.args); PageError si invalides."""
+    explicit = bool(args.get("sort"))
+    sort = args.get("sort") or "date"
+    if sort not in SORT_KEYS:
+        raise PageError(f"sort doit valoir {', '.join(SORT_KEYS)}")
+
+    order = args.get("order") or ("desc" if sort == "date" else "asc")
+    if order not in ("asc", "desc"):
+        raise PageError("order doit valoir asc ou desc")
+    descending = order == "desc"
+
+    limit = args.get("limit")
+    if limit not in (None, ""):
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            raise PageError("limit invalide")
+        if not 1 <= limit <= LIST_MAX_LIMIT:
+            raise PageError(f"limit doit être entre 1 et {LIST_MAX_LIMIT}")
+    else:
+        limit = None
+
+    # Les dossiers n'ont pas de taille; sans sort explicite ils restent par nom
+    folder_sort = sort if explicit and sort != "size" else "name"
+    folder_descending = descending if explicit and sort != "size" else False
+
+    page = PageRequest(sort, descending, folder_sort, folder_descending, limit, None)
+    token = args.get("cursor")
+    if not token:
+        return page
+    if limit is None:
+        raise PageError("limit requis avec cursor")
+    return page._replace(after=_decode_cursor(token, page))
+
+
+def keyset_condition(column: str, descending: bool) -> str:
+    """Condition SQL "après le curseur" pour ORDER BY column, id (paramètres: valeur, id)."""
+    return f"({column}, id) {'<' if descending else '>'} (%s, %s)"
@@ -0,0 +1,54 @@
+import os
+import threading
+from typing import Callable
+
+
+class PeriodicTask:
+    """
+    Tâche de maintenance exécutée toutes les `interval` secondes par un thread
+    de fond, un par process (chaque worker gunicorn a le sien).
+
+    Le thread est démarré à la demande par start() et relancé dans l'enfant
+    après un fork. Les tâches doivent donc supporter d'être exécutées en
+    parallèle par plusieurs workers. interval <= 0 désactive la tâche.
+    """
+
+    def __init__(self, name: str, interval: float, func: Callable[[], object]):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self._init_state()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._init_state)
+
+    def _init_state(self) -> None:
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = os.getpid()
+
+    def start(self) -> None:
+        if self.interval <= 0:
+            return
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._init_state()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"yoda-{self.name}", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run_once(self):
+        try:
+            return self.func()
+        except Exception as e:
+            print(f"[ERROR] {self.name}: {e}")
+            return None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.run_once()
@@ -0,0 +1,142 @@
+import os
+import re
+import sys
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from flask import g, has_request_context, request
+
+from .config import (
+    SQL_REQUEST_SUMMARY,
+    SQL_SERVER_TIMING,
+    SQL_SERVER_TIMING_SITES,
+    SQL_SLOW_QUERY_MS,
+    SQL_STATS_ENABLED,
+)
+from .metrics import observe_db_query
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_SKIP_FILES = {
+    os.path.join(_BACKEND_DIR, "module", "db.py"),
+    os.path.abspath(__file__),
+}
+
+_WS_RE = re.compile(r"\s+")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*%s(?:\s*,\s*%s)*\s*\)", re.IGNORECASE)
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_RE = re.compile(r"(?<![\w%])\d+(?:\.\d+)?\b")
+
+
+@lru_cache(maxsize=512)
+def normalize_sql(query: str) -> str:
+    """
+    Forme canonique d'une requête pour regrouper les statistiques:
+    espaces compactés, littéraux remplacés par ?, listes IN (%s, ...) réduites.
+    """
+    text = _WS_RE.sub(" ", query).strip()
+    text = _IN_LIST_RE.sub("IN (...)", text)
+    text = _STRING_RE.sub("?", text)
+    text = _NUMBER_RE.sub("?", text)
+    return text.replace("%s", "?")
+
+
+def _call_site() -> str:
+    """Premier appelant hors de module/db.py (ex: module/folder.py:355 build_breadcrumb)."""
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_code.co_filename in _SKIP_FILES:
+        frame = frame.f_back
+    if frame is None:
+        return "?"
+    filename = frame.f_code.co_filename
+    if filename.startswith(_BACKEND_DIR):
+        filename = os.path.relpath(filename, _BACKEND_DIR)
+    return f"{filename}:{frame.f_lineno} {frame.f_code.co_name}"
+
+
+def record(query: str, started: float, rowcount: Optional[int]) -> None:
+    """Enregistre une requête exécutée (appelé par les helpers de module/db.py)."""
+    duration_s = time.perf_counter() - started
+    observe_db_query(query, duration_s)
+    if not SQL_STATS_ENABLED:
+        return
+    duration_ms = duration_s * 1000
+    slow = SQL_SLOW_QUERY_MS > 0 and duration_ms >= SQL_SLOW_QUERY_MS
+    in_request = has_request_context()
+    if not slow and not in_request:
+        return
+
+    entry = {
+        "sql": normalize_sql(query),
+        "duration_ms": duration_ms,
+        "rows": rowcount if rowcount is not None and rowcount >= 0 else None,
+        "site": _call_site(),
+    }
+    if slow:
+        where = f"{request.method} {request.path} " if in_request else ""
+        print(
+            f"[SLOW SQL] {duration_ms:.1f}ms rows={entry['rows']} {where}at {entry['site']}: {entry['sql']}"
+        )
+    if in_request:
+        stats = g.get("_sql_stats")
+        if stats is None:
+            stats = g._sql_stats = []
+        stats.append(entry)
+
+
+def request_stats() -> List[Dict[str, Any]]:
+    """Requêtes SQL enregistrées pour la requête HTTP en cours."""
+    return g.get("_sql_stats") or []
+
+
+def _by_site(stats: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    sites: Dict[str, Dict[str, Any]] = {}
+    for entry in stats:
+        site = sites.setdefault(entry["site"], {"site": entry["site"], "count": 0, "duration_ms": 0.0})
+        site["count"] += 1
+        site["duration_ms"] += entry["duration_ms"]
+    return sorted(sites.values(), key=lambda s: s["duration_ms"], reverse=True)
+
+
+def _start_request() -> None:
+    g._sql_request_started = time.perf_counter()
+
+
+def _finish_request(response):
+    stats = request_stats()
+    if not stats:
+        return response
+
+    db_ms = sum(entry["duration_ms"] for entry in stats)
+    started = g.get("_sql_request_started")
+    total_ms = (time.perf_counter() - started) * 1000 if started else None
+    sites = _by_site(stats)
+
+    if SQL_SERVER_TIMING:
+        parts = [f"db;dur={db_ms:.1f}"]
+        # Détail interne (sites d'appel): seulement en débogage explicite
+        if SQL_SERVER_TIMING_SITES:
+            parts[0] += f';desc="{len(stats)} queries"'
+            for i, site in enumerate(sites[:3], start=1):
+                desc = site["site"].replace('"', "'")
+                parts.append(f'db{i};dur={site["duration_ms"]:.1f};desc="{desc} x{site["count"]}"')
+        existing = response.headers.get("Server-Timing")
+        response.headers["Server-Timing"] = ", ".join(([existing] if existing else []) + parts)
+
+    if SQL_REQUEST_SUMMARY:
+        top = sites[0]
+        total = f" total={total_ms:.1f}ms" if total_ms is not None else ""
+        print(
+            f"[SQL] {request.method} {request.path} {response.status_code} "
+            f"queries={len(stats)} db={db_ms:.1f}ms{total} "
+            f"top={top['site']} ({top['count']}x, {top['duration_ms']:.1f}ms)"
+        )
+    return response
+
+
+def init_app(app) -> None:
+    """Active l'instrumentation SQL par requête sur l'application Flask."""
+    if not SQL_STATS_ENABLED:
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
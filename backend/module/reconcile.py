@@ -0,0 +1,397 @@
+"""
+Rapprochement stockage / base: objets orphelins et lignes sans objet.
+
+- objet orphelin: présent dans le stockage mais référencé par aucune ligne
+  (documents, shared_files, upload_slots). Exemples: upload interrompu entre
+  l'écriture et l'INSERT, remove en échec, partage supprimé avec son document.
+- ligne sans objet: document ou partage dont le fichier n'existe plus.
+
+Les deux côtés sont lus dans l'ordre des clés puis comparés par fusion, sans
+charger ni la base ni le bucket en mémoire:
+- stockage: un listing par préfixe de premier niveau ("12/", "12_shared/"),
+  dans l'ordre des clés rendu par le moteur. Les listings partent en
+  parallèle (RECONCILE_WORKERS) et sont consommés dans l'ordre; chacun ne
+  lit que quelques lots de RECONCILE_BATCH objets d'avance.
+- base: les object_name sont lus par pages (keyset sur l'index). Les colonnes
+  sont en utf8mb4_bin, donc MySQL trie comme S3 (octet par octet).
+
+Aucune suppression sans double vérification. Un objet orphelin est relu en
+base juste avant d'être supprimé, et il n'est jamais supprimé s'il a moins de
+RECONCILE_MIN_AGE secondes (upload en cours). Une ligne sans objet est
+re-vérifiée dans le stockage de la même façon.
+
+Usage (depuis backend/):
+    python -m module.reconcile                      # rapport seul (dry-run)
+    python -m module.reconcile --repair             # supprime les objets orphelins
+    python -m module.reconcile --repair --delete-dangling --throttle 0.5
+"""
+
+from __future__ import annotations
+
+import argparse
+import heapq
+import itertools
+import json
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from .change_version import bump_change_version
+from .config import RECONCILE_BATCH, RECONCILE_MIN_AGE, RECONCILE_THROTTLE, RECONCILE_WORKERS
+from .db import execute_write, fetch_all, transaction
+from .storage import ObjectNotFound, StorageBackend, StoredObject, get_storage
+from .usage import release_documents, release_shares
+
+# Tables dont les lignes référencent un objet. Un emplacement d'upload protège
+# son objet, mais n'a normalement pas encore de fichier: jamais "sans objet".
+REFERENCING_TABLES = ("documents", "shared_files", "upload_slots")
+DANGLING_TABLES = ("documents", "shared_files")
+_OWNER_COLUMNS = {"documents": "id_users", "shared_files": "id_owner"}
+# Retrait des compteurs d'espace (module/usage.py): fonction, alias de la table
+_RELEASE_USAGE = {"documents": (release_documents, "d"), "shared_files": (release_shares, "s")}
+
+SAMPLE_SIZE = 100
+# Lots d'objets lus d'avance par listing, en plus de celui en cours
+PREFETCH_BATCHES = 2
+
+
+class OutOfOrder(RuntimeError):
+    """Un des deux flux n'est pas trié: la fusion serait fausse, on arrête tout."""
+
+
+class RowRef(NamedTuple):
+    object_name: str
+    table: str
+    id: int
+
+
+class ReconcileReport:
+    """Compteurs du passage, et un échantillon des clés concernées."""
+
+    def __init__(self, repair: bool):
+        self.repair = repair
+        self.objects = 0
+        self.rows = 0
+        self.orphans = 0
+        self.orphan_bytes = 0
+        self.recent = 0
+        self.dangling = 0
+        self.removed = 0
+        self.rows_deleted = 0
+        self.errors = 0
+        self.samples: Dict[str, List[Any]] = {"orphans": [], "dangling": []}
+
+    def sample(self, kind: str, value) -> None:
+        if len(self.samples[kind]) < SAMPLE_SIZE:
+            self.samples[kind].append(value)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+def _ensure_sorted(items: Iterator, key, label: str, strict: bool) -> Iterator:
+    previous = None
+    for item in items:
+        current = key(item)
+        if previous is not None and (current < previous or (strict and current == previous)):
+            raise OutOfOrder(f"{label}: {current!r} après {previous!r}")
+        previous = current
+        yield item
+
+
+_END = object()
+
+
+def _list_prefix(storage: StorageBackend, prefix: str, batches: "queue.Queue", batch: int,
+                 stopped: threading.Event) -> None:
+    # Listing du moteur (déjà par clé croissante) découpé en lots; bloque
+    # quand PREFETCH_BATCHES lots attendent d'être consommés
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                batches.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    try:
+        objects = iter(storage.list(prefix=prefix))
+        while True:
+            chunk = list(itertools.islice(objects, batch))
+            if not chunk:
+                break
+            if not put(chunk):
+                return
+        put(_END)
+    except BaseException as e:
+        put(e)
+
+
+def iter_storage_objects(storage: StorageBackend, workers: int = RECONCILE_WORKERS,
+                         batch: int = RECONCILE_BATCH) -> Iterator[StoredObject]:
+    """
+    Objets du stockage par clé croissante.
+
+    Chaque préfixe de premier niveau est listé dans un thread, avec au plus
+    2 x workers listings d'avance, chacun limité à PREFETCH_BATCHES lots de
+    `batch` objets en attente: la mémoire ne dépend pas de la taille des
+    listings. Les préfixes se terminent par "/" et aucun n'en contient un
+    autre, donc leur concaténation dans l'ordre des préfixes reste triée.
+    """
+    workers, batch = max(1, workers), max(1, batch)
+    prefixes = iter(storage.prefixes())
+    stopped = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="yoda-reconcile")
+
+    def submit(prefix: str) -> "queue.Queue":
+        batches: "queue.Queue" = queue.Queue(maxsize=PREFETCH_BATCHES)
+        pool.submit(_list_prefix, storage, prefix, batches, batch, stopped)
+        return batches
+
+    try:
+        pending = deque(submit(p) for p in itertools.islice(prefixes, 2 * workers))
+        while pending:
+            batches = pending.popleft()
+            while True:
+                chunk = batches.get()
+                if chunk is _END:
+                    break
+                if isinstance(chunk, BaseException):
+                    raise chunk
+                yield from chunk
+            following = next(prefixes, None)
+            if following is not None:
+                pending.append(submit(following))
+    finally:
+        # Arrêt anticipé (erreur, OutOfOrder): les listings en cours s'arrêtent au lot suivant
+        stopped.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _iter_table(table: str, batch: int, throttle: float) -> Iterator[RowRef]:
+    # Keyset sur (object_name, id): une page = une lecture d'index, même si
+    # deux lignes partagent un object_name
+    last_name, last_id = "", 0
+    while True:
+        rows = fetch_all(
+            f"SELECT id, object_name FROM {table} WHERE (object_name, id) > (%s, %s) ORDER BY object_name, id LIMIT %s",
+            (last_name, last_id, batch),
+        )
+        for row in rows:
+            yield RowRef(row["object_name"], table, row["id"])
+        if len(rows) < batch:
+            return
+        last_name, last_id = rows[-1]["object_name"], rows[-1]["id"]
+        if throttle:
+            time.sleep(throttle)
+
+
+def iter_referenced_rows(batch: int = RECONCILE_BATCH, throttle: float = 0) -> Iterator[RowRef]:
+    """Lignes référençant un objet, toutes tables confondues, par object_name croissant."""
+    return heapq.merge(*(_iter_table(table, batch, throttle) for table in REFERENCING_TABLES))
+
+
+def _referenced(object_names: List[str]) -> set:
+    placeholders = ", ".join(["%s"] * len(object_names))
+    found = set()
+    for table in REFERENCING_TABLES:
+        rows = fetch_all(f"SELECT object_name FROM {table} WHERE object_name IN ({placeholders})", tuple(object_names))
+        found.update(row["object_name"] for row in rows)
+    return found
+
+
+class Reconciler:
+    """Un passage de rapprochement (voir la docstring du module)."""
+
+    def __init__(
+        self,
+        storage: Optional[StorageBackend] = None,
+        repair: bool = False,
+        delete_dangling: bool = False,
+        workers: int = RECONCILE_WORKERS,
+        batch: int = RECONCILE_BATCH,
+        min_age: int = RECONCILE_MIN_AGE,
+        throttle: float = RECONCILE_THROTTLE,
+    ):
+        self.storage = storage or get_storage()
+        self.repair = repair
+        self.delete_dangling = repair and delete_dangling
+        self.workers = workers
+        self.batch = max(1, batch)
+        self.min_age = min_age
+        self.throttle = throttle
+        self.report = ReconcileReport(repair)
+        self._orphans: List[StoredObject] = []
+        self._dangling: List[RowRef] = []
+
+    def run(self) -> ReconcileReport:
+        # Objets modifiés après ce point: trop récents pour être orphelins
+        self._cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.min_age)
+        objects = _ensure_sorted(iter_storage_objects(self.storage, self.workers, self.batch),
+                                 lambda obj: obj.object_name, "stockage", strict=True)
+        rows = _ensure_sorted(iter_referenced_rows(self.batch, self.throttle),
+                              lambda row: row.object_name, "base", strict=False)
+
+        obj = next(objects, None)
+        row = next(rows, None)
+        while obj is not None or row is not None:
+            if row is None or (obj is not None and obj.object_name < row.object_name):
+                self.report.objects += 1
+                self._orphan(obj)
+                obj = next(objects, None)
+            elif obj is None or row.object_name < obj.object_name:
+                self.report.rows += 1
+                if row.table in DANGLING_TABLES:
+                    self._dangling_row(row)
+                row = next(rows, None)
+            else:
+                self.report.objects += 1
+                name = obj.object_name
+                while row is not None and row.object_name == name:
+                    self.report.rows += 1
+                    row = next(rows, None)
+                obj = next(objects, None)
+
+        self._flush_orphans()
+        self._flush_dangling()
+        return self.report
+
+    def _orphan(self, obj: StoredObject) -> None:
+        modified = obj.last_modified
+        if modified is not None and modified.tzinfo is None:
+            modified = modified.replace(tzinfo=timezone.utc)
+        if modified is None or modified > self._cutoff:
+            self.report.recent += 1
+            return
+        self._orphans.append(obj)
+        if len(self._orphans) >= self.batch:
+            self._flush_orphans()
+
+    def _dangling_row(self, row: RowRef) -> None:
+        self._dangling.append(row)
+        if len(self._dangling) >= self.batch:
+            self._flush_dangling()
+
+    def _flush_orphans(self) -> None:
+        batch, self._orphans = self._orphans, []
+        if not batch:
+            return
+        # Une ligne a pu être validée depuis la lecture de sa page
+        referenced = _referenced([obj.object_name for obj in batch])
+        for obj in batch:
+            if obj.object_name in referenced:
+                continue
+            self.report.orphans += 1
+            self.report.orphan_bytes += obj.size or 0
+            self.report.sample("orphans", obj.object_name)
+            if not self.repair:
+                print(f"[Reconcile] Objet orphelin: {obj.object_name} ({obj.size} octets)")
+                continue
+            try:
+                self.storage.remove(obj.object_name)
+                self.report.removed += 1
+            except Exception as e:
+                self.report.errors += 1
+                print(f"[ERROR] Reconcile remove {obj.object_name}: {e}")
+        if self.repair and self.throttle:
+            time.sleep(self.throttle)
+
+    def _flush_dangling(self) -> None:
+        batch, self._dangling = self._dangling, []
+        if not batch:
+            return
+        confirmed: Dict[str, List[int]] = {}
+        for row in batch:
+            # L'objet a pu être écrit après le passage du listing sur sa clé
+            try:
+                self.storage.stat(row.object_name)
+                continue
+            except ObjectNotFound:
+                pass
+            self.report.dangling += 1
+            self.report.sample("dangling", {"table": row.table, "id": row.id, "object_name": row.object_name})
+            if not self.delete_dangling:
+                print(f"[Reconcile] Ligne sans objet: {row.table}#{row.id} -> {row.object_name}")
+                continue
+            confirmed.setdefault(row.table, []).append(row.id)
+        for table, ids in confirmed.items():
+            placeholders = ", ".join(["%s"] * len(ids))
+            owner = _OWNER_COLUMNS[table]
+            try:
+                owners = fetch_all(f"SELECT DISTINCT {owner} AS owner FROM {table} WHERE id IN ({placeholders})", tuple(ids))
+                # Compteurs d'espace et lignes ensemble; puis les listings en cache sont périmés
+                with transaction():
+                    release, alias = _RELEASE_USAGE[table]
+                    release(f"{alias}.id IN ({placeholders})", tuple(ids))
+                    rowcount, _ = execute_write(f"DELETE FROM {table} WHERE id IN ({placeholders})", tuple(ids))
+                    for row in owners:
+                        bump_change_version(row["owner"])
+                self.report.rows_deleted += rowcount
+            except Exception as e:
+                self.report.errors += 1
+                print(f"[ERROR] Reconcile delete {table}: {e}")
+        if self.delete_dangling and self.throttle:
+            time.sleep(self.throttle)
+
+
+def reconcile(**options) -> ReconcileReport:
+    """Lance un passage; options: voir Reconciler (repair, delete_dangling, throttle, ...)."""
+    return Reconciler(**options).run()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Rapprochement stockage / base du backend YODA")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--dry-run", action="store_true", help="rapport seul, rien n'est supprimé (défaut)")
+    mode.add_argument("--repair", action="store_true", help="supprime les objets orphelins")
+    parser.add_argument("--delete-dangling", action="store_true",
+                        help="avec --repair: supprime aussi les lignes dont l'objet n'existe plus")
+    parser.add_argument("--workers", type=int, default=RECONCILE_WORKERS,
+                        help=f"listings de préfixes en parallèle (défaut: {RECONCILE_WORKERS})")
+    parser.add_argument("--batch", type=int, default=RECONCILE_BATCH,
+                        help=f"taille des pages SQL et des lots de réparation (défaut: {RECONCILE_BATCH})")
+    parser.add_argument("--min-age", type=int, default=RECONCILE_MIN_AGE,
+                        help=f"âge minimal (s) d'un objet orphelin (défaut: {RECONCILE_MIN_AGE})")
+    parser.add_argument("--throttle", type=float, default=RECONCILE_THROTTLE,
+                        help=f"pause (s) après chaque page SQL et chaque lot (défaut: {RECONCILE_THROTTLE})")
+    parser.add_argument("--output", help="fichier JSON où écrire le rapport")
+    args = parser.parse_args(argv)
+    if args.delete_dangling and not args.repair:
+        parser.error("--delete-dangling nécessite --repair")
+
+    started = time.perf_counter()
+    try:
+        report = reconcile(
+            repair=args.repair,
+            delete_dangling=args.delete_dangling,
+            workers=args.workers,
+            batch=args.batch,
+            min_age=args.min_age,
+            throttle=args.throttle,
+        )
+    except OutOfOrder as e:
+        print(f"[ERROR] Reconcile interrompu, flux non trié ({e}). "
+              "Les colonnes object_name doivent être en utf8mb4_bin (voir database/schemas.sql).")
+        return 2
+
+    print(f"[Reconcile] {report.objects} objet(s), {report.rows} ligne(s) en {time.perf_counter() - started:.1f}s")
+    print(f"[Reconcile] Orphelins: {report.orphans} ({report.orphan_bytes} octets), supprimés: {report.removed}, "
+          f"trop récents: {report.recent}")
+    print(f"[Reconcile] Lignes sans objet: {report.dangling}, supprimées: {report.rows_deleted}")
+    if not args.repair:
+        print("[Reconcile] Dry-run: rien n'a été supprimé (--repair pour réparer)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report.as_dict(), fh, indent=2)
+    return 1 if report.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""
+Recherche de documents dans toute l'arborescence d'un utilisateur.
+
+Filtres (query string de GET /documents/search, tous optionnels):
+- q: mots du nom (tous requis, sous-chaînes, casse ignorée)
+- extension: une ou plusieurs extensions séparées par des virgules
+- min_size / max_size: taille en octets, bornes incluses
+- from / to: date d'upload (ISO); une date seule en `to` inclut la journée
+- folder_id: limite la recherche à un dossier et ses sous-dossiers
+
+Index (database/schemas.sql):
+- FULLTEXT ngram sur nom_original: un mot d'au moins SEARCH_NGRAM_TOKEN_SIZE
+  caractères (ngram_token_size de MySQL) est cherché comme une phrase de
+  n-grammes, soit une sous-chaîne; un mot plus court ne peut pas passer par
+  l'index et est filtré (INSTR) sur les documents retenus par les autres
+  critères
+- (id_users, extension, created_at, id), (id_users, created_at, id) et
+  (id_users, taille_octets, id) pour les autres filtres et les tris
+
+Pagination et tri: ceux de /documents/list (module/pagination.py), avec une
+taille de page par défaut (SEARCH_PAGE_SIZE).
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+from module.config import SEARCH_MAX_TERMS, SEARCH_NGRAM_TOKEN_SIZE, SEARCH_PAGE_SIZE
+from module.pagination import PageError, PageRequest, keyset_condition, parse_page_args
+
+
+class SearchError(ValueError):
+    """Critères de recherche invalides (message renvoyé au client, 400)."""
+
+
+class SearchQuery(NamedTuple):
+    terms: Tuple[str, ...]
+    extensions: Tuple[str, ...]
+    min_size: Optional[int]
+    max_size: Optional[int]
+    created_from: Optional[datetime]
+    created_to: Optional[datetime]  # exclu
+    folder_id: Optional[int]
+
+
+def _parse_int(args, name: str) -> Optional[int]:
+    raw = args.get(name)
+    if raw in (None, ""):
+        return None
+    try:
+        value = int(raw)
+    except (TypeError, ValueError):
+        raise SearchError(f"{name} invalide")
+    if value < 0:
+        raise SearchError(f"{name} invalide")
+    return value
+
+
+def _parse_date(args, name: str, end: bool) -> Optional[datetime]:
+    raw = args.get(name)
+    if raw in (None, ""):
+        return None
+    try:
+        value = datetime.fromisoformat(raw)
+    except (TypeError, ValueError):
+        raise SearchError(f"{name} invalide (date ISO attendue)")
+    if value.tzinfo is not None:
+        # created_at est stocké en UTC, sans fuseau
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    if end and len(raw) == 10:
+        value += timedelta(days=1)
+    return value
+
+
+def parse_search_args(args) -> Tuple[SearchQuery, PageRequest]:
+    """Critères et pagination de la requête (request.args); SearchError / PageError si invalides."""
+    # Sans ponctuation de la syntaxe booléenne MySQL: les mots sont cherchés tels quels
+    text = "".join(" " if ch in '"+-<>()~*@' else ch for ch in args.get("q") or "")
+    terms = tuple(dict.fromkeys(term.casefold() for term in text.split()))
+    if len(terms) > SEARCH_MAX_TERMS:
+        raise SearchError(f"Au plus {SEARCH_MAX_TERMS} mots")
+
+    extensions = tuple(dict.fromkeys(
+        ext.strip().lstrip(".").lower() for ext in (args.get("extension") or "").split(",") if ext.strip().lstrip(".")
+    ))
+
+    min_size, max_size = _parse_int(args, "min_size"), _parse_int(args, "max_size")
+    created_from, created_to = _parse_date(args, "from", False), _parse_date(args, "to", True)
+
+    folder_id = None
+    folder_param = args.get("folder_id")
+    if folder_param not in (None, "", "null", "root", "0"):
+        try:
+            folder_id = int(folder_param)
+        except (TypeError, ValueError):
+            raise SearchError("folder_id invalide")
+
+    page_args = args.copy()
+    if not page_args.get("limit"):
+        page_args["limit"] = str(SEARCH_PAGE_SIZE)
+    page = parse_page_args(page_args)
+    if page.after is not None and page.after.phase != "d":
+        raise PageError("cursor invalide pour la recherche")
+
+    return SearchQuery(terms, extensions, min_size, max_size, created_from, created_to, folder_id), page
+
+
+def build_search_query(
+    user_id: int,
+    search: SearchQuery,
+    page: PageRequest,
+    columns: str,
+    sort_column: str,
+    folder_ids: Optional[List[int]] = None,
+) -> Tuple[str, List[Any]]:
+    """
+    Requête SQL d'une page de résultats (columns: liste SELECT).
+
+    folder_ids: dossiers autorisés (sous-arbre de search.folder_id), None = tous.
+    Une ligne de plus que la page est demandée pour savoir s'il y a une suite.
+    """
+    where = ["id_users = %s"]
+    params: List[Any] = [user_id]
+
+    indexed = [term for term in search.terms if len(term) >= SEARCH_NGRAM_TOKEN_SIZE]
+    if indexed:
+        where.append("MATCH(nom_original) AGAINST (%s IN BOOLEAN MODE)")
+        params.append(" ".join(f'+"{term}"' for term in indexed))
+    for term in search.terms:
+        if len(term) < SEARCH_NGRAM_TOKEN_SIZE:
+            where.append("INSTR(nom_original, %s) > 0")
+            params.append(term)
+
+    if search.extensions:
+        where.append(f"extension IN ({', '.join(['%s'] * len(search.extensions))})")
+        params += search.extensions
+    if search.min_size is not None:
+        where.append("taille_octets >= %s")
+        params.append(search.min_size)
+    if search.max_size is not None:
+        where.append("taille_octets <= %s")
+        params.append(search.max_size)
+    if search.created_from is not None:
+        where.append("created_at >= %s")
+        params.append(search.created_from)
+    if search.created_to is not None:
+        where.append("created_at < %s")
+        params.append(search.created_to)
+    if folder_ids is not None:
+        where.append(f"id_folder IN ({', '.join(['%s'] * len(folder_ids))})")
+        params += folder_ids
+
+    if page.after is not None:
+        where.append(keyset_condition(sort_column, page.descending))
+        params += [page.after.value, page.after.id]
+
+    direction = "DESC" if page.descending else "ASC"
+    query = (
+        f"SELECT {columns} FROM documents WHERE {' AND '.join(where)}"
+        f" ORDER BY {sort_column} {direction}, id {direction} LIMIT %s"
+    )
+    params.append(page.limit + 1)
+    return query, params
@@ -0,0 +1,431 @@
+"""
+Stockage des fichiers chiffrés derrière une interface commune.
+
+Moteurs disponibles (variable STORAGE_BACKEND):
+- "minio" (défaut): bucket MinIO/S3 (module/minio_client.py)
+- "local": disque local, sans copie en Python (module/local_storage.py),
+  pour les installations mono-machine où MinIO ne servait que de stockage.
+
+Les routes n'utilisent que les fonctions de ce module (upload_file,
+download_file, delete_file, ...): le moteur est choisi une fois au démarrage.
+"""
+
+import secrets
+import time
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Union
+
+from .config import DOWNLOAD_CHUNK_SIZE, STORAGE_BACKEND, UPLOAD_SESSION_MAX_PART_SIZE
+from .metrics import count_storage_bytes, timed_storage
+
+
+class ObjectNotFound(FileNotFoundError):
+    """L'objet demandé n'existe pas dans le stockage."""
+
+
+class StorageUnsupported(RuntimeError):
+    """Moteur inutilisable en l'état (bibliothèque incompatible): le démarrage doit échouer."""
+
+
+class StoredObject(NamedTuple):
+    object_name: str
+    size: int
+    last_modified: Optional[datetime]
+    metadata: Dict[str, Any]
+    etag: Optional[str] = None
+
+
+class ChunkStream:
+    """
+    Itérateur de blocs qui libère sa ressource (connexion, fichier) à la fin
+    de la lecture ou à la fermeture, même s'il n'a jamais été parcouru: le
+    serveur WSGI appelle close() quand le client se déconnecte.
+    """
+
+    def __init__(self, chunks, on_close):
+        self._chunks = iter(chunks)
+        self._on_close = on_close
+        self.sent = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self.close()
+            raise
+        self.sent += len(chunk)
+        return chunk
+
+    def close(self) -> None:
+        on_close, self._on_close = self._on_close, None
+        if on_close is not None:
+            on_close()
+
+
+class StoredPart(NamedTuple):
+    part_number: int
+    size: int
+    etag: str
+
+
+class StorageBackend:
+    """Interface d'un moteur de stockage d'objets (clé -> octets)."""
+
+    name = "abstract"
+    # Taille maximale d'une part d'upload par parts, si le moteur en impose
+    # une plus basse que UPLOAD_SESSION_MAX_PART_SIZE (part gardée en mémoire)
+    max_part_size: Optional[int] = None
+
+    def init(self) -> None:
+        """Prépare le stockage (bucket, dossier racine) s'il n'existe pas."""
+
+    def put(self, object_name: str, data: Union[bytes, BinaryIO], length: int, metadata: Optional[dict] = None) -> None:
+        """Écrit un objet. `data` est un bytes ou un fichier binaire de `length` octets."""
+        raise NotImplementedError
+
+    def get(self, object_name: str) -> bytes:
+        raise NotImplementedError
+
+    def stream(self, object_name: str, offset: int = 0, length: Optional[int] = None,
+               chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> ChunkStream:
+        """
+        Lit l'objet (ou la plage offset/length) par blocs de chunk_size.
+
+        L'objet est ouvert avant le retour (objet absent -> exception
+        immédiate); fermer le flux libère la connexion ou le fichier.
+        """
+        raise NotImplementedError
+
+    def stat(self, object_name: str) -> StoredObject:
+        """Taille, date, métadonnées et ETag; ObjectNotFound si l'objet n'existe pas."""
+        raise NotImplementedError
+
+    def remove(self, object_name: str) -> None:
+        raise NotImplementedError
+
+    def remove_many(self, object_names: List[str]) -> Dict[str, str]:
+        """Supprime plusieurs objets; retourne {object_name: erreur} pour ceux en échec."""
+        errors = {}
+        for object_name in object_names:
+            try:
+                self.remove(object_name)
+            except Exception as e:
+                errors[object_name] = str(e)
+        return errors
+
+    def list(self, prefix: str = "", recursive: bool = True) -> Iterator[StoredObject]:
+        """Objets dont la clé commence par `prefix`, par clé croissante, au fil de la lecture."""
+        raise NotImplementedError
+
+    def prefixes(self) -> List[str]:
+        """Préfixes de premier niveau ("12/", "12_shared/", ...), triés."""
+        raise NotImplementedError
+
+    def presigned_url(self, object_name: str, expires: int, download_name: str) -> Optional[str]:
+        """URL de téléchargement direct valable `expires` secondes, si le moteur en produit (sinon None)."""
+        return None
+
+    def presigned_upload_url(self, object_name: str, expires: int) -> Optional[str]:
+        """URL de dépôt direct (PUT) valable `expires` secondes, si le moteur en produit (sinon None)."""
+        return None
+
+    # Upload par parts (sessions reprenables): même modèle que le multipart S3.
+    # Chaque part sauf la dernière fait au moins 5 MiB.
+
+    def create_multipart(self, object_name: str) -> str:
+        """Ouvre un upload par parts; retourne son identifiant."""
+        raise NotImplementedError
+
+    def upload_part(self, object_name: str, upload_id: str, part_number: int,
+                    data: Union[bytes, BinaryIO], length: int) -> str:
+        """Écrit (ou remplace) la part `part_number` (1..10000); retourne son ETag."""
+        raise NotImplementedError
+
+    def list_parts(self, object_name: str, upload_id: str) -> List[StoredPart]:
+        """Parts déjà reçues, par numéro croissant."""
+        raise NotImplementedError
+
+    def complete_multipart(self, object_name: str, upload_id: str, parts: List[StoredPart]) -> None:
+        """Assemble les parts (dans l'ordre donné) en un seul objet."""
+        raise NotImplementedError
+
+    def abort_multipart(self, object_name: str, upload_id: str) -> None:
+        """Abandonne l'upload et libère les parts reçues."""
+        raise NotImplementedError
+
+    def local_path(self, object_name: str) -> Optional[str]:
+        """Chemin disque de l'objet si le moteur en a un (envoi par sendfile), sinon None."""
+        return None
+
+
+_backend: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    global _backend
+    if _backend is None:
+        if STORAGE_BACKEND == "local":
+            from .local_storage import LocalStorage
+
+            _backend = LocalStorage()
+        elif STORAGE_BACKEND == "minio":
+            from .minio_client import MinioStorage
+
+            _backend = MinioStorage()
+        else:
+            raise ValueError(f"STORAGE_BACKEND inconnu: {STORAGE_BACKEND!r} (minio | local)")
+    return _backend
+
+
+def init_storage() -> None:
+    storage = get_storage()
+    print(f"[Storage] Moteur: {storage.name}")
+    storage.init()
+
+
+def _check_owner(user_id, object_name: str) -> None:
+    # Vérifier que l'utilisateur a accès au fichier
+    if not object_name.startswith(f"{user_id}/"):
+        raise PermissionError("Accès non autorisé à ce fichier")
+
+
+def new_object_name(user_id, file_name: str) -> str:
+    """
+    Nom unique pour l'objet: user_id/timestamp_aléa_filename
+
+    L'aléa évite la collision de deux fichiers de même nom reçus dans la même
+    milliseconde (imports en parallèle, double clic).
+    """
+    timestamp = int(time.time() * 1000)
+    return f"{user_id}/{timestamp}_{secrets.token_hex(4)}_{file_name}"
+
+
+@timed_storage("upload")
+def upload_file(user_id: int, file_data: Union[bytes, BinaryIO], file_name: str, metadata: dict,
+                length: Optional[int] = None) -> str:
+    """
+    Upload un fichier chiffré dans le stockage
+
+    Args:
+        user_id: ID de l'utilisateur
+        file_data: Données du fichier chiffré (bytes, ou flux lu par parts)
+        file_name: Nom du fichier
+        metadata: Métadonnées (dek_encrypted, iv, sha256, etc.)
+        length: Taille du flux (obligatoire si file_data n'est pas un bytes)
+
+    Returns:
+        object_name: Nom de l'objet dans le stockage
+    """
+    object_name = new_object_name(user_id, file_name)
+    if length is None:
+        length = len(file_data)
+
+    try:
+        get_storage().put(object_name, file_data, length, metadata)
+    except Exception as e:
+        print(f"[Storage] Erreur lors de l'upload: {e}")
+        raise
+    count_storage_bytes("upload", length)
+    return object_name
+
+
+@timed_storage("list")
+def list_user_files(user_id: int) -> list:
+    """
+    Liste tous les fichiers d'un utilisateur
+
+    Args:
+        user_id: ID de l'utilisateur
+
+    Returns:
+        Liste des objets
+    """
+    try:
+        files = []
+        for obj in get_storage().list(prefix=f"{user_id}/"):
+            files.append({
+                "object_name": obj.object_name,
+                "file_name": obj.object_name.split("/", 1)[1] if "/" in obj.object_name else obj.object_name,
+                "size": obj.size,
+                "last_modified": obj.last_modified.isoformat() if obj.last_modified else None,
+                "metadata": obj.metadata,
+            })
+        return files
+    except Exception as e:
+        print(f"[Storage] Erreur lors de la liste: {e}")
+        raise
+
+
+@timed_storage("download")
+def download_file(user_id: int, object_name: str) -> tuple:
+    """
+    Télécharge un fichier depuis le stockage
+
+    Args:
+        user_id: ID de l'utilisateur
+        object_name: Nom de l'objet
+
+    Returns:
+        (file_data, metadata)
+    """
+    _check_owner(user_id, object_name)
+    try:
+        storage = get_storage()
+        file_data = storage.get(object_name)
+        metadata = storage.stat(object_name).metadata
+    except Exception as e:
+        print(f"[Storage] Erreur lors du téléchargement: {e}")
+        raise
+    count_storage_bytes("download", len(file_data))
+    return file_data, metadata
+
+
+@timed_storage("stat")
+def stat_file(user_id: int, object_name: str) -> StoredObject:
+    """Taille, date et ETag d'un fichier de l'utilisateur."""
+    _check_owner(user_id, object_name)
+    return get_storage().stat(object_name)
+
+
+@timed_storage("download")
+def stream_file(user_id: int, object_name: str, offset: int = 0, length: Optional[int] = None) -> ChunkStream:
+    """
+    Ouvre un fichier en lecture par blocs (DOWNLOAD_CHUNK_SIZE)
+
+    Args:
+        user_id: ID de l'utilisateur
+        object_name: Nom de l'objet
+        offset: Premier octet à lire
+        length: Nombre d'octets à lire (None = jusqu'à la fin)
+
+    Returns:
+        Itérateur de blocs; à fermer (close) si le client abandonne
+    """
+    _check_owner(user_id, object_name)
+    try:
+        chunks = get_storage().stream(object_name, offset, length)
+    except Exception as e:
+        print(f"[Storage] Erreur lors du téléchargement: {e}")
+        raise
+
+    def _done():
+        chunks.close()
+        count_storage_bytes("download", chunks.sent)
+
+    return ChunkStream(chunks, _done)
+
+
+@timed_storage("presign")
+def presigned_download_url(user_id: int, object_name: str, download_name: str, expires: int) -> Optional[str]:
+    """
+    URL signée permettant au client de télécharger directement depuis MinIO
+
+    Args:
+        user_id: ID de l'utilisateur
+        object_name: Nom de l'objet
+        download_name: Nom du fichier proposé par le navigateur
+        expires: Durée de validité de l'URL en secondes
+
+    Returns:
+        URL, ou None si le moteur ne sait pas en produire (stockage local,
+        MINIO_PUBLIC_ENDPOINT non défini)
+    """
+    _check_owner(user_id, object_name)
+    return get_storage().presigned_url(object_name, expires, download_name)
+
+
+@timed_storage("presign")
+def presigned_upload_url(user_id: int, object_name: str, expires: int) -> Optional[str]:
+    """
+    URL signée permettant au client de déposer le fichier directement dans MinIO
+
+    Returns:
+        URL (méthode PUT), ou None si le moteur ne sait pas en produire
+    """
+    _check_owner(user_id, object_name)
+    return get_storage().presigned_upload_url(object_name, expires)
+
+
+def max_part_size() -> int:
+    """Taille maximale d'une part d'upload par parts pour le moteur configuré."""
+    limit = get_storage().max_part_size
+    return min(UPLOAD_SESSION_MAX_PART_SIZE, limit) if limit else UPLOAD_SESSION_MAX_PART_SIZE
+
+
+def start_multipart(user_id: int, object_name: str) -> str:
+    """Ouvre un upload par parts pour un fichier de l'utilisateur; retourne son identifiant."""
+    _check_owner(user_id, object_name)
+    return get_storage().create_multipart(object_name)
+
+
+@timed_storage("upload_part")
+def upload_part(user_id: int, object_name: str, upload_id: str, part_number: int,
+                data: Union[bytes, BinaryIO], length: int) -> str:
+    """Envoie une part d'un upload par parts; retourne son ETag."""
+    _check_owner(user_id, object_name)
+    etag = get_storage().upload_part(object_name, upload_id, part_number, data, length)
+    count_storage_bytes("upload", length)
+    return etag
+
+
+def list_parts(user_id: int, object_name: str, upload_id: str) -> List[StoredPart]:
+    """Parts déjà reçues d'un upload par parts."""
+    _check_owner(user_id, object_name)
+    return get_storage().list_parts(object_name, upload_id)
+
+
+@timed_storage("complete_multipart")
+def complete_multipart(user_id: int, object_name: str, upload_id: str, parts: List[StoredPart]) -> None:
+    _check_owner(user_id, object_name)
+    get_storage().complete_multipart(object_name, upload_id, parts)
+
+
+def abort_multipart(user_id: int, object_name: str, upload_id: str) -> None:
+    _check_owner(user_id, object_name)
+    get_storage().abort_multipart(object_name, upload_id)
+
+
+def local_file_path(user_id: int, object_name: str) -> Optional[str]:
+    """
+    Chemin disque du fichier si le moteur est local (None sinon).
+
+    Utilisé par module/download.py: le fichier ouvert est confié au
+    wsgi.file_wrapper, envoyé par sendfile sans passer par Python.
+    """
+    _check_owner(user_id, object_name)
+    return get_storage().local_path(object_name)
+
+
+@timed_storage("delete_many")
+def delete_files(object_names: List[str]) -> Dict[str, str]:
+    """
+    Supprime un lot d'objets (file de suppression, module/deletion_queue.py)
+
+    Returns:
+        {object_name: erreur} pour les objets non supprimés (vide si tout a réussi)
+    """
+    return get_storage().remove_many(object_names)
+
+
+@timed_storage("delete")
+def delete_file(user_id: int, object_name: str) -> bool:
+    """
+    Supprime un fichier du stockage
+
+    Args:
+        user_id: ID de l'utilisateur
+        object_name: Nom de l'objet
+
+    Returns:
+        True si suppression réussie
+    """
+    _check_owner(user_id, object_name)
+    try:
+        get_storage().remove(object_name)
+        return True
+    except Exception as e:
+        print(f"[Storage] Erreur lors de la suppression: {e}")
+        raise
@@ -0,0 +1,85 @@
+"""
+Lecture du fichier envoyé aux routes d'upload (/documents/upload, /share/upload).
+
+Trois formats acceptés:
+- application/json (historique): fichier chiffré en base64 dans "file_data"
+- application/octet-stream: le corps est le fichier chiffré brut, les
+  métadonnées sont dans les headers (X-File-Name encodé URL, X-Dek-Encrypted,
+  X-Iv, X-Sha256, X-Folder-Id, ...)
+- multipart/form-data: fichier dans le champ "file", métadonnées en champs
+
+Dans les deux derniers cas le fichier n'est jamais chargé entier en mémoire:
+il est transmis au stockage comme un flux de taille connue.
+"""
+
+import base64
+import os
+from typing import Any, BinaryIO, Dict, Iterable, NamedTuple, Optional, Union
+from urllib.parse import unquote
+
+from flask import request
+
+
+class UploadError(Exception):
+    """Requête d'upload invalide (message renvoyé au client, code HTTP)."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class Upload(NamedTuple):
+    fields: Dict[str, Any]
+    data: Optional[Union[bytes, BinaryIO]]
+    length: int
+
+
+def header_name(field: str) -> str:
+    """Nom du header portant un champ en mode brut: "dek_encrypted" -> "X-Dek-Encrypted"."""
+    return "X-" + "-".join(part.capitalize() for part in field.split("_"))
+
+
+def read_upload(fields: Iterable[str]) -> Upload:
+    """
+    Lit le fichier et les champs demandés selon le Content-Type de la requête.
+
+    Args:
+        fields: noms des champs de métadonnées attendus (file_name, iv, ...)
+
+    Returns:
+        Upload(fields, data, length): data vaut None si aucun fichier n'est fourni
+    """
+    mimetype = request.mimetype
+
+    if mimetype == "application/octet-stream":
+        values = {field: request.headers.get(header_name(field)) for field in fields}
+        if values.get("file_name"):
+            values["file_name"] = unquote(values["file_name"])
+        length = request.content_length
+        if length is None:
+            raise UploadError("Content-Length requis", 411)
+        return Upload(values, request.stream, length)
+
+    if mimetype == "multipart/form-data":
+        values = {field: request.form.get(field) for field in fields}
+        file = request.files.get("file")
+        if file is None:
+            return Upload(values, None, 0)
+        if not values.get("file_name"):
+            values["file_name"] = file.filename
+        # Werkzeug garde les gros fichiers dans un fichier temporaire sur disque
+        stream = file.stream
+        stream.seek(0, os.SEEK_END)
+        length = stream.tell()
+        stream.seek(0)
+        return Upload(values, stream, length)
+
+    data = request.get_json(silent=True)
+    if not data:
+        raise UploadError("Données manquantes")
+    values = {field: data.get(field) for field in fields}
+    file_data_b64 = data.get("file_data")
+    if not file_data_b64:
+        return Upload(values, None, 0)
+    file_data = base64.b64decode(file_data_b64)
+    return Upload(values, file_data, len(file_data))
@@ -0,0 +1,112 @@
+"""
+Emplacements d'upload réservés (table upload_slots).
+
+Deux usages:
+- upload direct en une fois: /documents/upload/slot puis /upload/commit
+- session d'upload par parts (multipart_id renseigné): /documents/upload/sessions
+
+Un emplacement jamais validé est supprimé à expiration avec ce qui a été
+déposé (objet, ou parts du multipart).
+"""
+
+from __future__ import annotations
+
+import secrets
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from module.config import UPLOAD_SLOT_REAP_BATCH, UPLOAD_SLOT_REAP_INTERVAL, UPLOAD_SLOT_TTL
+from module.db import execute_write, fetch_all, fetch_one
+from module.periodic import PeriodicTask
+from module.storage import abort_multipart, delete_file
+
+
+def create_slot(
+    user_id: int,
+    folder_id: Optional[int],
+    object_name: str,
+    file_name: str,
+    extension: Optional[str],
+    size: int,
+    dek_encrypted: str,
+    iv: str,
+    sha256: str,
+    multipart_id: Optional[str] = None,
+    part_size: Optional[int] = None,
+    ttl: int = UPLOAD_SLOT_TTL,
+) -> Dict[str, Any]:
+    """
+    Réserve un emplacement d'upload (table upload_slots).
+
+    Utilisé par:
+    - POST /api/documents/upload/slot
+    - POST /api/documents/upload/sessions (avec multipart_id et part_size)
+
+    Sortie:
+    - {upload_id, expires_at}: upload_id identifie l'emplacement dans les
+      appels suivants (commit, parts, ...)
+    """
+    upload_id = secrets.token_urlsafe(24)
+    expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+    execute_write(
+        "INSERT INTO upload_slots (token, id_users, id_folder, object_name, nom_original, extension, taille_octets, dek_encrypted, iv, sha256, multipart_id, part_size, expires_at) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+        (upload_id, user_id, folder_id, object_name, file_name, extension, size, dek_encrypted, iv, sha256, multipart_id, part_size, expires_at),
+    )
+    return {"upload_id": upload_id, "expires_at": expires_at}
+
+
+def get_slot(user_id: int, upload_id: str) -> Optional[Dict[str, Any]]:
+    """Emplacement `upload_id` de l'utilisateur, ou None."""
+    return fetch_one(
+        "SELECT id, id_users, id_folder, object_name, nom_original, extension, taille_octets, dek_encrypted, iv, sha256, multipart_id, part_size, expires_at FROM upload_slots WHERE token = %s AND id_users = %s",
+        (upload_id, user_id),
+    )
+
+
+def claim_slot(slot_id: int) -> bool:
+    """
+    Supprime l'emplacement; True si c'est cet appel qui l'a supprimé.
+
+    /upload/commit et le nettoyage passent tous deux par ici: le premier DELETE
+    gagne, l'autre voit rowcount = 0 et abandonne (pas de document validé dont
+    le fichier serait supprimé par le nettoyage).
+    """
+    rowcount, _ = execute_write("DELETE FROM upload_slots WHERE id = %s", (slot_id,))
+    return rowcount == 1
+
+
+def reap_expired_slots(limit: int = UPLOAD_SLOT_REAP_BATCH) -> int:
+    """
+    Supprime les emplacements expirés jamais validés, et le fichier ou les
+    parts éventuellement déposés. Retourne le nombre d'emplacements supprimés.
+    """
+    rows = fetch_all(
+        "SELECT id, id_users, object_name, multipart_id FROM upload_slots WHERE expires_at < %s ORDER BY expires_at LIMIT %s",
+        (datetime.utcnow(), limit),
+    )
+    reaped = 0
+    for row in rows:
+        if not claim_slot(row["id"]):
+            continue
+        try:
+            if row["multipart_id"]:
+                try:
+                    abort_multipart(row["id_users"], row["object_name"], row["multipart_id"])
+                except Exception as e:
+                    print(f"[WARNING] Upload session abort: {row['object_name']}: {e}")
+            # Aussi pour une session: l'assemblage a pu réussir sans que le document soit enregistré
+            delete_file(row["id_users"], row["object_name"])
+        except Exception as e:
+            print(f"[ERROR] Upload slot cleanup: {row['object_name']}: {e}")
+        reaped += 1
+    if reaped:
+        print(f"[INFO] {reaped} upload slot(s) expiré(s) supprimé(s)")
+    return reaped
+
+
+reaper = PeriodicTask("upload-slot-reaper", UPLOAD_SLOT_REAP_INTERVAL, reap_expired_slots)
+
+
+def init_app(app) -> None:
+    """Démarre le nettoyage des emplacements expirés dans chaque worker."""
+    app.before_request(reaper.start)
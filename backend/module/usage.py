@@ -0,0 +1,265 @@
+"""
+Espace de stockage utilisé (octets et objets) et quotas, sans agrégat à
+chaque upload.
+
+Compteurs, mis à jour dans la transaction de l'écriture qu'ils reflètent:
+- users.used_bytes / used_objects: documents du user
+- users.shared_bytes / shared_objects: copies chiffrées de ses partages
+- folders.used_bytes / used_objects: documents directement dans le dossier
+  (la racine: total du user moins ses dossiers; un sous-arbre: somme de ses
+  dossiers, lue dans l'arborescence en cache)
+
+La ligne users est toujours modifiée en premier: elle sert de verrou entre
+les écritures concurrentes d'un même user et la vérification.
+
+Quotas: users.quota_bytes / quota_objects, NULL = STORAGE_QUOTA_BYTES /
+STORAGE_QUOTA_OBJECTS, 0 = illimité; documents et partages comptent
+ensemble. check_quota() refuse un upload avant l'envoi au stockage;
+add_document_usage() / add_share_usage() revérifient après incrément, ligne
+verrouillée (deux uploads concurrents ne dépassent pas le quota à eux deux).
+
+verify_usage() recalcule les compteurs depuis documents et shared_files et
+corrige les écarts (verrou de chaque ligne users le temps de son user). Une
+seule passe à la fois, hors des workers: lancée la nuit par cron (voir
+README), ou à la demande:
+
+    python -m module.usage
+"""
+
+from __future__ import annotations
+
+import sys
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from module.config import STORAGE_QUOTA_BYTES, STORAGE_QUOTA_OBJECTS
+from module.db import execute_write, fetch_all, fetch_one, pool, transaction
+
+# Verrou MySQL (GET_LOCK) d'une passe de vérification
+VERIFY_LOCK = "yoda-usage-verifier"
+
+# {id_folder (None = racine): (octets, objets)}
+FolderDeltas = Dict[Optional[int], Tuple[int, int]]
+
+
+class QuotaExceeded(Exception):
+    """Upload refusé: quota du user atteint (message renvoyé au client, 413)."""
+
+    status = 413
+
+
+def _limits(row: Dict[str, Any]) -> Tuple[int, int]:
+    quota_bytes = row["quota_bytes"] if row["quota_bytes"] is not None else STORAGE_QUOTA_BYTES
+    quota_objects = row["quota_objects"] if row["quota_objects"] is not None else STORAGE_QUOTA_OBJECTS
+    return int(quota_bytes), int(quota_objects)
+
+
+def _enforce(row: Optional[Dict[str, Any]], extra_bytes: int = 0, extra_objects: int = 0) -> None:
+    if row is None:
+        return
+    quota_bytes, quota_objects = _limits(row)
+    used_bytes = int(row["used_bytes"]) + int(row["shared_bytes"]) + extra_bytes
+    used_objects = int(row["used_objects"]) + int(row["shared_objects"]) + extra_objects
+    if quota_bytes > 0 and used_bytes > quota_bytes:
+        raise QuotaExceeded(f"Quota de stockage atteint ({quota_bytes} octets)")
+    if quota_objects > 0 and used_objects > quota_objects:
+        raise QuotaExceeded(f"Quota de stockage atteint ({quota_objects} fichiers)")
+
+
+def _user_row(user_id: int) -> Optional[Dict[str, Any]]:
+    return fetch_one(
+        "SELECT used_bytes, used_objects, shared_bytes, shared_objects, quota_bytes, quota_objects FROM users WHERE id = %s",
+        (int(user_id),),
+    )
+
+
+def check_quota(user_id: int, size: int, objects: int = 1) -> None:
+    """QuotaExceeded si stocker `objects` fichiers de `size` octets au total dépasserait le quota."""
+    _enforce(_user_row(user_id), int(size), int(objects))
+
+
+def add_document_usage(user_id: int, deltas: FolderDeltas) -> None:
+    """
+    Ajoute (ou retire, valeurs négatives) des documents aux compteurs du user
+    et de leurs dossiers. À appeler dans la transaction de l'écriture;
+    QuotaExceeded si l'ajout dépasse le quota (la transaction doit alors être
+    annulée).
+    """
+    total_bytes = sum(size for size, _ in deltas.values())
+    total_objects = sum(count for _, count in deltas.values())
+    execute_write(
+        "UPDATE users SET used_bytes = used_bytes + %s, used_objects = used_objects + %s WHERE id = %s",
+        (total_bytes, total_objects, int(user_id)),
+    )
+    for folder_id, (size, count) in deltas.items():
+        if folder_id is not None and (size or count):
+            execute_write(
+                "UPDATE folders SET used_bytes = used_bytes + %s, used_objects = used_objects + %s WHERE id = %s AND id_users = %s",
+                (size, count, folder_id, int(user_id)),
+            )
+    if total_bytes > 0 or total_objects > 0:
+        _enforce(_user_row(user_id))
+
+
+def add_share_usage(user_id: int, size: int, objects: int = 1) -> None:
+    """Comme add_document_usage, pour les copies chiffrées des partages."""
+    execute_write(
+        "UPDATE users SET shared_bytes = shared_bytes + %s, shared_objects = shared_objects + %s WHERE id = %s",
+        (int(size), int(objects), int(user_id)),
+    )
+    if size > 0 or objects > 0:
+        _enforce(_user_row(user_id))
+
+
+def release_documents(where: str, params: tuple) -> None:
+    """
+    Retire des compteurs les documents sélectionnés et leurs partages
+    (supprimés avec eux, ON DELETE CASCADE). À appeler juste avant le DELETE,
+    comme tombstone_documents.
+
+    Args:
+        where: condition SQL sur la table documents, aliasée `d`
+        params: paramètres de la condition
+    """
+    rows = fetch_all(
+        f"SELECT d.id_users, d.id_folder, COUNT(*) AS objects, COALESCE(SUM(d.taille_octets), 0) AS bytes FROM documents d WHERE {where} GROUP BY d.id_users, d.id_folder",
+        tuple(params),
+    )
+    by_user: Dict[int, FolderDeltas] = {}
+    for row in rows:
+        by_user.setdefault(row["id_users"], {})[row["id_folder"]] = (-int(row["bytes"]), -int(row["objects"]))
+    for user_id, deltas in by_user.items():
+        add_document_usage(user_id, deltas)
+
+    shares = fetch_all(
+        f"SELECT s.id_owner, COUNT(*) AS objects, COALESCE(SUM(s.taille_octets), 0) AS bytes FROM shared_files s JOIN documents d ON s.id_document = d.id WHERE {where} GROUP BY s.id_owner",
+        tuple(params),
+    )
+    for row in shares:
+        add_share_usage(row["id_owner"], -int(row["bytes"]), -int(row["objects"]))
+
+
+def release_shares(where: str, params: tuple) -> None:
+    """Retire des compteurs les partages sélectionnés (condition sur shared_files aliasée `s`), avant leur DELETE."""
+    rows = fetch_all(
+        f"SELECT s.id_owner, COUNT(*) AS objects, COALESCE(SUM(s.taille_octets), 0) AS bytes FROM shared_files s WHERE {where} GROUP BY s.id_owner",
+        tuple(params),
+    )
+    for row in rows:
+        add_share_usage(row["id_owner"], -int(row["bytes"]), -int(row["objects"]))
+
+
+def user_usage(user_id: int) -> Dict[str, Any]:
+    """Compteurs et quotas du user (une ligne lue)."""
+    row = _user_row(user_id)
+    if row is None:
+        return {}
+    quota_bytes, quota_objects = _limits(row)
+    used_bytes = int(row["used_bytes"]) + int(row["shared_bytes"])
+    used_objects = int(row["used_objects"]) + int(row["shared_objects"])
+    return {
+        "documents": {"bytes": int(row["used_bytes"]), "objects": int(row["used_objects"])},
+        "shares": {"bytes": int(row["shared_bytes"]), "objects": int(row["shared_objects"])},
+        "total": {"bytes": used_bytes, "objects": used_objects},
+        "quota": {
+            "bytes": quota_bytes or None,
+            "objects": quota_objects or None,
+            "remaining_bytes": max(quota_bytes - used_bytes, 0) if quota_bytes else None,
+            "remaining_objects": max(quota_objects - used_objects, 0) if quota_objects else None,
+        },
+    }
+
+
+def folder_usage(user_id: int, folder_ids: Iterable[int]) -> Dict[int, Tuple[int, int]]:
+    """{id: (octets, objets)} des documents directement dans chacun des dossiers."""
+    folder_ids = list(folder_ids)
+    if not folder_ids:
+        return {}
+    rows = fetch_all(
+        f"SELECT id, used_bytes, used_objects FROM folders WHERE id_users = %s AND id IN ({', '.join(['%s'] * len(folder_ids))})",
+        (int(user_id), *folder_ids),
+    )
+    return {row["id"]: (int(row["used_bytes"]), int(row["used_objects"])) for row in rows}
+
+
+def _verify_user(user_id: int) -> int:
+    """Recalcule les compteurs d'un user; retourne le nombre de compteurs corrigés."""
+    fixed = 0
+    with transaction():
+        # Verrou de la ligne users: les écritures du user attendent la fin
+        execute_write("UPDATE users SET used_bytes = used_bytes WHERE id = %s", (user_id,))
+        current = _user_row(user_id)
+        if current is None:
+            return 0
+        docs = fetch_one(
+            "SELECT COUNT(*) AS objects, COALESCE(SUM(taille_octets), 0) AS bytes FROM documents WHERE id_users = %s",
+            (user_id,),
+        )
+        shares = fetch_one(
+            "SELECT COUNT(*) AS objects, COALESCE(SUM(taille_octets), 0) AS bytes FROM shared_files WHERE id_owner = %s",
+            (user_id,),
+        )
+        expected = {
+            "used_bytes": int(docs["bytes"]), "used_objects": int(docs["objects"]),
+            "shared_bytes": int(shares["bytes"]), "shared_objects": int(shares["objects"]),
+        }
+        drift = {column: value for column, value in expected.items() if int(current[column]) != value}
+        if drift:
+            print(f"[WARNING] Usage user {user_id}: {', '.join(f'{c} {current[c]} -> {v}' for c, v in drift.items())}")
+            execute_write(
+                f"UPDATE users SET {', '.join(f'{column} = %s' for column in drift)} WHERE id = %s",
+                (*drift.values(), user_id),
+            )
+            fixed += len(drift)
+
+        actual = {
+            row["id_folder"]: (int(row["bytes"]), int(row["objects"]))
+            for row in fetch_all(
+                "SELECT id_folder, COUNT(*) AS objects, COALESCE(SUM(taille_octets), 0) AS bytes FROM documents WHERE id_users = %s AND id_folder IS NOT NULL GROUP BY id_folder",
+                (user_id,),
+            )
+        }
+        for row in fetch_all("SELECT id, used_bytes, used_objects FROM folders WHERE id_users = %s", (user_id,)):
+            size, count = actual.get(row["id"], (0, 0))
+            if (int(row["used_bytes"]), int(row["used_objects"])) != (size, count):
+                print(f"[WARNING] Usage folder {row['id']}: {row['used_bytes']}/{row['used_objects']} -> {size}/{count}")
+                execute_write(
+                    "UPDATE folders SET used_bytes = %s, used_objects = %s WHERE id = %s",
+                    (size, count, row["id"]),
+                )
+                fixed += 1
+    return fixed
+
+
+def verify_usage(user_ids: Optional[Iterable[int]] = None) -> int:
+    """Vérifie les compteurs (de tous les users par défaut); retourne le nombre de corrections."""
+    if user_ids is None:
+        user_ids = [row["id"] for row in fetch_all("SELECT id FROM users ORDER BY id")]
+    fixed = 0
+    for user_id in user_ids:
+        try:
+            fixed += _verify_user(int(user_id))
+        except Exception as e:
+            print(f"[ERROR] Usage verify user {user_id}: {e}")
+    if fixed:
+        print(f"[INFO] {fixed} compteur(s) d'espace corrigé(s)")
+    return fixed
+
+
+def main() -> int:
+    # Verrou tenu par une connexion dédiée pendant toute la passe: deux
+    # lancements qui se chevauchent (cron sur deux machines) n'en font qu'une
+    with pool.connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT GET_LOCK(%s, 0) AS acquired", (VERIFY_LOCK,))
+            if not (cursor.fetchone() or {}).get("acquired"):
+                print("[INFO] Vérification des compteurs déjà en cours, rien à faire")
+                return 0
+            try:
+                print(f"{verify_usage()} compteur(s) corrigé(s)")
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (VERIFY_LOCK,))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
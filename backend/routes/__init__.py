@@ -8,6 +8,8 @@ from .user import name_user, statue_session, change_password, public_key_bp
 from .documents import documents_bp
 from .share.share import share
 from .folder import folder_bp
+from .metrics import metrics_bp
+from .upload_sessions import upload_sessions_bp
 
 def register_blueprints(app):
     api_prefix = "/api"
@@ -27,4 +29,6 @@ def register_blueprints(app):
     app.register_blueprint(documents_bp, url_prefix=api_prefix)
     app.register_blueprint(docs_bp)
     app.register_blueprint(share, url_prefix=api_prefix)
-    app.register_blueprint(folder_bp, url_prefix=api_prefix)
\ No newline at end of file
+    app.register_blueprint(folder_bp, url_prefix=api_prefix)
+    app.register_blueprint(metrics_bp, url_prefix=api_prefix)
+    app.register_blueprint(upload_sessions_bp, url_prefix=api_prefix)
@@ -9,6 +9,7 @@ import qrcode.image.pure
 from bcrypt import checkpw
 from module.api_retour import api_response
 from module.crypto import aes256_encrypt, aes256_decrypt
+from module.middleware import temp_token
 
 active_a2f = Blueprint("a2f", __name__)
 check_a2f = Blueprint("a2fc", __name__)
@@ -60,6 +61,7 @@ def a2fd():
 
 
 @check_a2f.route("/check_a2f", methods=["POST"])
+@temp_token
 def a2fc():
     id_user = g.user["id"]
 
@@ -88,6 +90,7 @@ def a2fc():
 
 
 @login_a2f.route("/a2f_login", methods=["POST"])
+@temp_token
 def validate_a2f():
     """Validate OTP without changing activation status."""
     id_user = g.user["id"]
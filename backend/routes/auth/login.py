@@ -4,10 +4,12 @@ from bcrypt import checkpw
 from module.db import fetch_one, execute_write
 from module.jwt_ag import encode_jwt
 from module.api_retour import api_response
+from module.middleware import public
 from routes.auth.a2f import check_a2f_status
 from datetime import datetime, timedelta
 
 login_bp = Blueprint("login", __name__)
+public(login_bp)
 
 
 @login_bp.route("/login", methods=["POST"])
@@ -2,10 +2,12 @@ from bcrypt import hashpw, gensalt
 
 from module.db import execute_write, fetch_one
 from flask import Blueprint, jsonify, request
+from module.middleware import public
 
 from module.crypto import verifier_password
 
 register_bp = Blueprint("register", __name__)
+public(register_bp)
 
 
 
@@ -1,8 +1,10 @@
 from flask import Blueprint, jsonify
 
 from module.db import fetch_all, fetch_one
+from module.middleware import public
 
 database_bp = Blueprint("database", __name__)
+public(database_bp)
 
 
 @database_bp.route("/db-test")
@@ -1,6 +1,9 @@
 from flask import Blueprint, render_template_string
 
+from module.middleware import public
+
 docs_bp = Blueprint("docs", __name__)
+public(docs_bp)
 
 SWAGGER_HTML = """
 <!doctype html>
@@ -1,12 +1,39 @@
 import os
-from io import BytesIO
+from datetime import datetime
 
-from flask import Blueprint, request, send_file, g
+from flask import Blueprint, request, g
 
 from module.api_retour import api_response
-from module.db import execute_write, fetch_all, fetch_one
-from module.folder import build_breadcrumb, get_folder, list_child_folders
-from module.minio_client import upload_file, download_file, delete_file
+from module.batch_import import discard_files, insert_documents, read_manifest, store_files
+from module.bulk import BulkError, apply_operations, parse_operations
+from module.change_version import bump_change_version, not_modified, tag_listing
+from module.db import execute_write, fetch_all, fetch_one, transaction
+from module.deletion_queue import pending_deletions, tombstone_documents
+from module.fields import Field, FieldSet, FieldsError, isoformat, parse_id_list
+from module.folder import build_breadcrumb, create_folder_paths, get_descendant_folder_ids, get_folder, list_child_folders
+from module.idempotency import IdempotencyError, Replay, claim_key, complete_key, conflict_response, hashing, release_key, replay_response
+from module.pagination import PageError, keyset_condition, parse_page_args
+from module.search import SearchError, build_search_query, parse_search_args
+from module.download import download_url_response, send_stored_file, wants_download_url
+from module.config import UPLOAD_URL_EXPIRES
+from module.storage import ObjectNotFound, delete_file, new_object_name, presigned_upload_url, stat_file, upload_file
+from module.upload import UploadError, read_upload
+from module.upload_slots import claim_slot, create_slot, get_slot
+from module.usage import QuotaExceeded, add_document_usage, check_quota, folder_usage, release_documents, user_usage
+
+# Clés de tri de GET /documents/list (index (id_users, id_folder, <colonne>, id))
+DOCUMENT_SORT_COLUMNS = {"name": "nom_original", "size": "taille_octets", "date": "created_at"}
+
+# Champs d'un document dans GET /documents/list (?fields=, voir module/fields.py)
+DOCUMENT_FIELDS = FieldSet({
+    "object_name": Field("object_name"),
+    "file_name": Field("nom_original"),
+    "size": Field("taille_octets"),
+    "last_modified": Field("created_at", isoformat),
+    "dek_encrypted": Field("dek_encrypted"),
+    "iv": Field("iv"),
+    "sha256": Field("sha256"),
+})
 
 documents_bp = Blueprint("documents", __name__)
 
@@ -16,7 +43,7 @@ def upload_document():
     """
     Upload un document chiffré
 
-    Payload attendu:
+    Payload JSON (historique):
     {
         "file_name": "contrat.pdf",
         "file_data": "base64_encrypted_data",
@@ -24,6 +51,11 @@ def upload_document():
         "iv": "base64_iv",
         "sha256": "hash_du_fichier_original"
     }
+
+    Ou, sans base64 ni copie en mémoire (voir module/upload.py):
+    - application/octet-stream: corps = fichier chiffré, champs en headers
+      X-File-Name (encodé URL), X-Dek-Encrypted, X-Iv, X-Sha256, X-Folder-Id
+    - multipart/form-data: champ fichier "file" et mêmes champs en formulaire
     """
     user_id = None
     try:
@@ -35,19 +67,19 @@ def upload_document():
         if not user_id:
             return api_response({"status": "error", "message": "ID utilisateur manquant"}, 401, None, "Upload failed: missing user ID")
 
-        # Récupérer les données du formulaire
-        data = request.get_json()
-        if not data:
-            return api_response({"status": "error", "message": "Données manquantes"}, 400, user_id, "Upload failed: missing data")
+        # Récupérer les données (JSON, corps brut ou multipart)
+        try:
+            upload = read_upload(("file_name", "dek_encrypted", "iv", "sha256", "folder_id"))
+        except UploadError as e:
+            return api_response({"status": "error", "message": str(e)}, e.status, user_id, f"Upload failed: {e}")
 
-        file_name = data.get("file_name")
-        file_data_b64 = data.get("file_data")
-        dek_encrypted = data.get("dek_encrypted")
-        iv = data.get("iv")
-        sha256 = data.get("sha256")
-        folder_id_raw = data.get("folder_id")
+        file_name = upload.fields["file_name"]
+        dek_encrypted = upload.fields["dek_encrypted"]
+        iv = upload.fields["iv"]
+        sha256 = upload.fields["sha256"]
+        folder_id_raw = upload.fields["folder_id"]
 
-        if not all([file_name, file_data_b64, dek_encrypted, iv, sha256]):
+        if upload.data is None or not all([file_name, dek_encrypted, iv, sha256]):
             return api_response({"status": "error", "message": "Paramètres manquants"}, 400, user_id, "Upload failed: missing parameters")
 
         folder_id = None
@@ -71,48 +103,364 @@ def upload_document():
                     "Upload denied: folder not found",
                 )
 
-        # Décoder le fichier chiffré depuis base64
-        import base64
-        file_data = base64.b64decode(file_data_b64)
-        file_size = len(file_data)
+        file_size = upload.length
         _, ext = os.path.splitext(file_name)
         extension = ext[1:].lower() if ext else None
 
-        # Upload vers MinIO (sans métadonnées)
-        object_name = upload_file(user_id, file_data, file_name, {})
+        # Idempotency-Key: nouvel essai d'un upload déjà validé -> même réponse,
+        # rien de stocké (avant le quota: le fichier y est déjà compté)
+        try:
+            claim = claim_key(int(user_id), "documents.upload")
+            if isinstance(claim, Replay):
+                return replay_response(claim, upload.data, user_id)
+        except IdempotencyError as e:
+            return conflict_response(e, user_id)
 
         try:
-            execute_write(
-                "INSERT INTO documents (id_users, id_folder, nom_original, extension, taille_octets, object_name, dek_encrypted, iv, sha256) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
-                (user_id, folder_id, file_name, extension, file_size, object_name, dek_encrypted, iv, sha256),
-            )
+            check_quota(user_id, file_size)
+        except QuotaExceeded as e:
+            release_key(claim)
+            return api_response({"status": "error", "message": str(e)}, e.status, user_id, "Upload refused: quota exceeded")
+
+        try:
+            # Upload vers le stockage (sans métadonnées), en flux si possible
+            data, digest = hashing(upload.data) if claim else (upload.data, None)
+            object_name = upload_file(user_id, data, file_name, {}, length=file_size)
+
+            result = {
+                "status": "success",
+                "data": {
+                    "message": "Document uploadé avec succès",
+                    "object_name": object_name,
+                    "file_name": file_name
+                }
+            }
+            try:
+                with transaction():
+                    execute_write(
+                        "INSERT INTO documents (id_users, id_folder, nom_original, extension, taille_octets, object_name, dek_encrypted, iv, sha256) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                        (user_id, folder_id, file_name, extension, file_size, object_name, dek_encrypted, iv, sha256),
+                    )
+                    add_document_usage(user_id, {folder_id: (file_size, 1)})
+                    bump_change_version(user_id)
+                    if claim:
+                        complete_key(claim, digest(), 200, result)
+            except Exception:
+                try:
+                    delete_file(user_id, object_name)
+                except Exception as cleanup_exc:
+                    print(f"[ERROR] Cleanup failed: {cleanup_exc}")
+                raise
+        except IdempotencyError as e:
+            return conflict_response(e, user_id)
+        except QuotaExceeded as e:
+            release_key(claim)
+            return api_response({"status": "error", "message": str(e)}, e.status, user_id, "Upload refused: quota exceeded")
         except Exception:
+            release_key(claim)
+            raise
+
+        return api_response(result, 200, user_id, f"Document uploaded: {file_name}")
+
+    except Exception as e:
+        print(f"[ERROR] Upload document: {e}")
+        return api_response({"status": "error", "message": f"Erreur lors de l'upload: {str(e)}"}, 500, user_id, f"Upload error: {str(e)}")
+
+
+
+
+@documents_bp.route("/documents/import", methods=["POST"])
+def import_documents():
+    """
+    Importe une arborescence de fichiers chiffrés en une requête
+    (multipart/form-data: champ "manifest" JSON + un champ fichier par
+    fichier, voir module/batch_import.py)
+
+    Les dossiers manquants sont créés (mkdir -p) sous folder_id (ou la
+    racine); tout ou rien: en cas d'erreur, rien n'est créé.
+    """
+    user_id = None
+    try:
+        user_id = g.user.get("id")
+
+        if request.mimetype != "multipart/form-data":
+            return api_response({"status": "error", "message": "multipart/form-data attendu"}, 415, user_id, "Import failed: not multipart")
+        try:
+            manifest = read_manifest(request.form, request.files)
+        except UploadError as e:
+            return api_response({"status": "error", "message": str(e)}, e.status, user_id, f"Import failed: {e}")
+
+        if manifest.folder_id is not None and get_folder(int(user_id), manifest.folder_id) is None:
+            return api_response({"status": "error", "message": "Dossier introuvable ou non autorisé"}, 403, user_id, "Import denied: folder not found")
+
+        try:
+            check_quota(user_id, sum(entry.length for entry in manifest.files), len(manifest.files))
+        except QuotaExceeded as e:
+            return api_response({"status": "error", "message": str(e)}, e.status, user_id, "Import refused: quota exceeded")
+
+        object_names = store_files(int(user_id), manifest.files)
+        try:
+            with transaction():
+                folder_ids = create_folder_paths(
+                    int(user_id), manifest.folder_id, [entry.folder for entry in manifest.files] + manifest.folders,
+                )
+                rows = []
+                usage = {}
+                for entry, object_name in zip(manifest.files, object_names):
+                    _, ext = os.path.splitext(entry.name)
+                    folder = folder_ids[entry.folder]
+                    rows.append((
+                        user_id, folder, entry.name, ext[1:].lower() if ext else None,
+                        entry.length, object_name, entry.dek_encrypted, entry.iv, entry.sha256,
+                    ))
+                    size, count = usage.get(folder, (0, 0))
+                    usage[folder] = (size + entry.length, count + 1)
+                insert_documents(rows)
+                add_document_usage(user_id, usage)
+                bump_change_version(user_id)
+        except QuotaExceeded as e:
+            discard_files(object_names)
+            return api_response({"status": "error", "message": str(e)}, e.status, user_id, "Import refused: quota exceeded")
+        except Exception:
+            discard_files(object_names)
+            raise
+
+        return api_response({
+            "status": "success",
+            "data": {
+                "message": "Import terminé",
+                "documents": [
+                    {"path": "/".join(entry.folder + (entry.name,)), "object_name": object_name, "folder_id": folder_ids[entry.folder]}
+                    for entry, object_name in zip(manifest.files, object_names)
+                ],
+                "count": len(object_names),
+            }
+        }, 200, user_id, f"Documents imported: {len(object_names)}")
+
+    except Exception as e:
+        print(f"[ERROR] Import documents: {e}")
+        return api_response({"status": "error", "message": f"Erreur lors de l'import: {str(e)}"}, 500, user_id, f"Import error: {str(e)}")
+
+
+@documents_bp.route("/documents/bulk", methods=["POST"])
+def bulk_documents():
+    """
+    Déplace, renomme et supprime des documents et des dossiers en un lot
+    (voir module/bulk.py)
+
+    Payload attendu:
+    {
+        "operations": [
+            {"action": "move", "document": "<object_name>", "folder_id": 12},
+            {"action": "rename", "folder": 7, "name": "Archives"},
+            {"action": "delete", "folder": 9},
+            ...
+        ]
+    }
+
+    Tout ou rien: si une opération est refusée, aucune n'est appliquée et
+    la réponse indique son rang (index).
+    """
+    user_id = None
+    try:
+        user_id = g.user.get("id")
+
+        try:
+            operations = parse_operations(request.get_json(silent=True))
+            with transaction():
+                result = apply_operations(int(user_id), operations)
+        except BulkError as e:
+            return api_response(
+                {"status": "error", "message": str(e), "index": e.index}, e.status, user_id, f"Bulk failed: {e}",
+            )
+
+        return api_response({
+            "status": "success",
+            "data": {"message": "Opérations appliquées", **result}
+        }, 200, user_id, f"Bulk operations applied: {len(operations)}")
+
+    except Exception as e:
+        print(f"[ERROR] Bulk documents: {e}")
+        return api_response({"status": "error", "message": f"Erreur lors des opérations: {str(e)}"}, 500, user_id, f"Bulk error: {str(e)}")
+
+
+@documents_bp.route("/documents/upload/slot", methods=["POST"])
+def create_upload_slot():
+    """
+    Upload direct vers MinIO, étape 1: réserve un emplacement
+
+    Payload attendu:
+    {
+        "file_name": "contrat.pdf",
+        "size": 123456,                  (taille du fichier chiffré)
+        "dek_encrypted": "base64_wrapped_dek",
+        "iv": "base64_iv",
+        "sha256": "hash_du_fichier_original",
+        "folder_id": 12                  (optionnel)
+    }
+
+    Réponse: upload_id, object_name et une URL signée. Le client envoie le
+    fichier chiffré par PUT sur cette URL, puis appelle /documents/upload/commit.
+    """
+    user_id = None
+    try:
+        user_id = g.user.get("id")
+
+        data = request.get_json(silent=True)
+        if not data:
+            return api_response({"status": "error", "message": "Données manquantes"}, 400, user_id, "Upload slot failed: missing data")
+
+        file_name = data.get("file_name")
+        size = data.get("size")
+        dek_encrypted = data.get("dek_encrypted")
+        iv = data.get("iv")
+        sha256 = data.get("sha256")
+        folder_id_raw = data.get("folder_id")
+
+        if not all([file_name, dek_encrypted, iv, sha256]) or size is None:
+            return api_response({"status": "error", "message": "Paramètres manquants"}, 400, user_id, "Upload slot failed: missing parameters")
+
+        try:
+            size = int(size)
+            if size < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            return api_response({"status": "error", "message": "Taille invalide"}, 400, user_id, "Upload slot failed: invalid size")
+
+        try:
+            check_quota(user_id, size)
+        except QuotaExceeded as e:
+            return api_response({"status": "error", "message": str(e)}, e.status, user_id, "Upload slot refused: quota exceeded")
+
+        folder_id = None
+        if folder_id_raw not in (None, "", 0, "0", "null", "root"):
             try:
+                folder_id = int(folder_id_raw)
+            except (TypeError, ValueError):
+                return api_response({"status": "error", "message": "folder_id invalide"}, 400, user_id, "Upload slot failed: invalid folder_id")
+
+            # anti "saut" : le dossier doit appartenir au user
+            if get_folder(int(user_id), folder_id) is None:
+                return api_response({"status": "error", "message": "Dossier introuvable ou non autorisé"}, 403, user_id, "Upload slot denied: folder not found")
+
+        object_name = new_object_name(user_id, file_name)
+        url = presigned_upload_url(user_id, object_name, UPLOAD_URL_EXPIRES)
+        if url is None:
+            return api_response(
+                {"status": "error", "message": "Upload direct non disponible, utiliser /documents/upload"},
+                501,
+                user_id,
+                "Upload slot failed: presigned upload unavailable",
+            )
+
+        _, ext = os.path.splitext(file_name)
+        extension = ext[1:].lower() if ext else None
+        slot = create_slot(user_id, folder_id, object_name, file_name, extension, size, dek_encrypted, iv, sha256)
+
+        return api_response({
+            "status": "success",
+            "data": {
+                "upload_id": slot["upload_id"],
+                "object_name": object_name,
+                "url": url,
+                "method": "PUT",
+                "expires_in": UPLOAD_URL_EXPIRES,
+                "commit_before": slot["expires_at"].isoformat(),
+            }
+        }, 200, user_id, f"Upload slot created: {file_name}")
+
+    except Exception as e:
+        print(f"[ERROR] Upload slot: {e}")
+        return api_response({"status": "error", "message": f"Erreur lors de l'upload: {str(e)}"}, 500, user_id, f"Upload slot error: {str(e)}")
+
+
+@documents_bp.route("/documents/upload/commit", methods=["POST"])
+def commit_upload_slot():
+    """
+    Upload direct vers MinIO, étape 2: valide le fichier déposé
+
+    Payload attendu:
+    {
+        "upload_id": "id_renvoyé_par_upload_slot"
+    }
+
+    Vérifie que l'objet existe et a la taille annoncée, puis crée le document.
+    """
+    user_id = None
+    try:
+        user_id = g.user.get("id")
+
+        data = request.get_json(silent=True) or {}
+        upload_id = data.get("upload_id")
+        if not upload_id:
+            return api_response({"status": "error", "message": "Paramètres manquants"}, 400, user_id, "Upload commit failed: missing upload_id")
+
+        slot = get_slot(user_id, upload_id)
+        if slot is None:
+            return api_response({"status": "error", "message": "Upload introuvable"}, 404, user_id, "Upload commit failed: slot not found")
+        if slot["expires_at"] < datetime.utcnow():
+            return api_response({"status": "error", "message": "Upload expiré"}, 410, user_id, "Upload commit failed: slot expired")
+
+        object_name = slot["object_name"]
+        try:
+            stored = stat_file(user_id, object_name)
+        except ObjectNotFound:
+            return api_response({"status": "error", "message": "Fichier non reçu"}, 409, user_id, "Upload commit failed: object not uploaded")
+
+        if stored.size != slot["taille_octets"]:
+            # Fichier incomplet ou différent de celui annoncé: on repart de zéro
+            if claim_slot(slot["id"]):
                 delete_file(user_id, object_name)
-            except Exception as cleanup_exc:
-                print(f"[ERROR] Cleanup failed: {cleanup_exc}")
-            raise
+            return api_response({"status": "error", "message": "Taille du fichier incorrecte"}, 400, user_id, "Upload commit failed: size mismatch")
+
+        # Le slot et le document sont validés ensemble en fin de requête
+        try:
+            with transaction():
+                if not claim_slot(slot["id"]):
+                    return api_response({"status": "error", "message": "Upload expiré"}, 410, user_id, "Upload commit failed: slot already reaped")
+                execute_write(
+                    "INSERT INTO documents (id_users, id_folder, nom_original, extension, taille_octets, object_name, dek_encrypted, iv, sha256) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                    (user_id, slot["id_folder"], slot["nom_original"], slot["extension"], stored.size, object_name, slot["dek_encrypted"], slot["iv"], slot["sha256"]),
+                )
+                add_document_usage(user_id, {slot["id_folder"]: (stored.size, 1)})
+                bump_change_version(user_id)
+        except QuotaExceeded as e:
+            # Tout est annulé: le slot reste valable jusqu'à expiration
+            return api_response({"status": "error", "message": str(e)}, e.status, user_id, "Upload commit refused: quota exceeded")
 
         return api_response({
             "status": "success",
             "data": {
                 "message": "Document uploadé avec succès",
                 "object_name": object_name,
-                "file_name": file_name
+                "file_name": slot["nom_original"]
             }
-        }, 200, user_id, f"Document uploaded: {file_name}")
+        }, 200, user_id, f"Document uploaded: {slot['nom_original']}")
 
     except Exception as e:
-        print(f"[ERROR] Upload document: {e}")
-        return api_response({"status": "error", "message": f"Erreur lors de l'upload: {str(e)}"}, 500, user_id, f"Upload error: {str(e)}")
+        print(f"[ERROR] Upload commit: {e}")
+        return api_response({"status": "error", "message": f"Erreur lors de l'upload: {str(e)}"}, 500, user_id, f"Upload commit error: {str(e)}")
 
 
+def _folder_cursor(page, folder) -> str:
+    return page.cursor("f", folder["created_at"] if page.folder_sort == "date" else folder["name"], folder["id"])
 
 
 @documents_bp.route("/documents/list", methods=["GET"])
 def list_documents():
     """
-    Liste tous les documents de l'utilisateur
+    Liste les dossiers puis les documents d'un dossier de l'utilisateur
+
+    Paramètres (query string):
+    - folder_id: dossier à lister (absent = racine)
+    - sort: name | size | date (défaut), order: asc | desc
+    - limit: taille de page (absent = tout le dossier), cursor: next_cursor
+      de la page précédente (voir module/pagination.py)
+    - fields: champs des documents à renvoyer, séparés par des virgules
+      (absent = tous); ex. fields=object_name,file_name,size sans les
+      métadonnées de chiffrement, lues ensuite via POST /documents/crypto
+
+    Réponse avec ETag; If-None-Match égal -> 304 (module/change_version.py)
     """
     user_id = None
     try:
@@ -137,69 +485,226 @@ def list_documents():
                     "List failed: invalid folder_id",
                 )
 
-            # anti "saut": le dossier doit appartenir au user
-            if get_folder(int(user_id), folder_id) is None:
-                return api_response(
-                    {"status": "error", "message": "Dossier introuvable ou non autorisé"},
-                    403,
-                    user_id,
-                    "List denied: folder not found",
-                )
+        try:
+            page = parse_page_args(request.args)
+        except PageError as pe:
+            return api_response({"status": "error", "message": str(pe)}, 400, user_id, "List failed: invalid pagination")
 
-        # Récupérer la liste des documents depuis la base (par dossier)
-        if folder_id is None:
-            rows = fetch_all(
-                "SELECT object_name, nom_original, taille_octets, created_at, dek_encrypted, iv, sha256 FROM documents WHERE id_users = %s AND id_folder IS NULL ORDER BY created_at DESC",
-                (user_id,),
+        try:
+            fields = DOCUMENT_FIELDS.parse(request.args.get("fields"))
+        except FieldsError as fe:
+            return api_response({"status": "error", "message": str(fe)}, 400, user_id, "List failed: invalid fields")
+
+        # Rien de changé depuis la copie du client: 304 sans lire dossiers ni
+        # documents. L'ETag porte l'id du user et la version, qui change à la
+        # suppression d'un dossier: il ne peut valoir que pour un dossier à lui.
+        etag, unchanged = not_modified(user_id)
+        if unchanged is not None:
+            return unchanged
+
+        # anti "saut": le dossier doit appartenir au user
+        if folder_id is not None and get_folder(int(user_id), folder_id) is None:
+            return api_response(
+                {"status": "error", "message": "Dossier introuvable ou non autorisé"},
+                403,
+                user_id,
+                "List denied: folder not found",
             )
-        else:
-            rows = fetch_all(
-                "SELECT object_name, nom_original, taille_octets, created_at, dek_encrypted, iv, sha256 FROM documents WHERE id_users = %s AND id_folder = %s ORDER BY created_at DESC",
-                (user_id, folder_id),
+
+        # Une page = les dossiers puis les documents du dossier, dans l'ordre
+        # demandé; le curseur indique où reprendre
+        next_cursor = None
+        folders = []
+        remaining = page.limit
+        if page.after is None or page.after.phase == "f":
+            folder_after = (page.after.value, page.after.id) if page.after is not None else None
+            folders = list_child_folders(
+                int(user_id), folder_id, page.folder_sort, page.folder_descending, folder_after,
+                None if page.limit is None else page.limit + 1,
             )
+            if page.limit is not None:
+                if len(folders) > page.limit:
+                    folders = folders[:page.limit]
+                    next_cursor = _folder_cursor(page, folders[-1])
+                remaining = page.limit - len(folders)
+
+        rows = []
+        if next_cursor is None:
+            column = DOCUMENT_SORT_COLUMNS[page.sort]
+            direction = "DESC" if page.descending else "ASC"
+            # id et clé de tri toujours lus: ils forment le curseur
+            query = f"SELECT {DOCUMENT_FIELDS.select(fields, ('id', column))} FROM documents WHERE id_users = %s"
+            params = [user_id]
+            if folder_id is None:
+                query += " AND id_folder IS NULL"
+            else:
+                query += " AND id_folder = %s"
+                params.append(folder_id)
+            if page.after is not None and page.after.phase == "d":
+                query += " AND " + keyset_condition(column, page.descending)
+                params += [page.after.value, page.after.id]
+            query += f" ORDER BY {column} {direction}, id {direction}"
+            if remaining is not None:
+                query += " LIMIT %s"
+                params.append(remaining + 1)
+            rows = fetch_all(query, tuple(params))
+            if remaining is not None and len(rows) > remaining:
+                rows = rows[:remaining]
+                if rows:
+                    next_cursor = page.cursor("d", rows[-1][column], rows[-1]["id"])
+                else:
+                    # Page remplie par les dossiers: les documents commencent à la suivante
+                    next_cursor = _folder_cursor(page, folders[-1])
 
-        folders = list_child_folders(int(user_id), folder_id)
         breadcrumb = build_breadcrumb(int(user_id), folder_id)
 
-        # Formater la réponse
-        documents = []
-        for row in rows:
-            created_at = row.get("created_at")
-            if created_at is None:
-                last_modified = None
-            elif hasattr(created_at, "isoformat"):
-                last_modified = created_at.isoformat()
-            else:
-                last_modified = str(created_at)
-            documents.append({
-                "object_name": row["object_name"],
-                "file_name": row["nom_original"],
-                "size": row["taille_octets"],
-                "last_modified": last_modified,
-                "dek_encrypted": row["dek_encrypted"],
-                "iv": row["iv"],
-                "sha256": row["sha256"]
-            })
+        documents = [DOCUMENT_FIELDS.project(row, fields) for row in rows]
 
-        return api_response({
+        return tag_listing(api_response({
             "status": "success",
             "data": {
                 "documents": documents,
                 "folders": folders,
                 "breadcrumb": breadcrumb,
                 "count": len(documents),
+                "next_cursor": next_cursor,
             }
-        }, 200, user_id, "Documents listed")
+        }, 200, user_id, "Documents listed"), etag)
 
     except Exception as e:
         print(f"[ERROR] List documents: {e}")
         return api_response({"status": "error", "message": f"Erreur lors de la récupération: {str(e)}"}, 500, user_id, f"List error: {str(e)}")
 
 
+@documents_bp.route("/documents/search", methods=["GET"])
+def search_documents():
+    """
+    Recherche dans tous les dossiers de l'utilisateur (voir module/search.py)
+
+    Paramètres (query string):
+    - q, extension, min_size, max_size, from, to, folder_id (sous-arbre)
+    - sort / order / limit (défaut SEARCH_PAGE_SIZE) / cursor comme /documents/list
+    - fields: champs des documents (comme /documents/list)
+
+    Chaque résultat porte folder_id et folder_path ([{id, name}] racine ->
+    dossier, [] à la racine).
+    """
+    user_id = None
+    try:
+        user_id = g.user.get("id")
+
+        try:
+            search, page = parse_search_args(request.args)
+            fields = DOCUMENT_FIELDS.parse(request.args.get("fields"))
+        except (SearchError, PageError, FieldsError) as e:
+            return api_response({"status": "error", "message": str(e)}, 400, user_id, "Search failed: invalid parameters")
+
+        etag, unchanged = not_modified(user_id)
+        if unchanged is not None:
+            return unchanged
+
+        folder_ids = None
+        if search.folder_id is not None:
+            try:
+                folder_ids = get_descendant_folder_ids(int(user_id), search.folder_id)
+            except PermissionError:
+                return api_response(
+                    {"status": "error", "message": "Dossier introuvable ou non autorisé"},
+                    403,
+                    user_id,
+                    "Search denied: folder not found",
+                )
+
+        column = DOCUMENT_SORT_COLUMNS[page.sort]
+        query, params = build_search_query(
+            user_id, search, page, DOCUMENT_FIELDS.select(fields, ("id", column, "id_folder")), column, folder_ids,
+        )
+        rows = fetch_all(query, tuple(params))
+
+        next_cursor = None
+        if len(rows) > page.limit:
+            rows = rows[:page.limit]
+            next_cursor = page.cursor("d", rows[-1][column], rows[-1]["id"])
+
+        # Chemin de chaque dossier, calculé une fois (arborescence en cache)
+        paths = {}
+        documents = []
+        for row in rows:
+            folder_id = row["id_folder"]
+            if folder_id not in paths:
+                paths[folder_id] = build_breadcrumb(int(user_id), folder_id)
+            document = DOCUMENT_FIELDS.project(row, fields)
+            document["folder_id"] = folder_id
+            document["folder_path"] = paths[folder_id]
+            documents.append(document)
+
+        return tag_listing(api_response({
+            "status": "success",
+            "data": {
+                "documents": documents,
+                "count": len(documents),
+                "next_cursor": next_cursor,
+            }
+        }, 200, user_id, "Documents searched"), etag)
+
+    except Exception as e:
+        print(f"[ERROR] Search documents: {e}")
+        return api_response({"status": "error", "message": f"Erreur lors de la recherche: {str(e)}"}, 500, user_id, f"Search error: {str(e)}")
+
+
+@documents_bp.route("/documents/crypto", methods=["POST"])
+def get_documents_crypto():
+    """
+    Métadonnées de chiffrement d'un lot de documents (à lister sans elles
+    avec ?fields=, puis à lire ici pour ceux que le client déchiffre)
+
+    Payload attendu:
+    {
+        "object_names": ["...", "..."]   (au plus LIST_MAX_LIMIT)
+    }
+
+    Réponse: documents {object_name: {dek_encrypted, iv, sha256}}, et missing
+    pour les object_name inconnus ou d'un autre utilisateur
+    """
+    user_id = None
+    try:
+        user_id = g.user.get("id")
+
+        try:
+            object_names = parse_id_list(request.get_json(silent=True), "object_names", str)
+        except FieldsError as fe:
+            return api_response({"status": "error", "message": str(fe)}, 400, user_id, "Crypto lookup failed: invalid payload")
+
+        placeholders = ", ".join(["%s"] * len(object_names))
+        rows = fetch_all(
+            f"SELECT object_name, dek_encrypted, iv, sha256 FROM documents WHERE id_users = %s AND object_name IN ({placeholders})",
+            (user_id, *object_names),
+        )
+        documents = {
+            row["object_name"]: {"dek_encrypted": row["dek_encrypted"], "iv": row["iv"], "sha256": row["sha256"]}
+            for row in rows
+        }
+
+        return api_response({
+            "status": "success",
+            "data": {
+                "documents": documents,
+                "missing": [name for name in object_names if name not in documents],
+            }
+        }, 200, None, None)
+
+    except Exception as e:
+        print(f"[ERROR] Documents crypto: {e}")
+        return api_response({"status": "error", "message": f"Erreur lors de la récupération: {str(e)}"}, 500, user_id, f"Crypto lookup error: {str(e)}")
+
+
 @documents_bp.route("/documents/download/<path:object_name>", methods=["GET"])
 def download_document(object_name):
     """
     Télécharge un document chiffré
+
+    ?mode=url: renvoie une URL de téléchargement MinIO signée (JSON) au lieu
+    du fichier, si MINIO_PUBLIC_ENDPOINT est configuré
     """
     try:
         # Récupérer l'utilisateur depuis g (déjà décodé par le middleware)
@@ -212,24 +717,27 @@ def download_document(object_name):
         if document is None:
             return api_response({"status": "error", "message": "Accès non autorisé"}, 403, user_id, "Download denied: document not found")
 
-        # Télécharger le fichier
-        file_data, _ = download_file(user_id, object_name)
-
         # Récupérer le nom original
         original_name = document.get("nom_original", "document")
 
-        # Créer la réponse avec les métadonnées dans les headers
-        response = send_file(
-            BytesIO(file_data),
-            mimetype="application/octet-stream",
-            as_attachment=True,
-            download_name=original_name
-        )
+        crypto = {
+            "dek_encrypted": document.get("dek_encrypted", ""),
+            "iv": document.get("iv", ""),
+            "sha256": document.get("sha256", ""),
+        }
+
+        # ?mode=url: URL MinIO signée, le client télécharge sans passer par le backend
+        response = None
+        if wants_download_url():
+            response = download_url_response(user_id, object_name, original_name, crypto)
+        if response is None:
+            # Réponse en flux (Range / If-Range pour reprendre un téléchargement)
+            response = send_stored_file(user_id, object_name, original_name, log_user_id=user_id)
 
         # Ajouter les métadonnées crypto dans les headers
-        response.headers["X-DEK-Encrypted"] = document.get("dek_encrypted", "")
-        response.headers["X-IV"] = document.get("iv", "")
-        response.headers["X-SHA256"] = document.get("sha256", "")
+        response.headers["X-DEK-Encrypted"] = crypto["dek_encrypted"]
+        response.headers["X-IV"] = crypto["iv"]
+        response.headers["X-SHA256"] = crypto["sha256"]
 
         return response
 
@@ -256,12 +764,14 @@ def delete_document(object_name):
         if document is None:
             return api_response({"status": "error", "message": "Accès non autorisé"}, 403, user_id, "Delete denied: document not found")
 
-        # Supprimer le fichier
-        delete_file(user_id, object_name)
+        # Le fichier (et ceux des partages du document) est supprimé en arrière-plan
+        tombstone_documents("d.id = %s", (document["id"],))
+        release_documents("d.id = %s", (document["id"],))
         execute_write(
             "DELETE FROM documents WHERE id = %s",
             (document["id"],),
         )
+        bump_change_version(user_id)
 
         return api_response({
             "status": "success",
@@ -273,3 +783,58 @@ def delete_document(object_name):
     except Exception as e:
         print(f"[ERROR] Delete document: {e}")
         return api_response({"status": "error", "message": f"Erreur lors de la suppression: {str(e)}"}, 500, g.user.get("id"), f"Delete error: {str(e)}")
+
+
+@documents_bp.route("/documents/usage", methods=["GET"])
+def get_usage():
+    """
+    Espace utilisé et quotas de l'utilisateur (compteurs, voir module/usage.py)
+
+    ?folder_id=: ajoute l'espace du dossier, documents directement dedans
+    (direct) et dans tout son sous-arbre (tree)
+    """
+    user_id = None
+    try:
+        user_id = g.user.get("id")
+        data = user_usage(int(user_id))
+
+        folder_param = request.args.get("folder_id")
+        if folder_param not in (None, ""):
+            try:
+                folder_id = int(folder_param)
+            except (TypeError, ValueError):
+                return api_response({"status": "error", "message": "folder_id invalide"}, 400, user_id, "Usage failed: invalid folder_id")
+            try:
+                folder_ids = get_descendant_folder_ids(int(user_id), folder_id, include_self=True)
+            except PermissionError:
+                return api_response({"status": "error", "message": "Dossier introuvable"}, 404, user_id, "Usage failed: folder not found")
+            counters = folder_usage(int(user_id), folder_ids)
+            direct = counters.get(folder_id, (0, 0))
+            data["folder"] = {
+                "id": folder_id,
+                "direct": {"bytes": direct[0], "objects": direct[1]},
+                "tree": {
+                    "bytes": sum(size for size, _ in counters.values()),
+                    "objects": sum(count for _, count in counters.values()),
+                },
+            }
+
+        return api_response({"status": "success", "data": data}, 200, None, None)
+    except Exception as e:
+        print(f"[ERROR] Usage: {e}")
+        return api_response({"status": "error", "message": f"Erreur lors de la récupération: {str(e)}"}, 500, user_id, f"Usage error: {str(e)}")
+
+
+@documents_bp.route("/documents/deletions", methods=["GET"])
+def get_pending_deletions():
+    """
+    Avancement des suppressions en arrière-plan: fichiers encore à supprimer
+    du stockage (pending), dont ceux dont une tentative a échoué (retrying)
+    """
+    user_id = None
+    try:
+        user_id = g.user.get("id")
+        return api_response({"status": "success", "data": pending_deletions(user_id)}, 200, None, None)
+    except Exception as e:
+        print(f"[ERROR] Pending deletions: {e}")
+        return api_response({"status": "error", "message": f"Erreur lors de la récupération: {str(e)}"}, 500, user_id, f"Pending deletions error: {str(e)}")
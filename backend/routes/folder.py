@@ -1,10 +1,15 @@
-from flask import Blueprint, g, request
+from flask import Blueprint, Response, g, request
 
 from module.api_retour import api_response
-from module.db import execute_write, fetch_all
+from module.archive import archive_entries, stream_archive
+from module.config import ARCHIVE_MAX_FILES
+from module.db import execute_write, transaction
+from module.deletion_queue import tombstone_documents
 from module.folder import create_folder as create_folder_db
+from module.download import set_attachment
 from module.folder import get_descendant_folder_ids, get_folder
-from module.minio_client import delete_file
+from module.folder_tree import bump_folder_version
+from module.usage import release_documents
 
 
 folder_bp = Blueprint("folders", __name__)
@@ -122,33 +127,31 @@ def delete_folder_route(folder_id: int):
         folder_ids = get_descendant_folder_ids(int(user_id), int(folder_id), include_self=True)
         placeholders = ", ".join(["%s"] * len(folder_ids))
 
-        doc_rows = fetch_all(
-            f"SELECT object_name FROM documents WHERE id_users = %s AND id_folder IN ({placeholders})",
-            tuple([int(user_id)] + folder_ids),
-        )
-
-        # DB first: avoid broken downloads. MinIO cleanup is best-effort.
-        execute_write(
-            f"DELETE FROM documents WHERE id_users = %s AND id_folder IN ({placeholders})",
-            tuple([int(user_id)] + folder_ids),
-        )
-
-        execute_write(
-            "DELETE FROM folders WHERE id_users = %s AND id = %s",
-            (int(user_id), int(folder_id)),
-        )
+        # Documents + dossier dans la même transaction: pas d'état partiel.
+        # Les fichiers sont mis en file et supprimés en arrière-plan: la requête
+        # ne dépend pas du nombre de documents du sous-arbre.
+        with transaction():
+            queued = tombstone_documents(
+                f"d.id_users = %s AND d.id_folder IN ({placeholders})",
+                tuple([int(user_id)] + folder_ids),
+            )
+            release_documents(
+                f"d.id_users = %s AND d.id_folder IN ({placeholders})",
+                tuple([int(user_id)] + folder_ids),
+            )
+            execute_write(
+                f"DELETE FROM documents WHERE id_users = %s AND id_folder IN ({placeholders})",
+                tuple([int(user_id)] + folder_ids),
+            )
 
-        for d in doc_rows:
-            object_name = d.get("object_name")
-            if not object_name:
-                continue
-            try:
-                delete_file(int(user_id), object_name)
-            except Exception as exc:
-                print(f"[WARNING] MinIO delete failed for {object_name}: {exc}")
+            execute_write(
+                "DELETE FROM folders WHERE id_users = %s AND id = %s",
+                (int(user_id), int(folder_id)),
+            )
+            bump_folder_version(int(user_id))
 
         return api_response(
-            {"status": "success", "data": {"message": "Dossier supprimé"}},
+            {"status": "success", "data": {"message": "Dossier supprimé", "pending_deletions": queued}},
             200,
             user_id,
             f"Folder deleted: {folder_id}",
@@ -170,7 +173,8 @@ CREATE TABLE `folders` (
   `parent_id` INT DEFAULT NULL,
   `created_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
   PRIMARY KEY (`id`),
-  KEY `idx_folders_user` (`id_users`),
+  KEY `idx_folders_list_name` (`id_users`, `parent_id`, `nom`, `id`),
+  KEY `idx_folders_list_date` (`id_users`, `parent_id`, `created_at`, `id`),
   KEY `idx_folders_parent` (`parent_id`),
   CONSTRAINT `fk_folders_users`
     FOREIGN KEY (`id_users`) REFERENCES `users` (`id`) ON DELETE CASCADE,
@@ -179,3 +183,47 @@ CREATE TABLE `folders` (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 '''
+
+
+@folder_bp.route("/documents/folders/archive/<int:folder_id>", methods=["GET"])
+def archive_folder_route(folder_id: int):
+    """
+    Télécharge un dossier et tous ses sous-dossiers en une archive ZIP
+    (fichiers chiffrés + manifest.json des métadonnées de chiffrement, voir
+    module/archive.py), produite en flux
+    """
+    user_id = None
+    try:
+        user_id = g.user.get("id")
+
+        folder = get_folder(int(user_id), int(folder_id))
+        if folder is None:
+            return api_response(
+                {"status": "error", "message": "Dossier introuvable"},
+                404,
+                user_id,
+                "Folder archive failed: not found",
+            )
+
+        folder_ids = get_descendant_folder_ids(int(user_id), int(folder_id), include_self=True)
+        folders, entries = archive_entries(int(user_id), folder_ids)
+        if len(entries) > ARCHIVE_MAX_FILES:
+            return api_response(
+                {"status": "error", "message": f"Trop de fichiers pour une archive (max {ARCHIVE_MAX_FILES})"},
+                413,
+                user_id,
+                "Folder archive failed: too many files",
+            )
+
+        print(f"[INFO] Folder archive: user={user_id} folder={folder_id} files={len(entries)}")
+        response = Response(stream_archive(int(user_id), folders, entries), mimetype="application/zip", direct_passthrough=True)
+        set_attachment(response, f"{folder['nom'] or 'dossier'}.zip")
+        return response
+    except Exception as e:
+        print(f"[ERROR] Folder archive: {e}")
+        return api_response(
+            {"status": "error", "message": f"Erreur lors de l'archivage: {str(e)}"},
+            500,
+            user_id,
+            f"Folder archive error: {str(e)}",
+        )
@@ -1,9 +1,12 @@
 from flask import Blueprint, jsonify
 
+from module.middleware import public
+
 health_bp = Blueprint("health", __name__)
 
 
 @health_bp.route("/health")
+@public
 def health():
     return jsonify({"status": "ok", "message": "API is running"})
 
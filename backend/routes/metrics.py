@@ -0,0 +1,34 @@
+import hmac
+
+from flask import Blueprint, Response, g, jsonify, request
+
+from module.config import METRICS_PUBLIC, METRICS_TOKEN
+from module.metrics import render_latest
+from module.middleware import public
+
+metrics_bp = Blueprint("metrics", __name__)
+# Le scraper envoie METRICS_TOKEN, pas un JWT: la route ne passe par
+# l'authentification des sessions que sans jeton ni ouverture explicite
+if METRICS_TOKEN or METRICS_PUBLIC:
+    public(metrics_bp)
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Métriques Prometheus (format texte), agrégées sur tous les workers.
+
+    Si METRICS_TOKEN est défini, le scraper doit envoyer
+    `Authorization: Bearer <METRICS_TOKEN>`. Sinon la route exige un token
+    de session, sauf si METRICS_PUBLIC=1 (réseau de scrape isolé).
+    """
+    if METRICS_TOKEN:
+        auth_header = request.headers.get("Authorization", "")
+        provided = auth_header.split(" ", 1)[1].strip() if auth_header.startswith("Bearer ") else ""
+        if not hmac.compare_digest(provided.encode(), METRICS_TOKEN.encode()):
+            return jsonify({"status": "error"}), 401
+    elif not METRICS_PUBLIC and not g.get("user"):
+        return jsonify({"status": "error"}), 401
+
+    body, content_type = render_latest()
+    return Response(body, content_type=content_type)
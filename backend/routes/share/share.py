@@ -1,17 +1,42 @@
-from io import BytesIO
 import secrets
 from datetime import datetime, timedelta
-from flask import Blueprint, jsonify, request, g, send_file
+from flask import Blueprint, jsonify, request, g
 import base64
 
-from module.db import execute_write, fetch_all, fetch_one
+from module.db import execute_write, fetch_all, fetch_one, log_shared_access, transaction
+from module.deletion_queue import tombstone_objects
 from module.api_retour import api_response
-from module.minio_client import upload_file, delete_file, download_file
+from module.change_version import bump_change_version, not_modified, tag_listing
+from module.download import download_url_response, send_stored_file, wants_download_url
+from module.fields import Field, FieldSet, FieldsError, isoformat, parse_id_list
+from module.idempotency import IdempotencyError, Replay, claim_key, complete_key, conflict_response, hashing, release_key, replay_response
+from module.middleware import public
+from module.storage import upload_file, delete_file
+from module.upload import UploadError, read_upload
+from module.usage import QuotaExceeded, add_share_usage, check_quota, release_shares
 
 
 
 share = Blueprint("share", __name__)
 
+# Champs d'un partage dans GET /share/list (?fields=, voir module/fields.py)
+SHARE_FIELDS = FieldSet({
+    "id": Field("id"),
+    "object_name": Field("object_name"),
+    "file_name": Field("name_document"),
+    "size": Field("taille_octets"),
+    "last_modified": Field("created_at", isoformat),
+    "dek_encrypted": Field("SEK"),
+    "iv": Field("iv"),
+    "sha256": Field("sha256"),
+    "destination_email": Field("destination_email"),
+    "expires_at": Field("expires_at", isoformat),
+    "is_active": Field("is_active"),
+    "max_views": Field("max_views"),
+    "views_count": Field("views_count"),
+    "token": Field("token"),
+})
+
 
 
 @share.route("/share/upload", methods=["POST"])
@@ -19,7 +44,7 @@ def upload_document_shared():
     """
     Upload un document chiffré
 
-    Payload attendu:
+    Payload JSON (historique):
     {
         "file_name": "contrat.pdf",
         "file_data": "base64_encrypted_data",
@@ -27,37 +52,41 @@ def upload_document_shared():
         "iv": "base64_iv",
         "sha256": "hash_du_fichier_original"
     }
+
+    Accepte aussi le corps brut (application/octet-stream, champs en headers
+    X-File-Name, X-Dek-Encrypted, X-Iv, X-Sha256, X-Email, X-Time,
+    X-Number-Of-Accesses, X-Source-Object-Name) et le multipart/form-data
+    (champ fichier "file"): voir module/upload.py.
     """
     try:
         # Récupérer l'utilisateur depuis g (déjà décodé par le middleware)
         user_id = g.user.get("id")
 
-        # Récupérer les données du formulaire
-        data = request.get_json()
-        if not data:
-            return api_response({"status": "error", "message": "Données manquantes"}, 400, user_id, "Upload failed: missing data")
-
-        file_name = data.get("file_name")
-        file_data_b64 = data.get("file_data")
-        dek_encrypted = data.get("dek_encrypted")
-        iv = data.get("iv")
-        sha256 = data.get("sha256")
+        # Récupérer les données (JSON, corps brut ou multipart)
+        try:
+            upload = read_upload((
+                "file_name", "dek_encrypted", "iv", "sha256",
+                "email", "time", "number_of_accesses", "source_object_name",
+            ))
+        except UploadError as e:
+            return api_response({"status": "error", "message": str(e)}, e.status, user_id, f"Upload failed: {e}")
+
+        file_name = upload.fields["file_name"]
+        dek_encrypted = upload.fields["dek_encrypted"]
+        iv = upload.fields["iv"]
+        sha256 = upload.fields["sha256"]
         #email du destinatere
-        email = data.get("email")
-        time = data.get("time")
-        number_of_accesses = data.get("number_of_accesses")
-        source_object_name = data.get("source_object_name")
+        email = upload.fields["email"]
+        time = upload.fields["time"]
+        number_of_accesses = upload.fields["number_of_accesses"]
+        source_object_name = upload.fields["source_object_name"]
 
 
 
-        if not all([file_name, file_data_b64, dek_encrypted, iv, sha256]):
+        if upload.data is None or not all([file_name, dek_encrypted, iv, sha256]):
             return api_response({"status": "error", "message": "Paramètres manquants"}, 400, user_id, "Upload failed: missing parameters")
 
-        # Décoder le fichier chiffré depuis base64
-        import base64
-        file_data = base64.b64decode(file_data_b64)
-
-        file_size = len(file_data)
+        file_size = upload.length
 
         if time is None:
             return api_response({"status": "error", "message": "Durée manquante"}, 400, user_id, "Upload failed: missing time")
@@ -80,11 +109,6 @@ def upload_document_shared():
             except (TypeError, ValueError):
                 return api_response({"status": "error", "message": "Nombre d'accès invalide"}, 400, user_id, "Upload failed: invalid max views")
 
-        # Upload vers MinIO
-        object_name = upload_file(f"{user_id}_shared", file_data, file_name, {})
-
-        token = secrets.token_urlsafe(32)
-
         document_id = None
         if source_object_name:
             document_row = fetch_one(
@@ -95,20 +119,58 @@ def upload_document_shared():
                 return api_response({"status": "error", "message": "Accès non autorisé"}, 403, user_id, "Share upload denied: document not found")
             document_id = document_row["id"]
 
-            
+        # Idempotency-Key: nouvel essai d'un partage déjà créé -> même réponse,
+        # rien de stocké (avant le quota: la copie y est déjà comptée)
         try:
-            rowcount, t = execute_write(
-                "INSERT INTO shared_files (name_document, id_owner, id_document, object_name, taille_octets, token, SEK, iv, sha256, destination_email, expires_at, max_views) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
-                (file_name, user_id, document_id, object_name, file_size, token, dek_encrypted, iv, sha256, email, expires_at, number_of_accesses))
+            claim = claim_key(int(user_id), "share.upload")
+            if isinstance(claim, Replay):
+                return replay_response(claim, upload.data, user_id)
+        except IdempotencyError as e:
+            return conflict_response(e, user_id)
+
+        try:
+            check_quota(user_id, file_size)
+        except QuotaExceeded as e:
+            release_key(claim)
+            return api_response({"status": "error", "message": str(e)}, e.status, user_id, "Share upload refused: quota exceeded")
 
-            return jsonify({"status": "success", "token": token}), 200
-        except Exception as exc:
+        try:
+            # Upload vers le stockage, en flux si possible
+            data, digest = hashing(upload.data) if claim else (upload.data, None)
+            object_name = upload_file(f"{user_id}_shared", data, file_name, {}, length=file_size)
+
+            token = secrets.token_urlsafe(32)
+            result = {"status": "success", "token": token}
             try:
+                with transaction():
+                    execute_write(
+                        "INSERT INTO shared_files (name_document, id_owner, id_document, object_name, taille_octets, token, SEK, iv, sha256, destination_email, expires_at, max_views) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                        (file_name, user_id, document_id, object_name, file_size, token, dek_encrypted, iv, sha256, email, expires_at, number_of_accesses))
+                    add_share_usage(user_id, file_size)
+                    bump_change_version(user_id)
+                    if claim:
+                        complete_key(claim, digest(), 200, result)
+            except (IdempotencyError, QuotaExceeded):
                 delete_file(f"{user_id}_shared", object_name)
-            except Exception as cleanup_exc:
-                print(f"[ERROR] Cleanup failed: {cleanup_exc}")
-            print(f"[ERROR] Insert shared_files: {exc}")
-            return jsonify({"status": "error", "message": str(exc)}), 500
+                raise
+            except Exception as exc:
+                try:
+                    delete_file(f"{user_id}_shared", object_name)
+                except Exception as cleanup_exc:
+                    print(f"[ERROR] Cleanup failed: {cleanup_exc}")
+                print(f"[ERROR] Insert shared_files: {exc}")
+                release_key(claim)
+                return jsonify({"status": "error", "message": str(exc)}), 500
+        except IdempotencyError as e:
+            return conflict_response(e, user_id)
+        except QuotaExceeded as e:
+            release_key(claim)
+            return api_response({"status": "error", "message": str(e)}, e.status, user_id, "Share upload refused: quota exceeded")
+        except Exception:
+            release_key(claim)
+            raise
+
+        return jsonify(result), 200
 
 
     except Exception as e:
@@ -122,64 +184,94 @@ def upload_document_shared():
 def list_documents():
     """
     Liste tous les documents partager de l'utilisateur
+
+    ?fields=: champs à renvoyer, séparés par des virgules (absent = tous);
+    les métadonnées de chiffrement se lisent alors via POST /share/crypto
+
+    Réponse avec ETag; If-None-Match égal -> 304 (module/change_version.py)
     """
+    user_id = None
     try:
         # Récupérer l'utilisateur depuis g (déjà décodé par le middleware)
         user_id = g.user.get("id")
 
+        try:
+            fields = SHARE_FIELDS.parse(request.args.get("fields"))
+        except FieldsError as fe:
+            return api_response({"status": "error", "message": str(fe)}, 400, user_id, "List failed: invalid fields")
+
+        # Rien de changé depuis la copie du client: 304 sans lire les partages
+        etag, unchanged = not_modified(user_id)
+        if unchanged is not None:
+            return unchanged
+
         # Récupérer la liste des documents depuis la base
         rows = fetch_all(
-            "SELECT id, object_name, name_document, taille_octets, destination_email, created_at, expires_at, max_views, views_count, is_active, token, SEK AS dek_encrypted, iv, sha256 FROM shared_files WHERE id_owner = %s ORDER BY created_at DESC",
+            f"SELECT {SHARE_FIELDS.select(fields)} FROM shared_files WHERE id_owner = %s ORDER BY created_at DESC",
             (user_id,),
         )
 
         # Formater la réponse
-        documents = []
-        for row in rows:
-            created_at = row.get("created_at")
-            if created_at is None:
-                last_modified = None
-            elif hasattr(created_at, "isoformat"):
-                last_modified = created_at.isoformat()
-            else:
-                last_modified = str(created_at)
-            expires_at = row.get("expires_at")
-            if expires_at is None:
-                expires_at_value = None
-            elif hasattr(expires_at, "isoformat"):
-                expires_at_value = expires_at.isoformat()
-            else:
-                expires_at_value = str(expires_at)
-            documents.append({
-                "id": row["id"],
-                "object_name": row["object_name"],
-                "file_name": row["name_document"],
-                "size": row["taille_octets"],
-                "last_modified": last_modified,
-                "dek_encrypted": row["dek_encrypted"],
-                "iv": row["iv"],
-                "sha256": row["sha256"],
-                "destination_email": row["destination_email"],
-                "expires_at": expires_at_value,
-                "is_active": row["is_active"],
-                "max_views": row["max_views"],
-                "views_count": row["views_count"],
-                "token": row["token"]
-            })
+        documents = [SHARE_FIELDS.project(row, fields) for row in rows]
 
-        return api_response({
+        return tag_listing(api_response({
             "status": "success",
             "data": {
                 "documents": documents,
                 "count": len(documents)
             }
-        }, 200, user_id, "Documents listed")
+        }, 200, user_id, "Documents listed"), etag)
 
     except Exception as e:
         print(f"[ERROR] List documents: {e}")
         return api_response({"status": "error", "message": f"Erreur lors de la récupération: {str(e)}"}, 500, user_id, f"List error: {str(e)}")
 
 
+@share.route("/share/crypto", methods=["POST"])
+def get_shares_crypto():
+    """
+    Métadonnées de chiffrement d'un lot de partages de l'utilisateur
+
+    Payload attendu:
+    {
+        "ids": [1, 2, 3]   (au plus LIST_MAX_LIMIT)
+    }
+
+    Réponse: shares {id: {dek_encrypted, iv, sha256}}, et missing pour les
+    id inconnus ou d'un autre utilisateur
+    """
+    user_id = None
+    try:
+        user_id = g.user.get("id")
+
+        try:
+            ids = parse_id_list(request.get_json(silent=True), "ids", int)
+        except FieldsError as fe:
+            return api_response({"status": "error", "message": str(fe)}, 400, user_id, "Crypto lookup failed: invalid payload")
+
+        placeholders = ", ".join(["%s"] * len(ids))
+        rows = fetch_all(
+            f"SELECT id, SEK AS dek_encrypted, iv, sha256 FROM shared_files WHERE id_owner = %s AND id IN ({placeholders})",
+            (user_id, *ids),
+        )
+        shares = {
+            str(row["id"]): {"dek_encrypted": row["dek_encrypted"], "iv": row["iv"], "sha256": row["sha256"]}
+            for row in rows
+        }
+
+        return api_response({
+            "status": "success",
+            "data": {
+                "shares": shares,
+                "missing": [share_id for share_id in ids if str(share_id) not in shares],
+            }
+        }, 200, None, None)
+
+    except Exception as e:
+        print(f"[ERROR] Shares crypto: {e}")
+        return api_response({"status": "error", "message": f"Erreur lors de la récupération: {str(e)}"}, 500, user_id, f"Crypto lookup error: {str(e)}")
+
+
 @share.route("/share/switch", methods=["POST"])
 def disable_shared_document():
     """
@@ -210,6 +302,7 @@ def disable_shared_document():
             "UPDATE shared_files SET is_active = %s WHERE id = %s",
             (new_status, id),
         )
+        bump_change_version(user_id)
 
         return api_response({
             "status": "success",
@@ -222,6 +315,7 @@ def disable_shared_document():
     
 
 @share.route("/share/name_file", methods=["POST"])
+@public
 def name_file():
     """
     donne le nom du fichier a partire du token
@@ -252,6 +346,7 @@ def name_file():
 
 
 @share.route("/share/download", methods=["POST"])
+@public
 def download_shared_document():
     """
     Télécharge un document chiffré partagé
@@ -259,7 +354,8 @@ def download_shared_document():
     Payload attendu:
     {
         "token": "token_du_partage",
-        "email": "email_de_la_personne"
+        "email": "email_de_la_personne",
+        "mode": "url"   (optionnel: URL MinIO signée en JSON au lieu du fichier)
     }
     """
 
@@ -307,42 +403,49 @@ def download_shared_document():
         object_name = document.get("object_name")
         owner_bucket = f"{user_id}_shared"
         bucket_id = owner_bucket if object_name and object_name.startswith(f"{owner_bucket}/") else user_id
-        # Télécharger le fichier
-        file_data, _ = download_file(bucket_id, object_name)
-
         # Récupérer le nom original
         original_name = document.get("name_document", "document")
 
-        # Créer la réponse avec les métadonnées dans les headers
-        response = send_file(
-            BytesIO(file_data),
-            mimetype="application/octet-stream",
-            as_attachment=True,
-            download_name=original_name
-        )
+        crypto = {
+            "dek_encrypted": document.get("dek_encrypted", ""),
+            "iv": document.get("iv", ""),
+            "sha256": document.get("sha256", ""),
+        }
+
+        # "mode": "url": URL MinIO signée, le client télécharge sans passer par le backend
+        response = None
+        if wants_download_url():
+            response = download_url_response(bucket_id, object_name, original_name, crypto)
+        if response is None:
+            # Réponse en flux (Range / If-Range pour reprendre un téléchargement)
+            response = send_stored_file(bucket_id, object_name, original_name)
+        if response.status_code not in (200, 206):
+            return response
 
         # Ajouter les métadonnées crypto dans les headers
-        response.headers["X-DEK-Encrypted"] = document.get("dek_encrypted", "")
-        response.headers["X-IV"] = document.get("iv", "")
-        response.headers["X-SHA256"] = document.get("sha256", "")
+        response.headers["X-DEK-Encrypted"] = crypto["dek_encrypted"]
+        response.headers["X-IV"] = crypto["iv"]
+        response.headers["X-SHA256"] = crypto["sha256"]
 
 
-        #mettre a jour le limte d'accés
-        rowcount, t = execute_write(
-            "UPDATE shared_files SET views_count = views_count + 1 WHERE token = %s",
-            (token,),
-        )
-
         #mettre les user agend et ip du mec dans les logs des accées de partage
         user_agent = request.headers.get("User-Agent")
         ip_address = request.remote_addr
-        
 
         print(f"[INFO] Shared document accessed: id_shared_file={id_shared_file}, ip_address={ip_address}, user_agent={user_agent}")
-        rowcount, t = execute_write(
-            "INSERT INTO shared_acces_log (id_shared_file, accessed_at, ip_address, user_agent) VALUES (%s, %s, %s, %s)",
-            (id_shared_file, datetime.utcnow(), str(ip_address), str(user_agent))
-        )
+
+        # La reprise d'un téléchargement (plage ne commençant pas à 0) ne
+        # compte pas comme un nouvel accès
+        if response.status_code == 200 or response.content_range.start == 0:
+            #mettre a jour le limte d'accés
+            rowcount, t = execute_write(
+                "UPDATE shared_files SET views_count = views_count + 1 WHERE token = %s",
+                (token,),
+            )
+            # views_count est affiché dans /share/list du propriétaire
+            bump_change_version(user_id)
+        # journal d'accès: écrit en fond par le log sink
+        log_shared_access(id_shared_file, ip_address, user_agent)
 
 
         return response
@@ -377,17 +480,14 @@ def delete_shared_document():
         if share is None:
             return api_response({"status": "error", "message": "Partage non trouvé"}, 404, user_id, "Share not found")
 
-        object_name = share.get("object_name")
-        if object_name:
-            try:
-                delete_file(f"{user_id}_shared", object_name)
-            except Exception as cleanup_exc:
-                print(f"[ERROR] Delete shared file from MinIO: {cleanup_exc}")
-
+        # Fichier supprimé en arrière-plan, validé avec le DELETE en fin de requête
+        tombstone_objects(user_id, [share.get("object_name")])
+        release_shares("s.id = %s AND s.id_owner = %s", (share_id, user_id))
         execute_write(
             "DELETE FROM shared_files WHERE id = %s AND id_owner = %s",
             (share_id, user_id),
         )
+        bump_change_version(user_id)
 
         return api_response({"status": "success", "message": "Partage supprimé"}, 200, user_id, "Share deleted")
     except Exception as e:
@@ -0,0 +1,315 @@
+import math
+import os
+from datetime import datetime
+
+from flask import Blueprint, request, g
+
+from module.api_retour import api_response
+from module.change_version import bump_change_version
+from module.config import UPLOAD_SESSION_PART_SIZE, UPLOAD_SESSION_TTL
+from module.db import execute_write, transaction
+from module.folder import get_folder
+from module.storage import (
+    ObjectNotFound,
+    abort_multipart,
+    complete_multipart,
+    list_parts,
+    max_part_size,
+    new_object_name,
+    start_multipart,
+    upload_part,
+)
+from module.upload_slots import claim_slot, create_slot, get_slot
+from module.usage import QuotaExceeded, add_document_usage, check_quota
+
+upload_sessions_bp = Blueprint("upload_sessions", __name__)
+
+# Limites du multipart S3
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+def _part_count(slot) -> int:
+    return math.ceil(slot["taille_octets"] / slot["part_size"])
+
+
+def _expected_part_size(slot, part_number: int) -> int:
+    """Toutes les parts font part_size octets, sauf la dernière (le reste)."""
+    if part_number < _part_count(slot):
+        return slot["part_size"]
+    return slot["taille_octets"] - (part_number - 1) * slot["part_size"]
+
+
+def _get_session(user_id, upload_id):
+    slot = get_slot(user_id, upload_id)
+    if slot is None or not slot["multipart_id"]:
+        return None
+    return slot
+
+
+def _session_status(slot, upload_id, parts) -> dict:
+    received = {p.part_number for p in parts if p.size == _expected_part_size(slot, p.part_number)}
+    return {
+        "upload_id": upload_id,
+        "object_name": slot["object_name"],
+        "size": slot["taille_octets"],
+        "part_size": slot["part_size"],
+        "part_count": _part_count(slot),
+        "parts": [{"part_number": p.part_number, "size": p.size, "etag": p.etag} for p in parts],
+        "missing": [n for n in range(1, _part_count(slot) + 1) if n not in received],
+        "expires_at": slot["expires_at"].isoformat(),
+    }
+
+
+@upload_sessions_bp.route("/documents/upload/sessions", methods=["POST"])
+def create_upload_session():
+    """
+    Upload par parts reprenable, étape 1: ouvre une session
+
+    Payload attendu:
+    {
+        "file_name": "archive.tar",
+        "size": 5368709120,              (taille du fichier chiffré)
+        "dek_encrypted": "base64_wrapped_dek",
+        "iv": "base64_iv",
+        "sha256": "hash_du_fichier_original",
+        "folder_id": 12,                 (optionnel)
+        "part_size": 8388608             (optionnel, >= 5 MiB)
+    }
+
+    Ensuite: PUT .../parts/<n> (1..part_count, dans n'importe quel ordre et en
+    parallèle), GET .../<upload_id> pour savoir quelles parts manquent après
+    une coupure, puis POST .../complete (ou DELETE pour abandonner).
+    """
+    user_id = None
+    try:
+        user_id = g.user.get("id")
+
+        data = request.get_json(silent=True)
+        if not data:
+            return api_response({"status": "error", "message": "Données manquantes"}, 400, user_id, "Upload session failed: missing data")
+
+        file_name = data.get("file_name")
+        size = data.get("size")
+        dek_encrypted = data.get("dek_encrypted")
+        iv = data.get("iv")
+        sha256 = data.get("sha256")
+        folder_id_raw = data.get("folder_id")
+        part_limit = max_part_size()
+        part_size = data.get("part_size") or min(UPLOAD_SESSION_PART_SIZE, part_limit)
+
+        if not all([file_name, dek_encrypted, iv, sha256]) or size is None:
+            return api_response({"status": "error", "message": "Paramètres manquants"}, 400, user_id, "Upload session failed: missing parameters")
+
+        try:
+            size = int(size)
+            part_size = int(part_size)
+        except (TypeError, ValueError):
+            return api_response({"status": "error", "message": "Taille invalide"}, 400, user_id, "Upload session failed: invalid size")
+        if size <= 0:
+            return api_response({"status": "error", "message": "Taille invalide"}, 400, user_id, "Upload session failed: invalid size")
+        if not MIN_PART_SIZE <= part_size <= part_limit:
+            return api_response(
+                {"status": "error", "message": f"part_size doit être entre {MIN_PART_SIZE} et {part_limit} octets"},
+                400,
+                user_id,
+                "Upload session failed: invalid part_size",
+            )
+        if math.ceil(size / part_size) > MAX_PARTS:
+            return api_response({"status": "error", "message": "part_size trop petit pour ce fichier"}, 400, user_id, "Upload session failed: too many parts")
+        try:
+            check_quota(user_id, size)
+        except QuotaExceeded as e:
+            return api_response({"status": "error", "message": str(e)}, e.status, user_id, "Upload session refused: quota exceeded")
+
+        folder_id = None
+        if folder_id_raw not in (None, "", 0, "0", "null", "root"):
+            try:
+                folder_id = int(folder_id_raw)
+            except (TypeError, ValueError):
+                return api_response({"status": "error", "message": "folder_id invalide"}, 400, user_id, "Upload session failed: invalid folder_id")
+
+            # anti "saut" : le dossier doit appartenir au user
+            if get_folder(int(user_id), folder_id) is None:
+                return api_response({"status": "error", "message": "Dossier introuvable ou non autorisé"}, 403, user_id, "Upload session denied: folder not found")
+
+        object_name = new_object_name(user_id, file_name)
+        multipart_id = start_multipart(user_id, object_name)
+
+        _, ext = os.path.splitext(file_name)
+        extension = ext[1:].lower() if ext else None
+        try:
+            slot = create_slot(
+                user_id, folder_id, object_name, file_name, extension, size, dek_encrypted, iv, sha256,
+                multipart_id=multipart_id, part_size=part_size, ttl=UPLOAD_SESSION_TTL,
+            )
+        except Exception:
+            try:
+                abort_multipart(user_id, object_name, multipart_id)
+            except Exception as cleanup_exc:
+                print(f"[ERROR] Cleanup failed: {cleanup_exc}")
+            raise
+
+        return api_response({
+            "status": "success",
+            "data": {
+                "upload_id": slot["upload_id"],
+                "object_name": object_name,
+                "size": size,
+                "part_size": part_size,
+                "part_count": math.ceil(size / part_size),
+                "expires_at": slot["expires_at"].isoformat(),
+            }
+        }, 200, user_id, f"Upload session created: {file_name}")
+
+    except Exception as e:
+        print(f"[ERROR] Upload session: {e}")
+        return api_response({"status": "error", "message": f"Erreur lors de l'upload: {str(e)}"}, 500, user_id, f"Upload session error: {str(e)}")
+
+
+@upload_sessions_bp.route("/documents/upload/sessions/<upload_id>", methods=["GET"])
+def get_upload_session(upload_id):
+    """
+    État d'une session: parts reçues et numéros des parts manquantes
+    """
+    user_id = None
+    try:
+        user_id = g.user.get("id")
+
+        slot = _get_session(user_id, upload_id)
+        if slot is None:
+            return api_response({"status": "error", "message": "Upload introuvable"}, 404, user_id, "Upload session not found")
+
+        parts = list_parts(user_id, slot["object_name"], slot["multipart_id"])
+        return api_response({"status": "success", "data": _session_status(slot, upload_id, parts)}, 200, None, None)
+
+    except Exception as e:
+        print(f"[ERROR] Upload session status: {e}")
+        return api_response({"status": "error", "message": f"Erreur lors de la récupération: {str(e)}"}, 500, user_id, f"Upload session status error: {str(e)}")
+
+
+@upload_sessions_bp.route("/documents/upload/sessions/<upload_id>/parts/<int:part_number>", methods=["PUT"])
+def put_upload_part(upload_id, part_number):
+    """
+    Envoie une part: corps brut (application/octet-stream) de la taille
+    attendue (part_size, ou le reste pour la dernière). Renvoyer une part
+    la remplace.
+    """
+    user_id = None
+    try:
+        user_id = g.user.get("id")
+
+        slot = _get_session(user_id, upload_id)
+        if slot is None:
+            return api_response({"status": "error", "message": "Upload introuvable"}, 404, user_id, "Upload part failed: session not found")
+        if slot["expires_at"] < datetime.utcnow():
+            return api_response({"status": "error", "message": "Upload expiré"}, 410, user_id, "Upload part failed: session expired")
+        if not 1 <= part_number <= _part_count(slot):
+            return api_response({"status": "error", "message": "Numéro de part invalide"}, 400, user_id, "Upload part failed: invalid part number")
+
+        expected = _expected_part_size(slot, part_number)
+        length = request.content_length
+        if length is None:
+            return api_response({"status": "error", "message": "Content-Length requis"}, 411, user_id, "Upload part failed: missing Content-Length")
+        if length != expected:
+            return api_response(
+                {"status": "error", "message": f"La part {part_number} doit faire {expected} octets"},
+                400,
+                user_id,
+                "Upload part failed: size mismatch",
+            )
+
+        etag = upload_part(user_id, slot["object_name"], slot["multipart_id"], part_number, request.stream, length)
+
+        return api_response({
+            "status": "success",
+            "data": {"part_number": part_number, "size": length, "etag": etag}
+        }, 200, None, None)
+
+    except ObjectNotFound:
+        return api_response({"status": "error", "message": "Upload introuvable"}, 404, user_id, "Upload part failed: multipart upload not found")
+    except Exception as e:
+        print(f"[ERROR] Upload part: {e}")
+        return api_response({"status": "error", "message": f"Erreur lors de l'upload: {str(e)}"}, 500, user_id, f"Upload part error: {str(e)}")
+
+
+@upload_sessions_bp.route("/documents/upload/sessions/<upload_id>/complete", methods=["POST"])
+def complete_upload_session(upload_id):
+    """
+    Assemble les parts et crée le document (toutes les parts doivent être reçues)
+    """
+    user_id = None
+    try:
+        user_id = g.user.get("id")
+
+        slot = _get_session(user_id, upload_id)
+        if slot is None:
+            return api_response({"status": "error", "message": "Upload introuvable"}, 404, user_id, "Upload complete failed: session not found")
+        if slot["expires_at"] < datetime.utcnow():
+            return api_response({"status": "error", "message": "Upload expiré"}, 410, user_id, "Upload complete failed: session expired")
+
+        object_name = slot["object_name"]
+        parts = list_parts(user_id, object_name, slot["multipart_id"])
+        status = _session_status(slot, upload_id, parts)
+        if status["missing"]:
+            return api_response(
+                {"status": "error", "message": "Parts manquantes", "data": status},
+                409,
+                user_id,
+                "Upload complete failed: missing parts",
+            )
+
+        # Le slot et le document sont validés ensemble en fin de requête
+        try:
+            with transaction():
+                if not claim_slot(slot["id"]):
+                    return api_response({"status": "error", "message": "Upload expiré"}, 410, user_id, "Upload complete failed: session already reaped")
+                add_document_usage(user_id, {slot["id_folder"]: (slot["taille_octets"], 1)})
+        except QuotaExceeded as e:
+            # Annulé avant l'assemblage: la session reste reprenable
+            return api_response({"status": "error", "message": str(e)}, e.status, user_id, "Upload complete refused: quota exceeded")
+
+        complete_multipart(user_id, object_name, slot["multipart_id"], parts)
+        execute_write(
+            "INSERT INTO documents (id_users, id_folder, nom_original, extension, taille_octets, object_name, dek_encrypted, iv, sha256) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+            (user_id, slot["id_folder"], slot["nom_original"], slot["extension"], slot["taille_octets"], object_name, slot["dek_encrypted"], slot["iv"], slot["sha256"]),
+        )
+        bump_change_version(user_id)
+
+        return api_response({
+            "status": "success",
+            "data": {
+                "message": "Document uploadé avec succès",
+                "object_name": object_name,
+                "file_name": slot["nom_original"]
+            }
+        }, 200, user_id, f"Document uploaded: {slot['nom_original']}")
+
+    except Exception as e:
+        print(f"[ERROR] Upload complete: {e}")
+        return api_response({"status": "error", "message": f"Erreur lors de l'upload: {str(e)}"}, 500, user_id, f"Upload complete error: {str(e)}")
+
+
+@upload_sessions_bp.route("/documents/upload/sessions/<upload_id>", methods=["DELETE"])
+def abort_upload_session(upload_id):
+    """
+    Abandonne une session et libère les parts déjà envoyées
+    """
+    user_id = None
+    try:
+        user_id = g.user.get("id")
+
+        slot = _get_session(user_id, upload_id)
+        if slot is None or not claim_slot(slot["id"]):
+            return api_response({"status": "error", "message": "Upload introuvable"}, 404, user_id, "Upload abort failed: session not found")
+
+        abort_multipart(user_id, slot["object_name"], slot["multipart_id"])
+
+        return api_response({
+            "status": "success",
+            "data": {"message": "Upload annulé"}
+        }, 200, user_id, f"Upload session aborted: {slot['nom_original']}")
+
+    except Exception as e:
+        print(f"[ERROR] Upload abort: {e}")
+        return api_response({"status": "error", "message": f"Erreur lors de l'annulation: {str(e)}"}, 500, user_id, f"Upload abort error: {str(e)}")
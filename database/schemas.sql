@@ -1,3 +1,6 @@
+DROP TABLE IF EXISTS `idempotency_keys`;
+DROP TABLE IF EXISTS `deletion_queue`;
+DROP TABLE IF EXISTS `upload_slots`;
 DROP TABLE IF EXISTS `documents`;
 DROP TABLE IF EXISTS `folders`;
 DROP TABLE IF EXISTS `logs`;
@@ -14,6 +17,15 @@ CREATE TABLE `users` (
   `secret_a2f` varchar(128) DEFAULT NULL,
   `statue_a2f` INT DEFAULT '0' NOT NULL,
   `public_key` TEXT DEFAULT NULL,
+  `folder_version` BIGINT NOT NULL DEFAULT 0,  -- incrémenté à chaque modification des dossiers (module/folder_tree.py)
+  `change_version` BIGINT NOT NULL DEFAULT 0,  -- incrémenté à chaque écriture visible dans les listings (module/change_version.py)
+  -- espace utilisé et quotas (module/usage.py); quota NULL = valeur par défaut, 0 = illimité
+  `used_bytes` BIGINT NOT NULL DEFAULT 0,
+  `used_objects` INT NOT NULL DEFAULT 0,
+  `shared_bytes` BIGINT NOT NULL DEFAULT 0,
+  `shared_objects` INT NOT NULL DEFAULT 0,
+  `quota_bytes` BIGINT DEFAULT NULL,
+  `quota_objects` INT DEFAULT NULL,
   PRIMARY KEY (`id`),
   UNIQUE KEY `id_UNIQUE` (`id`),
   UNIQUE KEY `secret_a2f_UNIQUE` (`secret_a2f`)
@@ -40,8 +52,11 @@ CREATE TABLE `folders` (
   `nom` VARCHAR(255) NOT NULL,
   `parent_id` INT DEFAULT NULL,
   `created_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `used_bytes` BIGINT NOT NULL DEFAULT 0,    -- documents directement dans le dossier (module/usage.py)
+  `used_objects` INT NOT NULL DEFAULT 0,
   PRIMARY KEY (`id`),
-  KEY `idx_folders_user` (`id_users`),
+  KEY `idx_folders_list_name` (`id_users`, `parent_id`, `nom`, `id`),  -- pages de /documents/list (keyset)
+  KEY `idx_folders_list_date` (`id_users`, `parent_id`, `created_at`, `id`),
   KEY `idx_folders_parent` (`parent_id`),
   CONSTRAINT `fk_folders_users`
     FOREIGN KEY (`id_users`) REFERENCES `users` (`id`) ON DELETE CASCADE,
@@ -57,14 +72,22 @@ CREATE TABLE `documents` (
   `nom_original` VARCHAR(255) NOT NULL,
   `extension` VARCHAR(10),
   `taille_octets` BIGINT NOT NULL,
-  `object_name` VARCHAR(512) NOT NULL,
+  `object_name` VARCHAR(512) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,  -- clé S3: tri et égalité octet par octet
   `dek_encrypted` TEXT NOT NULL,
   `iv` VARCHAR(64) NOT NULL,
   `sha256` VARCHAR(64) NOT NULL,
   `created_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
   PRIMARY KEY (`id`),
-  KEY `idx_documents_user` (`id_users`),
   KEY `idx_documents_folder` (`id_folder`),
+  -- listing paginé d'un dossier (keyset): un index par clé de tri
+  KEY `idx_documents_list_date` (`id_users`, `id_folder`, `created_at`, `id`),
+  KEY `idx_documents_list_name` (`id_users`, `id_folder`, `nom_original`, `id`),
+  KEY `idx_documents_list_size` (`id_users`, `id_folder`, `taille_octets`, `id`),
+  -- recherche dans toute l'arborescence (module/search.py)
+  KEY `idx_documents_search_date` (`id_users`, `created_at`, `id`),
+  KEY `idx_documents_search_size` (`id_users`, `taille_octets`, `id`),
+  KEY `idx_documents_search_ext` (`id_users`, `extension`, `created_at`, `id`),
+  FULLTEXT KEY `ft_documents_name` (`nom_original`) WITH PARSER ngram,
   UNIQUE KEY `uniq_documents_object` (`object_name`),
   CONSTRAINT `fk_documents_users`
     FOREIGN KEY (`id_users`) REFERENCES `users` (`id`) ON DELETE CASCADE,
@@ -80,7 +103,7 @@ CREATE TABLE `shared_files` (
   `name_document` VARCHAR(255) NOT NULL,      -- fichier partagé
   `id_owner` INT NOT NULL,         -- propriétaire (créateur du partage)
   `id_document` INT DEFAULT NULL,
-  `object_name` VARCHAR(512) NOT NULL,
+  `object_name` VARCHAR(512) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
   `taille_octets` BIGINT NOT NULL,
   `token` VARCHAR(128) NOT NULL,   -- lien unique
   `SEK` VARCHAR(255) NOT NULL,
@@ -97,6 +120,7 @@ CREATE TABLE `shared_files` (
   UNIQUE KEY `token_UNIQUE` (`token`),
   KEY `idx_shared_owner` (`id_owner`),
   KEY `idx_shared_document` (`id_document`),
+  KEY `idx_shared_object` (`object_name`),
 
   CONSTRAINT `fk_shared_owner`
     FOREIGN KEY (`id_owner`) REFERENCES `users` (`id`) ON DELETE CASCADE,
@@ -127,6 +151,75 @@ CREATE TABLE `failed_login_attempts` (
     PRIMARY KEY (`id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- 8) upload slots (upload direct vers MinIO: réservé par /documents/upload/slot,
+--    supprimé par /documents/upload/commit ou, une fois expiré, par le nettoyage;
+--    session d'upload par parts si multipart_id est renseigné)
+CREATE TABLE `upload_slots` (
+  `id` INT NOT NULL AUTO_INCREMENT,
+  `token` VARCHAR(64) NOT NULL,
+  `id_users` INT NOT NULL,
+  `id_folder` INT DEFAULT NULL,
+  `object_name` VARCHAR(512) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+  `nom_original` VARCHAR(255) NOT NULL,
+  `extension` VARCHAR(10),
+  `taille_octets` BIGINT NOT NULL,
+  `dek_encrypted` TEXT NOT NULL,
+  `iv` VARCHAR(64) NOT NULL,
+  `sha256` VARCHAR(64) NOT NULL,
+  `multipart_id` VARCHAR(255) DEFAULT NULL,
+  `part_size` INT DEFAULT NULL,
+  `created_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `expires_at` DATETIME NOT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uniq_upload_slots_token` (`token`),
+  KEY `idx_upload_slots_expires` (`expires_at`),
+  KEY `idx_upload_slots_object` (`object_name`),
+  CONSTRAINT `fk_upload_slots_users`
+    FOREIGN KEY (`id_users`) REFERENCES `users` (`id`) ON DELETE CASCADE,
+  CONSTRAINT `fk_upload_slots_folder`
+    FOREIGN KEY (`id_folder`) REFERENCES `folders` (`id`) ON DELETE SET NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 9) file de suppression des objets du stockage (tombstones): remplie dans la
+--    même transaction que le DELETE des lignes, vidée par module/deletion_queue.py.
+--    Pas de clé étrangère: les entrées survivent à la suppression de l'utilisateur.
+CREATE TABLE `deletion_queue` (
+  `id` BIGINT NOT NULL AUTO_INCREMENT,
+  `id_users` INT DEFAULT NULL,
+  `object_name` VARCHAR(512) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+  `attempts` INT NOT NULL DEFAULT 0,
+  `last_error` VARCHAR(255) DEFAULT NULL,
+  `lease` CHAR(32) DEFAULT NULL,
+  `next_attempt_at` DATETIME NOT NULL,
+  `created_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  KEY `idx_deletion_next` (`next_attempt_at`),
+  KEY `idx_deletion_lease` (`lease`),
+  KEY `idx_deletion_user` (`id_users`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 10) clés d'idempotence des uploads (header Idempotency-Key, module/idempotency.py):
+--     réservée avant l'envoi au stockage, complétée (status_code, response) dans
+--     la même transaction que le document ou le partage créé
+CREATE TABLE `idempotency_keys` (
+  `id` BIGINT NOT NULL AUTO_INCREMENT,
+  `id_users` INT NOT NULL,
+  `scope` VARCHAR(32) NOT NULL,
+  `idem_key` VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+  `lease` CHAR(32) NOT NULL,
+  `digest` CHAR(64) DEFAULT NULL,        -- sha256 du fichier chiffré reçu
+  `status_code` SMALLINT DEFAULT NULL,   -- NULL: upload en cours
+  `response` MEDIUMTEXT DEFAULT NULL,
+  `created_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `updated_at` DATETIME NOT NULL,
+  `expires_at` DATETIME NOT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uniq_idempotency_key` (`id_users`, `scope`, `idem_key`),
+  KEY `idx_idempotency_expires` (`expires_at`),
+  CONSTRAINT `fk_idempotency_users`
+    FOREIGN KEY (`id_users`) REFERENCES `users` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
 -- données de test
-INSERT INTO users VALUES (1,'admin', 'prenom','test@gmail.com','$2b$12$9Y1fjD.S3knC7Yu9l3IQ9Ox.02e.tt83R7enbDyYhSN4Cp2QExK0y','Null', 0, 'Null');
+INSERT INTO users VALUES (1,'admin', 'prenom','test@gmail.com','$2b$12$9Y1fjD.S3knC7Yu9l3IQ9Ox.02e.tt83R7enbDyYhSN4Cp2QExK0y','Null', 0, 'Null', 0, 0, 0, 0, 0, 0, NULL, NULL);
 